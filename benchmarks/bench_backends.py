@@ -0,0 +1,47 @@
+"""Compare the throughput of the cleaning backends on generated .py sources.
+
+The default backend runs autoflake, isort and black in-process on each source.
+The ruff backend runs the ruff binary, once per source when cleaning files one
+by one, and once per batch of sources through `clean_sources`, which pays the
+process start-up once per batch rather than per source.
+
+    python benchmarks/bench_backends.py [--sources 200] [--lines 30] [--batch-size 64]
+"""
+import argparse
+import random
+import time
+
+from clean_py.api import clean_sources
+from clean_py.backends import find_ruff, get_backend
+from corpus import make_py_source
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sources", type=int, default=200)
+    parser.add_argument("--lines", type=int, default=30)
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    sources = [make_py_source(args.lines, rng) for _ in range(args.sources)]
+    named = [(f"mod_{index}.py", source) for index, source in enumerate(sources)]
+
+    runs = {"default": lambda: [get_backend().clean(source) for source in sources]}
+    if find_ruff() is not None:
+        ruff = get_backend("ruff")
+        runs["ruff"] = lambda: [ruff.clean(source) for source in sources]
+        runs["ruff batch"] = lambda: clean_sources(named, backend="ruff", batch_size=args.batch_size)
+    else:
+        print("ruff is not installed, only timing the default backend")
+
+    print(f"{'backend':>10} {'seconds':>8} {'sources/s':>10}")
+    for name, run in runs.items():
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        print(f"{name:>10} {elapsed:>8.2f} {args.sources / elapsed:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
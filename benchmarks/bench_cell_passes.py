@@ -0,0 +1,92 @@
+"""Compare the single-traversal notebook cell passes with the old helpers.
+
+The old helpers deduplicated cells with a membership test on a list, which is
+quadratic in the number of cells, and each made its own pass over the cells.
+Both run on synthetic notebooks of thousands of cells, a quarter of them
+copy-pasted, with outputs cleared, magics stripped, and empty and duplicate
+cells dropped. Formatting is left out, only the passes are timed.
+
+    python benchmarks/bench_cell_passes.py [--sizes 1000 5000 20000] [--repeat 3]
+"""
+import argparse
+import copy
+import random
+import time
+
+from clean_py.clean_py import apply_cell_passes, clear_ipynb_output
+from corpus import make_cell_source
+
+
+def make_cells(n_cells, rng):
+    cells = []
+    for index in range(n_cells):
+        if index % 4 == 3:
+            cells.append(copy.deepcopy(rng.choice(cells)))
+            continue
+        if index % 10 == 0:
+            cells.append({"cell_type": "markdown", "metadata": {}, "source": [f"## {index}"]})
+            continue
+        source = make_cell_source(rng)
+        if index % 7 == 0:
+            source = ["%matplotlib inline\n", *source]
+        if index % 13 == 0:
+            source = ["\n"]
+        cells.append(
+            {
+                "cell_type": "code",
+                "execution_count": index,
+                "metadata": {},
+                "outputs": [{"name": "stdout", "output_type": "stream", "text": ["1\n"]}],
+                "source": source,
+            }
+        )
+    return cells
+
+
+def old_passes(cells):
+    """The helpers as they were, chained one pass after another."""
+    clear_ipynb_output({"cells": cells})
+    for cell in cells:
+        if cell["cell_type"] == "code":
+            source = "".join(cell["source"])
+            lines = [line for line in source.split("\n") if line and line[0] not in "%?"]
+            cell["source"] = "\n".join(lines)
+    cells = [cell for cell in cells if len(cell["source"]) > 2]
+    seen, unique = [], []
+    for cell in cells:
+        if cell["source"] in seen:
+            continue
+        seen.append(cell["source"])
+        unique.append(cell)
+    return unique
+
+
+def new_passes(cells):
+    return apply_cell_passes(cells, dedupe_cells=True, drop_empty_cells=True, strip_magics=True)
+
+
+STRATEGIES = {"separate passes": old_passes, "single traversal": new_passes}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 20000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'cells':>6} {'strategy':>17} {'kept':>6} {'best (s)':>10} {'cells/s':>12}")
+    for n_cells in args.sizes:
+        cells = make_cells(n_cells, random.Random(0))
+        for name, strategy in STRATEGIES.items():
+            timings = []
+            for _ in range(args.repeat):
+                copied = copy.deepcopy(cells)
+                start = time.perf_counter()
+                kept = strategy(copied)
+                timings.append(time.perf_counter() - start)
+            best = min(timings)
+            print(f"{n_cells:>6} {name:>17} {len(kept):>6} {best:>10.4f} {n_cells / best:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Compare notebook cell formatting strategies.
+
+Formats synthetic notebooks of 10, 100 and 1000 code cells inline, across the
+shared process pool and across the thread pool clean_ipynb used to rely on,
+both one black call per cell and batched into a single call.
+
+    python benchmarks/bench_cell_strategies.py [--sizes 10 100 1000] [--repeat 3]
+"""
+import argparse
+import copy
+import time
+from multiprocessing import cpu_count
+from multiprocessing.dummy import Pool as ThreadPool
+
+from clean_py.clean_py import clean_ipynb_cell, clean_ipynb_cells, get_cell_pool, shutdown_cell_pool
+
+CELL_SOURCE = [
+    "import os\n",
+    "def f  ( a,b ) :\n",
+    "  x = {  'a':37,'b':42,\n",
+    "'c':927}\n",
+    "  return [a+b for  i in range( 10 ) if i%2]\n",
+    "print ( f(1,2) )",
+]
+
+
+def make_cells(n_cells):
+    return [
+        {"cell_type": "code", "execution_count": None, "metadata": {}, "outputs": [], "source": list(CELL_SOURCE)}
+        for _ in range(n_cells)
+    ]
+
+
+def run_threads(cells):
+    with ThreadPool(cpu_count()) as pool:
+        return pool.map(clean_ipynb_cell, cells)
+
+
+STRATEGIES = {
+    "inline": lambda cells: clean_ipynb_cells(cells, cell_pool_threshold=0, batch_cells=False),
+    "process pool": lambda cells: clean_ipynb_cells(cells, cell_pool_threshold=1, batch_cells=False),
+    "thread pool": run_threads,
+    "batch inline": lambda cells: clean_ipynb_cells(cells, cell_pool_threshold=0),
+    "batch pool": lambda cells: clean_ipynb_cells(cells, cell_pool_threshold=1),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    # start the pool up front, its startup is paid once per run rather than per notebook
+    get_cell_pool().submit(int).result()
+    print(f"{'cells':>6} {'strategy':>14} {'best (s)':>10} {'cells/s':>10}")
+    try:
+        for n_cells in args.sizes:
+            cells = make_cells(n_cells)
+            for name, strategy in STRATEGIES.items():
+                timings = []
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    strategy(copy.deepcopy(cells))
+                    timings.append(time.perf_counter() - start)
+                best = min(timings)
+                print(f"{n_cells:>6} {name:>14} {best:>10.3f} {n_cells / best:>10.0f}")
+    finally:
+        shutdown_cell_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Compare cleaning files with and without the I/O pipeline on a slow filesystem.
+
+Network filesystems stall each read and write for milliseconds while the CPU
+sits idle. The latency is simulated by sleeping in every read and write of a
+generated corpus of .py files, which are then cleaned in-process, reading and
+writing inline, and with --io-threads reading ahead and writing behind the
+formatters.
+
+    python benchmarks/bench_io_pipeline.py [--files 200] [--latency-ms 20] [--io-threads 4 16]
+"""
+import argparse
+import random
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from clean_py import clean_py as clean_py_module
+from clean_py import pipeline
+from clean_py.api import iter_results
+from corpus import make_py_source
+
+
+def simulate_latency(latency):
+    read_file, create_file = clean_py_module.read_file, clean_py_module.create_file
+
+    def slow_read(file_path):
+        time.sleep(latency)
+        return read_file(file_path)
+
+    def slow_create(file_path, contents):
+        time.sleep(latency)
+        create_file(file_path, contents)
+
+    for module in (clean_py_module, pipeline):
+        module.read_file, module.create_file = slow_read, slow_create
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--lines", type=int, default=30)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--io-threads", type=int, nargs="+", default=[4, 16])
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    sources = [make_py_source(args.lines, rng) for _ in range(args.files)]
+    simulate_latency(args.latency_ms / 1000)
+
+    print(f"{'io threads':>10} {'seconds':>8} {'files/s':>8}")
+    for io_threads in [0, *args.io_threads]:
+        tree = Path(tempfile.mkdtemp(prefix="clean-py-bench-"))
+        try:
+            files = []
+            for index, source in enumerate(sources):
+                file_path = tree / f"mod_{index}.py"
+                file_path.write_text(source)
+                files.append(file_path)
+            start = time.perf_counter()
+            for _ in iter_results(files, io_threads=io_threads, cell_cache_size=0):
+                pass
+            elapsed = time.perf_counter() - start
+        finally:
+            shutil.rmtree(tree)
+        print(f"{io_threads:>10} {elapsed:>8.2f} {args.files / elapsed:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Compare peak memory of cleaning a huge notebook streamed and loaded whole.
+
+Writes a notebook of --size-mb megabytes, nearly all of it base64 image outputs,
+then cleans a copy in a fresh process twice: once streamed past its outputs,
+as clean_ipynb does for large notebooks, and once loaded whole into memory.
+
+    python benchmarks/bench_notebook_memory.py [--size-mb 500] [--cells 200]
+"""
+import argparse
+import base64
+import json
+import multiprocessing
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from corpus import make_cell_source
+
+
+def write_notebook(path, size_mb, n_cells, seed=0):
+    """Write a notebook cell by cell, so generating it needs little memory."""
+    rng = random.Random(seed)
+    output_size = size_mb * 1024 * 1024 // n_cells
+    with open(path, "w") as f:
+        f.write('{\n "cells": [\n')
+        for index in range(n_cells):
+            image = base64.b64encode(rng.randbytes(output_size * 3 // 4)).decode("ascii")
+            cell = {
+                "cell_type": "code",
+                "execution_count": index + 1,
+                "metadata": {},
+                "outputs": [
+                    {
+                        "data": {"image/png": image, "text/plain": ["<Figure size 640x480>"]},
+                        "metadata": {},
+                        "output_type": "display_data",
+                    }
+                ],
+                "source": make_cell_source(rng),
+            }
+            f.write(("  " if index == 0 else ",\n  ") + json.dumps(cell))
+        f.write('\n ],\n "metadata": {},\n "nbformat": 4,\n "nbformat_minor": 4\n}\n')
+
+
+def clean(path, streamed):
+    import clean_py.clean_py
+
+    if not streamed:
+        clean_py.clean_py.STREAM_NOTEBOOK_SIZE = float("inf")
+    start = time.perf_counter()
+    clean_py.clean_py.clean_ipynb(path, cell_pool_threshold=0)
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return elapsed, peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=int, default=500)
+    parser.add_argument("--cells", type=int, default=200)
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        original = Path(tmp) / "original.ipynb"
+        write_notebook(original, args.size_mb, args.cells)
+        size_mb = os.path.getsize(original) / (1024 * 1024)
+        print(f"notebook: {size_mb:.0f} MB, {args.cells} code cells")
+        print(f"{'mode':>10} {'time (s)':>10} {'peak RSS (MB)':>14}")
+        for name, streamed in (("streamed", True), ("in memory", False)):
+            copy = Path(tmp) / f"{name}.ipynb"
+            shutil.copyfile(original, copy)
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                elapsed, peak_mb = executor.submit(clean, copy, streamed).result()
+            print(f"{name:>10} {elapsed:>10.2f} {peak_mb:>14.1f}")
+            copy.unlink()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Compare cleaning a skewed corpus in walk order and most expensive first.
+
+The corpus is hundreds of small .py files and a few large ones that sort last,
+so in walk order the large files start once the small ones are done and leave
+the other workers idle while they finish. Each order is cleaned with --jobs
+workers. Besides the wall time, the run time each order would take on --jobs
+cores is simulated from per-file times measured in-process, assigning each
+file in order to the first free worker as the pool does. That stays
+meaningful on machines with fewer cores than workers.
+
+    python benchmarks/bench_scheduling.py [--jobs 4] [--small 300] [--large 3]
+"""
+import argparse
+import heapq
+import random
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from clean_py.api import iter_results
+from clean_py.discovery import iter_files
+from clean_py.scheduling import schedule
+from corpus import make_py_source
+
+
+def write_corpus(dest, n_small, n_large, rng):
+    for index in range(n_small):
+        (dest / f"a_{index:04}.py").write_text(make_py_source(20, rng))
+    for index in range(n_large):
+        (dest / f"z_{index:02}.py").write_text(make_py_source(3000, rng))
+
+
+def simulated_makespan(seconds, jobs):
+    workers = [0.0] * jobs
+    for cost in seconds:
+        heapq.heappush(workers, heapq.heappop(workers) + cost)
+    return max(workers)
+
+
+def clean_copy(corpus, order, jobs):
+    """Clean a copy of the corpus in some order, returning the wall time and per-file times."""
+    tree = Path(tempfile.mkdtemp(prefix="clean-py-bench-"))
+    try:
+        shutil.copytree(corpus, tree, dirs_exist_ok=True)
+        files = order(list(iter_files(tree)))
+        start = time.perf_counter()
+        results = list(iter_results(files, jobs=jobs, cache=None))
+        elapsed = time.perf_counter() - start
+    finally:
+        shutil.rmtree(tree)
+    return elapsed, {result.path.relative_to(tree): result.seconds for result in results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=4)
+    parser.add_argument("--small", type=int, default=300)
+    parser.add_argument("--large", type=int, default=3)
+    args = parser.parse_args()
+
+    corpus = Path(tempfile.mkdtemp(prefix="clean-py-bench-"))
+    try:
+        write_corpus(corpus, args.small, args.large, random.Random(0))
+        # time each file alone, in-process, free of contention between workers
+        _, seconds = clean_copy(corpus, lambda files: files, jobs=1)
+        orders = {
+            "walk": lambda files: files,
+            "cost": lambda files: schedule(files),
+        }
+        print(f"{'order':>6} {'wall (s)':>9} {f'simulated on {args.jobs} cores (s)':>28}")
+        for name, order in orders.items():
+            elapsed, ordered = clean_copy(corpus, order, jobs=args.jobs)
+            makespan = simulated_makespan([seconds[path] for path in ordered], args.jobs)
+            print(f"{name:>6} {elapsed:>9.2f} {makespan:>28.2f}")
+    finally:
+        shutil.rmtree(corpus)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""Benchmark clean-py end to end on a synthetic corpus.
+
+Each case runs in a fresh process, on a fresh copy of the corpus from
+`corpus.py`, and reports the best wall time over the repeats, files per second
+and the peak resident memory of the process doing the work. Results can be
+saved as JSON and compared against a saved baseline.
+
+    python benchmarks/bench_suite.py [--scale quick|full] [--repeat 3] [--cases black ...]
+        [--save results.json] [--compare baseline.json] [--threshold 0.1]
+"""
+import argparse
+import json
+import multiprocessing
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from corpus import PY_SIZES, write_corpus
+
+
+def _peak_rss_mb(who=resource.RUSAGE_SELF):
+    peak = resource.getrusage(who).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def _files(directory, suffix):
+    return sorted(Path(directory).rglob(f"*{suffix}"))
+
+
+def _clean_python_code(n_lines=None, **stages):
+    from clean_py.clean_py import clean_python_code
+
+    def run(corpus):
+        files = _files(corpus / "py", ".py")
+        if n_lines is not None:
+            files = [path for path in files if path.name.startswith(f"lines_{n_lines}_")]
+        sources = [path.read_text() for path in files]
+        start = time.perf_counter()
+        for source in sources:
+            clean_python_code(source, **stages)
+        return time.perf_counter() - start, len(sources)
+
+    return run
+
+
+def _clean_files(suffix):
+    from clean_py.clean_py import clean_ipynb, clean_py, shutdown_cell_pool
+
+    clean = clean_py if suffix == ".py" else clean_ipynb
+
+    def run(corpus):
+        files = _files(corpus, suffix)
+        start = time.perf_counter()
+        for path in files:
+            clean(path)
+        elapsed = time.perf_counter() - start
+        shutdown_cell_pool()
+        return elapsed, len(files)
+
+    return run
+
+
+def _cli(*options):
+    def run(corpus):
+        n_files = len(_files(corpus, ".py")) + len(_files(corpus, ".ipynb"))
+        start = time.perf_counter()
+        subprocess.run(
+            (sys.executable, "-m", "clean_py.cli", str(corpus), "--no-cache", *options),
+            check=True,
+            capture_output=True,
+        )
+        return time.perf_counter() - start, n_files
+
+    return run
+
+
+def cases(scale):
+    """Map case names to factories of functions timing one run over a corpus copy."""
+    all_cases = {}
+    for n_lines, _ in PY_SIZES[scale]:
+        all_cases[f"clean_python_code[{n_lines} lines]"] = (_clean_python_code, (n_lines,), {})
+    for stage in ("autoflake", "isort", "black"):
+        stages = {name: name == stage for name in ("autoflake", "isort", "black")}
+        all_cases[f"stage[{stage}]"] = (_clean_python_code, (), stages)
+    all_cases["clean_py"] = (_clean_files, (".py",), {})
+    all_cases["clean_ipynb"] = (_clean_files, (".ipynb",), {})
+    all_cases["cli"] = (_cli, (), {})
+    all_cases["cli[--jobs 0]"] = (_cli, ("--jobs", "0"), {})
+    return all_cases
+
+
+def run_case(factory, args, kwargs, corpus, repeat):
+    """Time a case in the current process, returns the best run and the peak RSS."""
+    run = factory(*args, **kwargs)
+    timings = []
+    n_files = 0
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as tmp:
+            copy = Path(shutil.copytree(corpus, Path(tmp) / "corpus"))
+            elapsed, n_files = run(copy)
+        timings.append(elapsed)
+    best = min(timings)
+    # cli cases do their work in a child process
+    is_cli = factory is _cli
+    return {
+        "seconds": best,
+        "files": n_files,
+        "files_per_sec": n_files / best if best else 0.0,
+        "peak_rss_mb": _peak_rss_mb(resource.RUSAGE_CHILDREN if is_cli else resource.RUSAGE_SELF),
+    }
+
+
+def run_suite(corpus, scale, repeat=3, selected=None):
+    results = {}
+    context = multiprocessing.get_context("spawn")
+    for name, (factory, args, kwargs) in cases(scale).items():
+        if selected and not any(pattern in name for pattern in selected):
+            continue
+        # a fresh process per case, so imports and peak memory don't leak between cases
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            results[name] = executor.submit(
+                run_case, factory, args, kwargs, corpus, repeat
+            ).result()
+        print_row(name, results[name])
+    return results
+
+
+def metadata(scale, repeat):
+    from clean_py.cache import formatter_versions
+
+    return {
+        "scale": scale,
+        "repeat": repeat,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "formatters": formatter_versions(),
+    }
+
+
+HEADER = f"{'case':<30} {'files':>6} {'best (s)':>10} {'files/s':>10} {'peak RSS (MB)':>14}"
+
+
+def print_row(name, result):
+    print(
+        f"{name:<30} {result['files']:>6} {result['seconds']:>10.3f} "
+        f"{result['files_per_sec']:>10.1f} {result['peak_rss_mb']:>14.1f}",
+        flush=True,
+    )
+
+
+def compare(results, baseline, threshold):
+    """Print the change of every case against a baseline, returns the regressed cases."""
+    regressions = []
+    print(f"\n{'case':<30} {'baseline (s)':>12} {'now (s)':>10} {'change':>8} {'RSS change':>11}")
+    for name, result in results.items():
+        before = baseline["cases"].get(name)
+        if before is None:
+            print(f"{name:<30} {'-':>12} {result['seconds']:>10.3f} {'new':>8}")
+            continue
+        change = result["seconds"] / before["seconds"] - 1
+        rss_change = result["peak_rss_mb"] / before["peak_rss_mb"] - 1
+        flag = ""
+        if change > threshold or rss_change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(
+            f"{name:<30} {before['seconds']:>12.3f} {result['seconds']:>10.3f} "
+            f"{change:>+8.1%} {rss_change:>+11.1%}{flag}"
+        )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", choices=sorted(PY_SIZES), default="quick")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cases", nargs="+", help="Only run cases containing one of these")
+    parser.add_argument("--save", type=Path, help="Write results as JSON")
+    parser.add_argument("--compare", type=Path, help="Compare against saved results")
+    parser.add_argument(
+        "--threshold", type=float, default=0.1, help="Slowdown flagged as a regression"
+    )
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        baseline = json.loads(args.compare.read_text())
+        if baseline["meta"]["scale"] != args.scale:
+            parser.error(f"baseline was recorded at --scale {baseline['meta']['scale']}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus = write_corpus(Path(tmp) / "corpus", args.scale, args.seed)
+        print(HEADER)
+        results = run_suite(corpus, args.scale, args.repeat, args.cases)
+
+    report = {"meta": metadata(args.scale, args.repeat), "cases": results}
+    if args.save:
+        args.save.parent.mkdir(parents=True, exist_ok=True)
+        args.save.write_text(json.dumps(report, indent=2) + "\n")
+    if baseline is not None and compare(results, baseline, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Generate a reproducible corpus of messy .py files and notebooks to benchmark on.
+
+The same seed always produces byte-identical files, so timings from different
+runs and machines are measured on the same input.
+
+    python benchmarks/corpus.py DEST [--scale quick|full] [--seed 0]
+"""
+import argparse
+import base64
+import json
+import random
+from pathlib import Path
+
+# (lines per file, number of files) of each .py size class
+PY_SIZES = {
+    "quick": [(10, 20), (100, 10), (1000, 2)],
+    "full": [(10, 50), (100, 20), (1000, 5), (10000, 1)],
+}
+# (code cells, number of notebooks, bytes of base64 image output per cell)
+NOTEBOOK_SIZES = {
+    "quick": [(5, 10, 0), (50, 4, 0), (50, 2, 20_000), (500, 1, 0)],
+    "full": [(5, 20, 0), (50, 10, 0), (50, 5, 100_000), (500, 2, 0), (2000, 1, 0), (2000, 1, 10_000)],
+}
+
+IMPORTS = [
+    "import os",
+    "import sys",
+    "import json",
+    "import re",
+    "from pathlib import Path",
+    "from collections import defaultdict, OrderedDict",
+    "from typing import List,Dict , Optional",
+]
+
+BLOCKS = [
+    "def {name}( a,b ,c = None ) :\n    x = {{  'a':37,'b':42,\n'c':927}}\n    return [a+b for  i in range( 10 ) if i%2]\n",
+    "class {cls}( object ):\n  def __init__ ( self, value ) :\n    self.value=value\n  def total(self):\n      unused = 1\n      return sum( [ self.value , 2 ,3 ] )\n",
+    "{name}_config = dict( path = os.path.join( 'a','b' ), retries = 3 , verbose = True, timeout=  30.0 , tags = [ 'x','y','z' ] )\n",
+    "if {name} is not None and \\\n {name}.field > 0 or \\\n {name}.is_debug:\n z = 'hello '+'world'\nelse:\n world = 'world'\n",
+    "for {name} in range( 100 ) :\n    print ( {name} , {name}**2 ,  sep = ',' )\n",
+    "{name} = lambda x : x*2 if x>0 else -x\n",
+    "try:\n    import numpy as np\nexcept ImportError :\n    np = None\n",
+    "with open( 'file.txt' ) as f :\n    {name}_lines = [ line.strip( ) for line in f.readlines() if line ]\n",
+]
+
+
+def _name(rng: random.Random) -> str:
+    return "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(8))
+
+
+def _block(rng: random.Random) -> str:
+    return rng.choice(BLOCKS).format(name=_name(rng), cls=_name(rng).capitalize())
+
+
+def make_py_source(n_lines: int, rng: random.Random) -> str:
+    """Generate valid but badly formatted Python of roughly `n_lines` lines."""
+    lines = rng.sample(IMPORTS, k=min(len(IMPORTS), max(1, n_lines // 5)))
+    # whole blocks only, so the file always parses
+    while len(lines) < n_lines:
+        lines.extend(_block(rng).splitlines())
+    return "\n".join(lines) + "\n"
+
+
+def make_cell_source(rng: random.Random) -> list:
+    lines = _block(rng).splitlines(keepends=True)
+    lines[-1] = lines[-1].rstrip("\n")
+    return lines
+
+
+def make_notebook(n_cells: int, rng: random.Random, output_size: int = 0) -> dict:
+    """Generate a notebook of `n_cells` code cells plus a few markdown cells.
+
+    With an `output_size`, every code cell carries a base64 encoded PNG output of
+    about that many bytes, as plotting notebooks do.
+    """
+    cells = []
+    for index in range(n_cells):
+        if index % 5 == 0:
+            cells.append({"cell_type": "markdown", "metadata": {}, "source": [f"## Section {index}"]})
+        outputs = [{"name": "stdout", "output_type": "stream", "text": [f"{index}\n"]}]
+        if output_size:
+            image = base64.b64encode(rng.randbytes(output_size * 3 // 4)).decode("ascii")
+            outputs.append(
+                {
+                    "data": {"image/png": image, "text/plain": ["<Figure size 640x480>"]},
+                    "metadata": {},
+                    "output_type": "display_data",
+                }
+            )
+        cells.append(
+            {
+                "cell_type": "code",
+                "execution_count": index + 1,
+                "metadata": {"collapsed": False},
+                "outputs": outputs,
+                "source": make_cell_source(rng),
+            }
+        )
+    return {
+        "cells": cells,
+        "metadata": {"kernelspec": {"display_name": "Python 3", "language": "python", "name": "python3"}},
+        "nbformat": 4,
+        "nbformat_minor": 4,
+    }
+
+
+def write_corpus(dest: Path, scale: str = "quick", seed: int = 0) -> Path:
+    """Write the corpus for a scale to `dest`, split into py/ and ipynb/ folders.
+
+    Returns:
+        The destination directory.
+    """
+    rng = random.Random(seed)
+    dest = Path(dest)
+    (dest / "py").mkdir(parents=True, exist_ok=True)
+    (dest / "ipynb").mkdir(parents=True, exist_ok=True)
+    for n_lines, n_files in PY_SIZES[scale]:
+        for index in range(n_files):
+            path = dest / "py" / f"lines_{n_lines}_{index}.py"
+            path.write_text(make_py_source(n_lines, rng))
+    for n_cells, n_files, output_size in NOTEBOOK_SIZES[scale]:
+        suffix = f"_outputs_{output_size}" if output_size else ""
+        for index in range(n_files):
+            path = dest / "ipynb" / f"cells_{n_cells}{suffix}_{index}.ipynb"
+            path.write_text(json.dumps(make_notebook(n_cells, rng, output_size), indent=1) + "\n")
+    return dest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("dest", type=Path)
+    parser.add_argument("--scale", choices=sorted(PY_SIZES), default="quick")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    write_corpus(args.dest, args.scale, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,790 @@
+import contextlib
+import cProfile
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+from .backends import DEFAULT_BACKEND, backend_flags, get_backend
+from .cache import CELL_CACHE_SIZE, CellCache, ResultCache
+from .clean_py import (
+    CELL_POOL_THRESHOLD,
+    clean_ipynb,
+    clean_py,
+    clean_source,
+    get_cell_cache,
+    py_flags,
+    read_file,
+    unified_diff,
+)
+from .config import ProjectConfig, config_flags, find_project_config
+from .daemon import Address, clean_path_with_daemon, clean_with_daemon
+from .discovery import iter_files
+from .limits import (
+    CleanTimeout,
+    LimitExceeded,
+    check_file_size,
+    memory_limit,
+    set_memory_limit,
+    time_limit,
+)
+from .notebook import InvalidNotebookError
+from .pipeline import DEFAULT_QUEUE_SIZE, Prefetched, bounded_map, prefetch, write_later
+from .profiling import counting, record
+
+# Sources handed to a worker at a time by `clean_sources`
+DEFAULT_BATCH_SIZE = 64
+
+# Outcomes reported back from `clean_file` and `clean_sources`
+CLEANED = "cleaned"
+SKIPPED = "skipped"
+INVALID = "invalid"
+FAILED = "failed"
+OVER_LIMIT = "over limit"
+
+
+class FileResult(NamedTuple):
+    """Outcome of cleaning a file.
+
+    `changed` tells whether cleaning changed the file, whether or not it was
+    written. `seconds` is the time spent cleaning it, `timings` and `counters`
+    break that down per stage and event when profiling, and `error` and
+    `details` explain the statuses other than cleaned and skipped.
+    """
+
+    path: Path
+    status: str
+    error: Optional[str] = None
+    details: Optional[str] = None
+    seconds: Optional[float] = None
+    timings: Optional[Dict[str, float]] = None
+    changed: bool = False
+    diff: Optional[str] = None
+    counters: Optional[Dict[str, int]] = None
+    # cleaned contents left for the caller to write, see `defer_write`
+    to_write: Optional[str] = None
+
+
+class SourceResult(NamedTuple):
+    """Outcome of cleaning a source held in memory, see `clean_sources`."""
+
+    name: str
+    status: str
+    cleaned: Optional[str] = None
+    changed: bool = False
+    error: Optional[str] = None
+    details: Optional[str] = None
+    seconds: Optional[float] = None
+    timings: Optional[Dict[str, float]] = None
+
+
+# Worker processes reused across runs, and the (workers, memory cap) they run with
+_worker_pool: Optional[ProcessPoolExecutor] = None
+_worker_pool_key: Optional[Tuple[int, Optional[int]]] = None
+
+
+def get_worker_pool(jobs: int = 0, max_memory: Optional[int] = None) -> ProcessPoolExecutor:
+    """Return the process pool files are cleaned on, reusing it across runs.
+
+    Workers keep the formatters imported and their cell caches warm between
+    runs. The pool is replaced when asked for a different number of workers or
+    memory cap.
+
+    Args:
+        jobs: Number of worker processes, 0 for all cores.
+        max_memory: Memory cap in bytes of each worker process.
+
+    Returns:
+        The shared process pool.
+    """
+    global _worker_pool, _worker_pool_key
+    key = (jobs or os.cpu_count() or 1, max_memory)
+    if _worker_pool is not None and _worker_pool_key != key:
+        shutdown_worker_pool()
+    if _worker_pool is None:
+        pool_options = {}
+        if max_memory is not None:
+            pool_options = dict(initializer=set_memory_limit, initargs=(max_memory,))
+        # spawn rather than fork, forking a process that runs pool threads is unsafe
+        _worker_pool = ProcessPoolExecutor(
+            max_workers=key[0], mp_context=multiprocessing.get_context("spawn"), **pool_options
+        )
+        _worker_pool_key = key
+    return _worker_pool
+
+
+def shutdown_worker_pool() -> None:
+    """Shut down the shared worker pool, if it was ever started."""
+    global _worker_pool, _worker_pool_key
+    if _worker_pool is not None:
+        _worker_pool.shutdown(cancel_futures=True)
+        _worker_pool = _worker_pool_key = None
+
+
+def clean_file(
+    file_path: Path,
+    py: bool = True,
+    ipynb: bool = True,
+    autoflake: bool = True,
+    isort: bool = True,
+    black: bool = True,
+    cache: Optional[ResultCache] = None,
+    cell_pool_threshold: int = CELL_POOL_THRESHOLD,
+    batch_cells: bool = True,
+    daemon_address: Optional[Address] = None,
+    profile: bool = False,
+    cprofile: Optional[Tuple[Path, Path]] = None,
+    write: bool = True,
+    diff: bool = False,
+    cell_cache_size: int = CELL_CACHE_SIZE,
+    cell_cache_dir: Optional[Path] = None,
+    dedupe_cells: bool = False,
+    drop_empty_cells: bool = False,
+    strip_magics: bool = False,
+    timeout: Optional[float] = None,
+    max_file_size: Optional[int] = None,
+    backend: str = DEFAULT_BACKEND,
+    config: Optional[ProjectConfig] = None,
+    source: Optional[str] = None,
+    defer_write: bool = False,
+    cleaned: Optional[str] = None,
+) -> FileResult:
+    """Clean a single file and report the outcome rather than printing it.
+
+    This is what pool workers run, so all console output is left to the parent.
+
+    Args:
+        file_path: Path to the file.
+        py: Whether to clean .py files.
+        ipynb: Whether to clean .ipynb files.
+        autoflake: Whether to remove unused imports using autoflake.
+        isort: Whether to sort imports using isort.
+        black: Whether to format code using black.
+        cache: Result cache used to skip contents that were cleaned before.
+        cell_pool_threshold: Minimum number of code cells for notebook cells to
+            be formatted across processes, 0 to always format inline.
+        batch_cells: Whether to format notebook code cells in a single black pass.
+        daemon_address: Address of a `clean-py serve` daemon to clean through, the
+            file is cleaned in-process if no daemon is listening there.
+        profile: Whether to time the file and its cleaning stages.
+        cprofile: A resolved file path and an output path, a cProfile dump of
+            cleaning that file is written to the output path.
+        write: Whether to write changes back, False to only report them.
+        diff: Whether to include a unified diff of the changes in the result.
+        cell_cache_size: Number of formatted notebook cells this process keeps in
+            memory across files, 0 to disable the in-memory cell cache.
+        cell_cache_dir: Directory of the on-disk tier of the cell cache.
+        dedupe_cells: Whether to drop notebook cells repeating an earlier cell.
+        drop_empty_cells: Whether to drop notebook cells with a blank source.
+        strip_magics: Whether to remove magics and shell escapes from code cells.
+        timeout: Seconds cleaning the file may take before it is skipped.
+        max_file_size: Size in bytes over which the file is skipped.
+        backend: Name of the backend cleaning .py files, see `backends`.
+        config: Formatter settings of the project the file belongs to, see
+            `config.find_project_config`. None for the defaults.
+        source: Contents of the file if already read.
+        defer_write: Whether to return changed contents in the result's
+            `to_write` rather than writing them, for the caller to write.
+        cleaned: The cleaned contents of a .py file if already known, e.g.
+            from a batch run of the backend over `source`.
+
+    Returns:
+        FileResult describing what happened to the file.
+    """
+    cell_cache = None
+    if cell_cache_size or cell_cache_dir:
+        cell_cache = get_cell_cache(cell_cache_size, cell_cache_dir)
+    passes = dict(
+        dedupe_cells=dedupe_cells, drop_empty_cells=drop_empty_cells, strip_magics=strip_magics
+    )
+    with contextlib.ExitStack() as stack:
+        timings = stack.enter_context(record()) if profile else None
+        counters = stack.enter_context(counting()) if profile else None
+        if cprofile is not None and file_path.resolve() == cprofile[0]:
+            profiler = cProfile.Profile()
+            stack.callback(profiler.dump_stats, cprofile[1])
+            stack.enter_context(profiler)
+        start = time.perf_counter()
+        result = _clean_file(
+            file_path,
+            py,
+            ipynb,
+            autoflake,
+            isort,
+            black,
+            cache,
+            cell_pool_threshold,
+            batch_cells,
+            daemon_address,
+            write,
+            diff,
+            cell_cache,
+            passes,
+            timeout,
+            max_file_size,
+            backend,
+            config,
+            source,
+            defer_write,
+            cleaned,
+        )
+        seconds = time.perf_counter() - start
+    return result._replace(seconds=seconds, timings=timings, counters=counters)
+
+
+def _clean_file(
+    file_path: Path,
+    py: bool,
+    ipynb: bool,
+    autoflake: bool,
+    isort: bool,
+    black: bool,
+    cache: Optional[ResultCache],
+    cell_pool_threshold: int,
+    batch_cells: bool,
+    daemon_address: Optional[Address],
+    write: bool,
+    diff: bool,
+    cell_cache: Optional[CellCache],
+    passes: Dict[str, bool],
+    timeout: Optional[float],
+    max_file_size: Optional[int],
+    backend: str,
+    config: Optional[ProjectConfig],
+    source: Optional[str],
+    defer_write: bool,
+    precleaned: Optional[str],
+) -> FileResult:
+    limits = dict(timeout=timeout, max_size=max_file_size)
+    write_now = write and not defer_write
+    try:
+        if daemon_address is not None and is_selected(file_path, py, ipynb):
+            cleaned = clean_path_with_daemon(
+                file_path,
+                daemon_address,
+                autoflake=autoflake,
+                isort=isort,
+                black=black,
+                cache=cache,
+                write=write_now,
+                backend=backend,
+                config=config,
+                **passes,
+                **limits,
+            )
+        elif py and file_path.suffix == ".py":
+            cleaned = clean_py(
+                file_path,
+                autoflake,
+                isort,
+                black,
+                cache=cache,
+                write=write_now,
+                source=source,
+                backend=backend,
+                config=config,
+                cleaned=precleaned,
+                **limits,
+            )
+        elif ipynb and file_path.suffix == ".ipynb":
+            # notebooks are validated as they are parsed, invalid ones raise here
+            cleaned = clean_ipynb(
+                file_path,
+                autoflake=autoflake,
+                isort=isort,
+                black=black,
+                cache=cache,
+                cell_pool_threshold=cell_pool_threshold,
+                batch_cells=batch_cells,
+                write=write_now,
+                cell_cache=cell_cache,
+                source=source,
+                config=config,
+                **passes,
+                **limits,
+            )
+        else:
+            return FileResult(file_path, SKIPPED)
+    except (json.JSONDecodeError, InvalidNotebookError) as e:
+        return FileResult(file_path, INVALID, str(e))
+    except LimitExceeded as e:
+        return FileResult(file_path, OVER_LIMIT, str(e))
+    except CleanTimeout:
+        return FileResult(file_path, OVER_LIMIT, f"Cleaning took longer than {timeout:g}s")
+    except MemoryError:
+        return FileResult(file_path, OVER_LIMIT, "Cleaning went over the memory limit")
+    except Exception as e:
+        return FileResult(file_path, FAILED, str(e), traceback.format_exc())
+    file_diff = None
+    if diff and cleaned.changed:
+        source = cleaned.source
+        if source is None:
+            # large notebooks are streamed, only read them whole to diff them
+            with open(file_path) as f:
+                source = f.read()
+        file_diff = unified_diff(source, cleaned.cleaned, file_path)
+    to_write = cleaned.cleaned if write and defer_write and cleaned.changed else None
+    return FileResult(
+        file_path, CLEANED, changed=cleaned.changed, diff=file_diff, to_write=to_write
+    )
+
+
+def clean_prefetched(prefetched: Prefetched, **options) -> FileResult:
+    """Clean a file read ahead of time, like `clean_file` does one it reads itself."""
+    result = clean_file(prefetched.path, source=prefetched.source, **options)
+    if result.timings is not None and prefetched.seconds is not None:
+        result.timings["read"] = result.timings.get("read", 0.0) + prefetched.seconds
+    return result
+
+
+def _write_result(result: FileResult) -> FileResult:
+    try:
+        seconds = write_later(result.path, result.to_write)
+    except OSError as e:
+        return result._replace(status=FAILED, error=str(e), details=traceback.format_exc(), to_write=None)
+    if seconds is not None and result.timings is not None:
+        result.timings["write"] = result.timings.get("write", 0.0) + seconds
+    return result._replace(to_write=None)
+
+
+def iter_results(
+    files: Iterable[Path],
+    jobs: int = 1,
+    max_memory: Optional[int] = None,
+    io_threads: int = 0,
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+    project_config: bool = True,
+    **options,
+) -> Iterator[FileResult]:
+    """Clean files either in-process or across the shared pool of worker processes.
+
+    At most `queue_size` files are handed to the workers ahead of the results
+    being consumed, so memory stays bounded however many files there are.
+
+    With I/O threads the run becomes a pipeline: files are read ahead on
+    threads while earlier ones are formatted, and cleaned files are written
+    on threads while later ones are formatted. This hides the latency of
+    network filesystems behind the formatters. Each stage holds at most
+    `queue_size` files.
+
+    Each file is cleaned with the formatter settings of its project, looked up
+    here, once per directory, and handed to the workers along with the file.
+
+    With a backend other than the default, files go to the workers in batches
+    of a project's files, and the backend cleans the .py files of a batch in
+    one go, e.g. with one run of ruff rather than one per file. `queue_size`
+    then counts batches.
+
+    Args:
+        files: Files to clean.
+        jobs: Number of worker processes, 1 to run in-process, 0 for all cores.
+        max_memory: Memory cap in bytes of each worker process, or of this
+            process while it cleans with a single job.
+        io_threads: Number of threads reading and, separately, writing files,
+            0 to read and write them in the workers.
+        queue_size: Maximum number of files in flight in each stage.
+        project_config: Whether to honour the [tool.black], [tool.isort] and
+            [tool.autoflake] settings of each file's pyproject.toml.
+        **options: Keyword arguments forwarded to `clean_file`.
+
+    Yields:
+        FileResult for each file, in input order.
+    """
+    # the daemon reads and writes files itself
+    pipelined = bool(io_threads) and options.get("daemon_address") is None
+    with contextlib.ExitStack() as stack:
+        if pipelined:
+            readers = stack.enter_context(
+                ThreadPoolExecutor(io_threads, thread_name_prefix="clean-py-read")
+            )
+            read = partial(prefetch, max_size=options.get("max_file_size"))
+            futures = bounded_map(readers, read, files, queue_size)
+            items = (future.result() for future in futures)
+            worker = partial(clean_prefetched, **options, defer_write=options.get("write", True))
+        else:
+            items, worker = files, partial(clean_file, **options)
+        batched = _batches_py_files(**options)
+        if project_config:
+            items = ((item, _find_config(item, **options)) for item in items)
+        elif batched:
+            items = ((item, None) for item in items)
+        if batched:
+            items = _file_batches(items, DEFAULT_BATCH_SIZE)
+            worker = partial(_clean_file_batch, worker, **options)
+        elif project_config:
+            worker = partial(_clean_with_config, worker)
+
+        if jobs == 1:
+            stack.enter_context(memory_limit(max_memory))
+            results = map(worker, items)
+        else:
+            executor = get_worker_pool(jobs, max_memory)
+            futures = bounded_map(executor, worker, items, queue_size)
+            results = (future.result() for future in futures)
+        if batched:
+            results = itertools.chain.from_iterable(results)
+
+        if pipelined:
+            writers = stack.enter_context(
+                ThreadPoolExecutor(io_threads, thread_name_prefix="clean-py-write")
+            )
+            futures = bounded_map(writers, _write_result, results, queue_size)
+            results = (future.result() for future in futures)
+        yield from results
+
+
+def _find_config(
+    item: Union[Path, Prefetched], py: bool = True, ipynb: bool = True, **options
+) -> Optional[ProjectConfig]:
+    file_path = item.path if isinstance(item, Prefetched) else item
+    # files that won't be cleaned need no settings
+    return find_project_config(file_path) if is_selected(file_path, py, ipynb) else None
+
+
+def _clean_with_config(
+    worker: Callable[..., FileResult], item: Tuple[Union[Path, Prefetched], Optional[ProjectConfig]]
+) -> FileResult:
+    target, config = item
+    return worker(target, config=config)
+
+
+def _batches_py_files(
+    py: bool = True,
+    backend: str = DEFAULT_BACKEND,
+    daemon_address: Optional[Address] = None,
+    **options,
+) -> bool:
+    # the default backend gains nothing from batches, and the daemon cleans
+    # each file it is sent
+    return py and backend != DEFAULT_BACKEND and daemon_address is None
+
+
+def _file_batches(
+    items: Iterable[Tuple[Union[Path, Prefetched], Optional[ProjectConfig]]], batch_size: int
+) -> Iterator[List[Tuple[Union[Path, Prefetched], Optional[ProjectConfig]]]]:
+    # a batch is cleaned with a single config, so batches end where the project changes
+    for _, group in itertools.groupby(items, key=lambda item: item[1]):
+        yield from iter(lambda: list(itertools.islice(group, batch_size)), [])
+
+
+def _clean_file_batch(
+    worker: Callable[..., FileResult],
+    batch: List[Tuple[Union[Path, Prefetched], Optional[ProjectConfig]]],
+    autoflake: bool = True,
+    isort: bool = True,
+    black: bool = True,
+    cache: Optional[ResultCache] = None,
+    timeout: Optional[float] = None,
+    max_file_size: Optional[int] = None,
+    backend: str = DEFAULT_BACKEND,
+    **options,
+) -> List[FileResult]:
+    """Clean a batch of files of one project, the .py ones in one go where the backend can.
+
+    The .py files whose results aren't cached are read and cleaned with a
+    single `clean_batch` call, each file is then handed to `worker` with its
+    cleaned contents to write, diff and cache them. Files the batch couldn't
+    clean are cleaned one by one by `worker`, which reports their errors.
+    """
+    config = batch[0][1]
+    flags = py_flags(autoflake, isort, black, backend, config)
+    sources: Dict[int, str] = {}
+    for index, (target, _) in enumerate(batch):
+        file_path = target.path if isinstance(target, Prefetched) else target
+        if file_path.suffix != ".py":
+            continue
+        if isinstance(target, Prefetched):
+            source = target.source
+        else:
+            try:
+                check_file_size(file_path, max_file_size)
+                source = read_file(file_path)
+            except (OSError, UnicodeDecodeError, LimitExceeded):
+                continue
+        if source is not None and (cache is None or cache.get(source, flags) is None):
+            sources[index] = source
+
+    batched: Dict[int, str] = {}
+    seconds = 0.0
+    if len(sources) > 1:
+        start = time.perf_counter()
+        try:
+            with time_limit(timeout):
+                cleaned = get_backend(backend).clean_batch(
+                    list(sources.values()), config, autoflake=autoflake, isort=isort, black=black
+                )
+            batched = dict(zip(sources, cleaned))
+            seconds = (time.perf_counter() - start) / len(sources)
+        except (Exception, CleanTimeout) as e:
+            # clean the files one by one, to tell which ones fail or are slow
+            logging.debug(f"Unable to clean a batch of files with {backend}: {e}")
+
+    results = []
+    for index, (target, config) in enumerate(batch):
+        file_options = dict(config=config)
+        if index in batched:
+            file_options.update(cleaned=batched[index])
+            if not isinstance(target, Prefetched):
+                file_options.update(source=sources[index])
+        result = worker(target, **file_options)
+        if index in batched and result.seconds is not None:
+            result = result._replace(seconds=result.seconds + seconds)
+        results.append(result)
+    return results
+
+
+def is_selected(file_path: Path, py: bool = True, ipynb: bool = True) -> bool:
+    """Whether a file is of a type being cleaned."""
+    return (py and file_path.suffix == ".py") or (ipynb and file_path.suffix == ".ipynb")
+
+
+def iter_paths(
+    paths: Iterable[Union[str, Path]],
+    py: bool = True,
+    ipynb: bool = True,
+    exclude: Optional[Sequence[str]] = None,
+    include: Optional[Sequence[str]] = None,
+    use_gitignore: bool = True,
+) -> Iterator[Path]:
+    """List the files to clean among some files and directories.
+
+    Files are taken as given if of a selected type, directories are walked.
+
+    Args:
+        paths: Files and directories.
+        py: Whether to select .py files.
+        ipynb: Whether to select .ipynb files.
+        exclude: Globs for files and directories to skip within directories.
+        include: Globs files within directories must match, all files if empty.
+        use_gitignore: Whether to honour .gitignore files within directories.
+
+    Yields:
+        Paths of the files to clean.
+    """
+    for path in map(Path, paths):
+        if path.is_dir():
+            files = iter_files(path, exclude=exclude, include=include, use_gitignore=use_gitignore)
+        else:
+            files = iter([path])
+        yield from (file_path for file_path in files if is_selected(file_path, py, ipynb))
+
+
+def clean_paths(
+    paths: Iterable[Union[str, Path]],
+    jobs: int = 1,
+    exclude: Optional[Sequence[str]] = None,
+    include: Optional[Sequence[str]] = None,
+    use_gitignore: bool = True,
+    **options,
+) -> List[FileResult]:
+    """Clean many files and directories, without printing anything.
+
+    Pass `write=False` to only find out which files would change, and
+    `diff=True` to also get the diffs.
+
+    Args:
+        paths: Files and directories to clean, directories are walked.
+        jobs: Number of worker processes, 1 to run in-process, 0 for all
+            cores. Worker processes are reused by later calls.
+        exclude: Globs for files and directories to skip within directories.
+        include: Globs files within directories must match, all files if empty.
+        use_gitignore: Whether to honour .gitignore files within directories.
+        **options: Keyword arguments forwarded to `iter_results` and `clean_file`.
+
+    Returns:
+        FileResult for each file, in the order they were found.
+    """
+    files = iter_paths(
+        paths,
+        py=options.get("py", True),
+        ipynb=options.get("ipynb", True),
+        exclude=exclude,
+        include=include,
+        use_gitignore=use_gitignore,
+    )
+    return list(iter_results(files, jobs=jobs, **options))
+
+
+def clean_named_source(
+    name: str,
+    source: str,
+    autoflake: bool = True,
+    isort: bool = True,
+    black: bool = True,
+    cache: Optional[ResultCache] = None,
+    daemon_address: Optional[Address] = None,
+    profile: bool = False,
+    cell_cache_size: int = CELL_CACHE_SIZE,
+    cell_cache_dir: Optional[Path] = None,
+    dedupe_cells: bool = False,
+    drop_empty_cells: bool = False,
+    strip_magics: bool = False,
+    timeout: Optional[float] = None,
+    backend: str = DEFAULT_BACKEND,
+    config: Optional[ProjectConfig] = None,
+    cleaned: Optional[str] = None,
+) -> SourceResult:
+    """Clean a source held in memory, its file type taken from its name.
+
+    Args:
+        name: File name of the source, whose suffix sets the file type.
+        source: Contents to clean.
+        autoflake: Whether to remove unused imports using autoflake.
+        isort: Whether to sort imports using isort.
+        black: Whether to format code using black.
+        cache: Result cache used to skip sources that were cleaned before.
+        daemon_address: Address of a `clean-py serve` daemon to clean through.
+        profile: Whether to time the stages of cleaning the source.
+        cell_cache_size: Number of formatted notebook cells this process keeps
+            in memory across sources, 0 to disable the in-memory cell cache.
+        cell_cache_dir: Directory of the on-disk tier of the cell cache.
+        dedupe_cells: Whether to drop notebook cells repeating an earlier cell.
+        drop_empty_cells: Whether to drop notebook cells with a blank source.
+        strip_magics: Whether to remove magics and shell escapes from code cells.
+        timeout: Seconds cleaning may take before the source is given up on.
+        backend: Name of the backend cleaning .py sources, see `backends`.
+        config: Formatter settings to clean with, e.g. those of the project
+            the source would be saved in, see `config.find_project_config`.
+            None for the defaults.
+        cleaned: The cleaned source if already known, e.g. from a batch run of
+            the backend, only the result cache is updated then.
+
+    Returns:
+        SourceResult holding the cleaned source.
+    """
+    file_type = Path(name).suffix[1:]
+    if file_type not in ("py", "ipynb"):
+        return SourceResult(name, SKIPPED, error=f"Unsupported file type for {name}")
+
+    options = dict(autoflake=autoflake, isort=isort, black=black)
+    flags = dict(file_type=file_type, **options)
+    if file_type == "ipynb":
+        options.update(
+            clear_output=True,
+            dedupe_cells=dedupe_cells,
+            drop_empty_cells=drop_empty_cells,
+            strip_magics=strip_magics,
+        )
+        flags.update(options)
+    elif backend != DEFAULT_BACKEND:
+        options.update(backend=backend)
+    flags.update(config_flags(config))
+    with contextlib.ExitStack() as stack:
+        timings = stack.enter_context(record()) if profile else None
+        start = time.perf_counter()
+        try:
+            if file_type == "py":
+                flags.update(backend_flags(backend))
+            if cleaned is None and cache is not None:
+                cleaned = cache.get(source, flags)
+            if cleaned is None:
+                if daemon_address is not None:
+                    cleaned = clean_with_daemon(
+                        source, file_type, daemon_address, config=config, **options
+                    )
+                else:
+                    if file_type == "ipynb" and (cell_cache_size or cell_cache_dir):
+                        options["cell_cache"] = get_cell_cache(cell_cache_size, cell_cache_dir)
+                    with time_limit(timeout):
+                        cleaned = clean_source(source, file_type, config=config, **options)
+                if cache is not None:
+                    cache.set(source, cleaned, flags)
+        except (json.JSONDecodeError, InvalidNotebookError) as e:
+            return SourceResult(name, INVALID, error=str(e))
+        except CleanTimeout:
+            return SourceResult(name, OVER_LIMIT, error=f"Cleaning took longer than {timeout:g}s")
+        except MemoryError:
+            return SourceResult(name, OVER_LIMIT, error="Cleaning went over the memory limit")
+        except Exception as e:
+            return SourceResult(name, FAILED, error=str(e), details=traceback.format_exc())
+        seconds = time.perf_counter() - start
+    return SourceResult(
+        name, CLEANED, cleaned, cleaned != source, seconds=seconds, timings=timings
+    )
+
+
+def _clean_source_batch(items: List[Tuple[str, str]], **options) -> List[SourceResult]:
+    """Clean a batch of sources, the .py ones in one go where the backend can."""
+    backend = options.get("backend", DEFAULT_BACKEND)
+    py_items = [(index, source) for index, (name, source) in enumerate(items) if name.endswith(".py")]
+    batched: Dict[int, str] = {}
+    seconds = None
+    if backend != DEFAULT_BACKEND and options.get("daemon_address") is None and len(py_items) > 1:
+        flags = {name: options.get(name, True) for name in ("autoflake", "isort", "black")}
+        start = time.perf_counter()
+        try:
+            with time_limit(options.get("timeout")):
+                cleaned = get_backend(backend).clean_batch(
+                    [source for _, source in py_items], options.get("config"), **flags
+                )
+            batched = {index: source for (index, _), source in zip(py_items, cleaned)}
+            seconds = (time.perf_counter() - start) / len(py_items)
+        except (Exception, CleanTimeout) as e:
+            # clean the sources one by one, to tell which ones fail or are slow
+            logging.debug(f"Unable to clean a batch of sources with {backend}: {e}")
+
+    results = []
+    for index, (name, source) in enumerate(items):
+        result = clean_named_source(name, source, cleaned=batched.get(index), **options)
+        if index in batched:
+            result = result._replace(seconds=seconds)
+        results.append(result)
+    return results
+
+
+def clean_sources(
+    sources: Union[Mapping[str, str], Iterable[Tuple[str, str]]],
+    jobs: int = 1,
+    max_memory: Optional[int] = None,
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    **options,
+) -> List[SourceResult]:
+    """Clean many sources held in memory, without reading or writing any file.
+
+    Sources go to the workers in batches, and backends that can clean many
+    sources at once, like ruff, clean the .py sources of a batch in one run.
+
+    Args:
+        sources: File names and their contents, as a mapping or pairs. The
+            suffix of a name sets the file type of its source.
+        jobs: Number of worker processes, 1 to run in-process, 0 for all
+            cores. Worker processes are reused by later calls.
+        max_memory: Memory cap in bytes of each worker process, or of this
+            process while it cleans with a single job.
+        queue_size: Maximum number of batches handed to the workers ahead of
+            their results.
+        batch_size: Number of sources per batch.
+        **options: Keyword arguments forwarded to `clean_named_source`.
+
+    Returns:
+        SourceResult for each source, in input order.
+    """
+    items = iter(sources.items() if isinstance(sources, Mapping) else sources)
+    batches = iter(lambda: list(itertools.islice(items, batch_size)), [])
+    worker = partial(_clean_source_batch, **options)
+    if jobs == 1:
+        with memory_limit(max_memory):
+            return [result for batch in map(worker, batches) for result in batch]
+    executor = get_worker_pool(jobs, max_memory)
+    futures = bounded_map(executor, worker, batches, queue_size)
+    return [result for future in futures for result in future.result()]
@@ -0,0 +1,324 @@
+import abc
+import contextlib
+import os
+import shutil
+import subprocess
+import tempfile
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from .config import DEFAULT_CONFIG, ProjectConfig, black_mode, isort_config
+from .profiling import stage
+
+# Backend cleaning .py files unless another is asked for
+DEFAULT_BACKEND = "default"
+# Ruff rules standing in for autoflake: unused imports and unused variables
+RUFF_AUTOFLAKE_RULES = ("F401", "F841")
+# Ruff rules standing in for isort
+RUFF_ISORT_RULES = ("I",)
+# Seconds a ruff run may take before it is given up on
+RUFF_TIMEOUT = 300
+
+
+class BackendError(Exception):
+    """Raised when a backend is unknown, unavailable or fails to clean source."""
+
+
+class Backend(abc.ABC):
+    """Engine cleaning Python source: removing unused imports, sorting imports
+    and formatting.
+
+    The flags keep the names of the formatters of the default backend, whichever
+    engine does the work.
+    """
+
+    name = ""
+
+    def version(self) -> Optional[str]:
+        """Version of the engine, part of the cache key of what it cleans."""
+        return None
+
+    @abc.abstractmethod
+    def clean(
+        self,
+        source: str,
+        autoflake: bool = True,
+        isort: bool = True,
+        black: bool = True,
+        config: Optional[ProjectConfig] = None,
+    ) -> str:
+        """Clean Python source.
+
+        Args:
+            source: Python source code.
+            autoflake: Whether to remove unused imports and variables.
+            isort: Whether to sort imports.
+            black: Whether to format the code.
+            config: Settings of the project the source belongs to, None for
+                the defaults.
+
+        Returns:
+            Cleaned source.
+        """
+
+    def clean_batch(
+        self, sources: Sequence[str], config: Optional[ProjectConfig] = None, **flags: bool
+    ) -> List[str]:
+        """Clean many sources, in one go where the engine can.
+
+        Args:
+            sources: Python sources, all of the same project.
+            config: Settings of the project the sources belong to.
+            **flags: Flags forwarded to `clean`.
+
+        Returns:
+            The cleaned sources, in input order.
+        """
+        return [self.clean(source, config=config, **flags) for source in sources]
+
+
+class DefaultBackend(Backend):
+    """autoflake, isort and black, one after another."""
+
+    name = DEFAULT_BACKEND
+
+    def clean(
+        self,
+        source: str,
+        autoflake: bool = True,
+        isort: bool = True,
+        black: bool = True,
+        config: Optional[ProjectConfig] = None,
+    ) -> str:
+        # each formatter is imported only when its stage runs, to keep startup
+        # cheap for partial runs
+        if autoflake:
+            with stage("autoflake"):
+                from autoflake import fix_code
+
+                source = fix_code(source, **(config or DEFAULT_CONFIG).autoflake)
+
+        if isort:
+            with stage("isort"):
+                from isort import code
+
+                source = code(source, config=isort_config(config))
+
+        if black:
+            with stage("black"):
+                source = format_black(source, config)
+        return source
+
+
+def format_black(source: str, config: Optional[ProjectConfig] = None) -> str:
+    """Format Python source with black, in the style of a project's settings.
+
+    Args:
+        source: Python source code.
+        config: Settings of the project the source belongs to, None for
+            black's default style.
+
+    Returns:
+        Formatted source, unchanged if already formatted.
+    """
+    from black import NothingChanged, format_file_contents
+
+    with contextlib.suppress(NothingChanged):
+        return format_file_contents(source, fast=True, mode=black_mode(config))
+    return source
+
+
+def find_ruff() -> Optional[str]:
+    """Locate the ruff binary, preferring the one of the installed ruff package.
+
+    Returns:
+        Path to the binary, None if ruff is not installed.
+    """
+    try:
+        from ruff.__main__ import find_ruff_bin
+
+        return os.fsdecode(find_ruff_bin())
+    except (ImportError, FileNotFoundError):
+        return shutil.which("ruff")
+
+
+class RuffBackend(Backend):
+    """ruff, fixing unused and unsorted imports in one pass and formatting in another.
+
+    Ruff's own configuration is ignored, so it cleans to the style of the
+    default backend: black's, with isort's import order. Of a project's
+    settings, only black's line length carries over.
+
+    Args:
+        binary: Path to the ruff binary, found with `find_ruff` if None.
+
+    Raises:
+        BackendError: If ruff is not installed.
+    """
+
+    name = "ruff"
+
+    def __init__(self, binary: Optional[str] = None):
+        self.binary = binary or find_ruff()
+        if self.binary is None:
+            raise BackendError("The ruff backend needs ruff, install it with `pip install ruff`")
+        self._version: Optional[str] = None
+
+    def version(self) -> Optional[str]:
+        if self._version is None:
+            self._version = self._run(["--version"]).strip()
+        return self._version
+
+    def _run(self, args: List[str], source: Optional[str] = None) -> str:
+        try:
+            completed = subprocess.run(
+                [self.binary, *args],
+                input=source,
+                capture_output=True,
+                text=True,
+                check=True,
+                timeout=RUFF_TIMEOUT,
+            )
+        except subprocess.CalledProcessError as e:
+            raise BackendError(e.stderr.strip() or f"ruff {args[0]} failed") from e
+        except (OSError, subprocess.TimeoutExpired) as e:
+            raise BackendError(f"Unable to run ruff: {e}") from e
+        return completed.stdout
+
+    @staticmethod
+    def _style_args(config: Optional[ProjectConfig]) -> List[str]:
+        line_length = (config or DEFAULT_CONFIG).black.get("line_length")
+        return ["--isolated"] + (["--line-length", str(line_length)] if line_length else [])
+
+    @classmethod
+    def _check_args(
+        cls, autoflake: bool, isort: bool, config: Optional[ProjectConfig]
+    ) -> Optional[List[str]]:
+        rules = (RUFF_AUTOFLAKE_RULES if autoflake else ()) + (RUFF_ISORT_RULES if isort else ())
+        if not rules:
+            return None
+        return [
+            "check",
+            *cls._style_args(config),
+            "--select",
+            ",".join(rules),
+            # removing unused variables and __init__ imports counts as unsafe
+            "--fix",
+            "--unsafe-fixes",
+            "--exit-zero",
+            "--quiet",
+        ]
+
+    def clean(
+        self,
+        source: str,
+        autoflake: bool = True,
+        isort: bool = True,
+        black: bool = True,
+        config: Optional[ProjectConfig] = None,
+    ) -> str:
+        check_args = self._check_args(autoflake, isort, config)
+        format_args = ["format", *self._style_args(config)]
+        with stage("ruff"):
+            if check_args is not None:
+                source = self._run([*check_args, "--stdin-filename", "source.py", "-"], source)
+            if black:
+                source = self._run([*format_args, "--stdin-filename", "source.py", "-"], source)
+        return source
+
+    def clean_batch(
+        self, sources: Sequence[str], config: Optional[ProjectConfig] = None, **flags: bool
+    ) -> List[str]:
+        """Clean many sources with one run of ruff per pass, rather than per source.
+
+        The sources are written to a temporary directory and cleaned in place.
+        If ruff fails on any of them, they are cleaned one by one, so the
+        failure is raised for the source that caused it.
+        """
+        if len(sources) < 2:
+            return super().clean_batch(sources, config, **flags)
+        check_args = self._check_args(
+            flags.get("autoflake", True), flags.get("isort", True), config
+        )
+        with tempfile.TemporaryDirectory(prefix="clean-py-ruff-") as directory:
+            paths = [Path(directory) / f"source_{index}.py" for index in range(len(sources))]
+            for path, source in zip(paths, sources):
+                # newline="" keeps line endings as they are, like the stdin passes do
+                with open(path, "w", encoding="utf-8", newline="") as f:
+                    f.write(source)
+            try:
+                with stage("ruff"):
+                    if check_args is not None:
+                        self._run([*check_args, directory])
+                    if flags.get("black", True):
+                        self._run(["format", *self._style_args(config), directory])
+            except BackendError:
+                return super().clean_batch(sources, config, **flags)
+            cleaned = []
+            for path in paths:
+                with open(path, encoding="utf-8", newline="") as f:
+                    cleaned.append(f.read())
+        return cleaned
+
+
+# Factories of the backends by name, see `register_backend`
+_BACKENDS: Dict[str, Callable[[], Backend]] = {
+    DefaultBackend.name: DefaultBackend,
+    RuffBackend.name: RuffBackend,
+}
+# Backends created so far in this process
+_instances: Dict[str, Backend] = {}
+
+
+def register_backend(name: str, factory: Callable[[], Backend]) -> None:
+    """Make a backend available under a name, replacing any of the same name.
+
+    Args:
+        name: Name the backend is selected by, e.g. with `--backend`.
+        factory: Called once per process to create the backend, may raise
+            BackendError if the backend is unavailable.
+    """
+    _BACKENDS[name] = factory
+    _instances.pop(name, None)
+
+
+def backend_names() -> List[str]:
+    """Names of the registered backends."""
+    return list(_BACKENDS)
+
+
+def get_backend(name: str = DEFAULT_BACKEND) -> Backend:
+    """Return the backend of a name, creating it on first use in this process.
+
+    Args:
+        name: Name of a registered backend.
+
+    Returns:
+        The backend.
+
+    Raises:
+        BackendError: If no backend has that name or it is unavailable.
+    """
+    backend = _instances.get(name)
+    if backend is None:
+        if name not in _BACKENDS:
+            raise BackendError(f"Unknown backend '{name}', choose from {', '.join(_BACKENDS)}")
+        backend = _instances[name] = _BACKENDS[name]()
+    return backend
+
+
+def backend_flags(name: str) -> Dict[str, Any]:
+    """Cleaning flags telling apart results of a backend in the result cache.
+
+    The default backend adds none, so its results stay cached under the same
+    keys as before backends existed.
+
+    Args:
+        name: Name of the backend.
+
+    Returns:
+        Flags to add to the cache key.
+    """
+    if name == DEFAULT_BACKEND:
+        return {}
+    return dict(backend=name, backend_version=get_backend(name).version())
@@ -0,0 +1,264 @@
+import hashlib
+import json
+import os
+import tempfile
+from collections import OrderedDict
+from importlib.metadata import PackageNotFoundError, version
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple, Union
+
+from .profiling import count
+
+FORMATTERS = ("autoflake", "isort", "black")
+# Distribution name of clean-py itself, whose cleaning logic changes between releases
+PACKAGE = "clean-py"
+DEFAULT_MAX_SIZE = 64 * 1024 * 1024
+# Prefix of entries holding cleaned output, empty entries mark clean contents
+OUTPUT_PREFIX = "="
+# Nominal on-disk cost of an entry, so empty "already clean" markers still count
+ENTRY_OVERHEAD = 256
+# Formatted cell sources kept in memory by a CellCache
+CELL_CACHE_SIZE = 10_000
+# Subdirectory of the cache directory holding the on-disk tier of the cell cache
+CELL_CACHE_SUBDIR = "cells"
+
+
+def default_cache_dir() -> Path:
+    """Return the per-user cache directory, honouring XDG_CACHE_HOME.
+
+    Returns:
+        Path to the clean-py cache directory.
+    """
+    cache_home = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(cache_home) / "clean-py"
+
+
+def formatter_versions() -> Dict[str, Optional[str]]:
+    """Read installed formatter and clean-py versions from package metadata.
+
+    This avoids importing the formatters themselves. clean-py's own version is
+    included, so results cached by a build with different cleaning logic miss.
+
+    Returns:
+        Mapping of package name to version, None if not installed.
+    """
+    versions = {}
+    for formatter in (*FORMATTERS, PACKAGE):
+        try:
+            versions[formatter] = version(formatter)
+        except PackageNotFoundError:
+            versions[formatter] = None
+    return versions
+
+
+class ResultCache:
+    """Persistent content-addressed cache of cleaning results.
+
+    Entries are keyed on the hash of the input contents, the formatter and
+    clean-py versions and the cleaning flags. An empty entry marks contents that are already
+    clean, otherwise the entry holds the cleaned output.
+
+    Args:
+        cache_dir: Directory holding cache entries, defaults to `default_cache_dir`.
+        max_size: Approximate size budget in bytes enforced by `prune`.
+    """
+
+    def __init__(
+        self, cache_dir: Optional[Union[str, Path]] = None, max_size: int = DEFAULT_MAX_SIZE
+    ):
+        self.cache_dir = Path(cache_dir) if cache_dir else default_cache_dir()
+        self.max_size = max_size
+        self.versions = formatter_versions()
+
+    def key(self, contents: str, flags: Dict[str, Any]) -> str:
+        """Compute the cache key for some file contents.
+
+        Args:
+            contents: File contents.
+            flags: Cleaning flags the contents are processed with.
+
+        Returns:
+            Hex digest identifying the contents, flags and package versions.
+        """
+        digest = hashlib.sha256()
+        digest.update(json.dumps([self.versions, flags], sort_keys=True).encode())
+        digest.update(b"\0")
+        digest.update(contents.encode("utf-8", "surrogatepass"))
+        return digest.hexdigest()
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / key
+
+    def get(self, contents: str, flags: Dict[str, Any]) -> Optional[str]:
+        """Look up the cleaned output for some contents.
+
+        Args:
+            contents: File contents.
+            flags: Cleaning flags the contents are processed with.
+
+        Returns:
+            The cleaned contents, or None on a cache miss.
+        """
+        entry_path = self._entry_path(self.key(contents, flags))
+        try:
+            with open(entry_path, encoding="utf-8") as f:
+                cleaned = f.read()
+            # refresh the mtime so eviction drops the least recently used entries
+            os.utime(entry_path)
+        except (OSError, UnicodeDecodeError):
+            return None
+        if cleaned.startswith(OUTPUT_PREFIX):
+            return cleaned[len(OUTPUT_PREFIX) :]
+        return contents
+
+    def set(self, contents: str, cleaned: str, flags: Dict[str, Any]) -> None:
+        """Record the cleaned output for some contents.
+
+        The cleaned output is also recorded as already clean, so the next run over
+        the rewritten file is a hit.
+
+        Args:
+            contents: Original file contents.
+            cleaned: Cleaned file contents.
+            flags: Cleaning flags the contents were processed with.
+        """
+        self._write_entry(self.key(cleaned, flags), "")
+        if cleaned != contents:
+            self._write_entry(self.key(contents, flags), OUTPUT_PREFIX + cleaned)
+
+    def _write_entry(self, key: str, value: str) -> None:
+        entry_path = self._entry_path(key)
+        try:
+            entry_path.parent.mkdir(parents=True, exist_ok=True)
+            # write then rename, so concurrent workers never see partial entries
+            fd, tmp_path = tempfile.mkstemp(dir=entry_path.parent)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(value)
+            os.replace(tmp_path, entry_path)
+        except OSError:
+            # the cache is best effort, never fail a run because of it
+            pass
+
+    def prune(self) -> None:
+        """Evict least recently used entries until the cache fits in `max_size`."""
+        entries = []
+        total_size = 0
+        if not self.cache_dir.is_dir():
+            return
+        for shard in os.scandir(self.cache_dir):
+            # entries live in two character shards, leave other directories alone
+            if len(shard.name) != 2 or not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                size = stat.st_size + ENTRY_OVERHEAD
+                entries.append((stat.st_mtime, size, entry.path))
+                total_size += size
+
+        if total_size <= self.max_size:
+            return
+        # evict down to 80% of the budget to avoid pruning on every run
+        target_size = self.max_size * 0.8
+        for _, size, entry_path in sorted(entries):
+            if total_size <= target_size:
+                break
+            try:
+                os.remove(entry_path)
+            except OSError:
+                continue
+            total_size -= size
+
+
+class CellCache:
+    """Memo of formatted notebook cell sources, shared across notebooks.
+
+    Notebooks are often copy-pasted, so the same cell source turns up in many
+    files. Lookups go to an in-memory LRU first, then to an optional on-disk
+    `ResultCache` shared by every process and run. Hits and misses are counted
+    on the cache and, while profiling, as "cell cache" counters.
+
+    Args:
+        max_entries: Number of formatted sources kept in memory, 0 to only use
+            the disk tier.
+        cache_dir: Directory of the on-disk tier, None to keep entries in memory only.
+    """
+
+    def __init__(
+        self, max_entries: int = CELL_CACHE_SIZE, cache_dir: Optional[Union[str, Path]] = None
+    ):
+        self.max_entries = max_entries
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.disk = ResultCache(self.cache_dir) if self.cache_dir else None
+        self._entries: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self) -> float:
+        """Share of lookups answered from memory or disk, 0 before any lookup."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def get(self, source: str, flags: Dict[str, Any]) -> Optional[str]:
+        """Look up the formatted version of a cell source.
+
+        Args:
+            source: Cell source.
+            flags: Formatter settings the source is formatted with.
+
+        Returns:
+            The formatted source, or None on a cache miss.
+        """
+        key = (json.dumps(flags, sort_keys=True), source)
+        formatted = self._entries.get(key)
+        if formatted is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            count("cell cache hits")
+            return formatted
+
+        if self.disk is not None:
+            formatted = self.disk.get(source, flags)
+            if formatted is not None:
+                self._remember(key, formatted)
+                self.hits += 1
+                self.disk_hits += 1
+                count("cell cache hits")
+                count("cell cache disk hits")
+                return formatted
+
+        self.misses += 1
+        count("cell cache misses")
+        return None
+
+    def set(self, source: str, formatted: str, flags: Dict[str, Any]) -> None:
+        """Record the formatted version of a cell source.
+
+        Args:
+            source: Cell source.
+            formatted: Formatted cell source.
+            flags: Formatter settings the source was formatted with.
+        """
+        token = json.dumps(flags, sort_keys=True)
+        self._remember((token, source), formatted)
+        # formatting is idempotent, the output is already formatted
+        self._remember((token, formatted), formatted)
+        if self.disk is not None:
+            self.disk.set(source, formatted, flags)
+
+    def _remember(self, key: Tuple[str, str], formatted: str) -> None:
+        if not self.max_entries:
+            return
+        self._entries[key] = formatted
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def prune(self) -> None:
+        """Evict least recently used entries of the disk tier, if any."""
+        if self.disk is not None:
+            self.disk.prune()
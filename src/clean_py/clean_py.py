@@ -1,17 +1,46 @@
-import contextlib
-from json import dump, load
-from multiprocessing import cpu_count
-from multiprocessing.dummy import Pool
+import ast
+import difflib
+import multiprocessing
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from pathlib import Path
-from subprocess import run
 import logging
-from typing import List, Dict, Any, Union
-
-from autoflake import fix_code
-from black import DEFAULT_LINE_LENGTH, FileMode, NothingChanged, format_file_contents
-from isort import code
-
-pool = Pool(cpu_count())
+from typing import Callable, List, Dict, Any, FrozenSet, NamedTuple, Optional, Union
+
+from .backends import DEFAULT_BACKEND, backend_flags, format_black, get_backend
+from .cache import CELL_CACHE_SIZE, CellCache, ResultCache
+from .config import ProjectConfig, black_mode, config_flags
+from .notebook import (
+    STREAM_CHUNK_SIZE,
+    dumps_notebook,
+    load_notebook_without_outputs,
+    loads_notebook,
+    normalize_notebook,
+)
+from .limits import check_file_size, time_limit
+from .profiling import stage
+
+# Notebooks with at least this many code cells are formatted across processes
+CELL_POOL_THRESHOLD = 200
+# Notebooks from this size are streamed when clearing outputs, never loading them
+STREAM_NOTEBOOK_SIZE = 16 * 1024 * 1024
+_cell_pool: Optional[ProcessPoolExecutor] = None
+_cell_cache: Optional[CellCache] = None
+# Formatter settings code cells are formatted with, part of the cell cache key
+CELL_FLAGS = dict(black=True, is_notebook_cell=True)
+
+# Placed between cells when a notebook is formatted in a single black pass. It is
+# a statement rather than a comment, so trailing comments stay with their cell.
+CELL_SEPARATOR = "__clean_py_cell_separator__"
+
+# Cell metadata describing how outputs were displayed, dropped along with them
+OUTPUT_METADATA_FIELDS = ("collapsed", "scrolled")
+# Lines starting with these are IPython magics, shell escapes or help queries
+MAGIC_PREFIXES = ("%", "!", "?")
+# Cells starting with this run their body through a cell magic, e.g. %%bash
+CELL_MAGIC_PREFIX = "%%"
 
 
 def remove_duplicate_cells(cells: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
@@ -23,19 +52,16 @@ def remove_duplicate_cells(cells: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     Returns:
         List of unique cells with duplicates removed.
     """
-    cell_set_strings = []
-    cell_set = []
-    for e in cells:
-        if e["source"] in cell_set_strings:
-            continue
-        cell_set_strings.append(e["source"])
-        cell_set.append(e)
-    return cell_set
+    return apply_cell_passes(cells, clear_output=False, dedupe_cells=True)
 
 
 def remove_empty_cells(cells: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """Remove empty cells from a Jupyter notebook.
 
+    Cells whose source is at most two characters, or list items, long count
+    as empty. The drop_empty_cells pass of `apply_cell_passes` only drops
+    blank cells.
+
     Args:
         cells: List of notebook cell dictionaries.
 
@@ -48,6 +74,9 @@ def remove_empty_cells(cells: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
 def remove_magics(source: str) -> str:
     """Remove Jupyter magic commands from cell source code.
 
+    Blank lines are dropped as well. The strip_magics pass of
+    `apply_cell_passes` keeps blank lines and strips shell escapes too.
+
     Args:
         source: Cell source code as string.
 
@@ -68,12 +97,74 @@ def remove_magics(source: str) -> str:
     return "\n".join(non_magic_source)
 
 
+def _strip_magic_lines(source: str) -> str:
+    # magics, shell escapes and source queries, checked on the first character
+    lines = source.split("\n")
+    return "\n".join(line for line in lines if not line.startswith(MAGIC_PREFIXES))
+
+
+def apply_cell_passes(
+    cells: List[Dict[str, Any]],
+    clear_output: bool = True,
+    dedupe_cells: bool = False,
+    drop_empty_cells: bool = False,
+    strip_magics: bool = False,
+) -> List[Dict[str, Any]]:
+    """Apply the cell level notebook passes in a single traversal of the cells.
+
+    Magics are stripped from code cells first, so cells holding nothing but
+    magics count as empty. Cells starting with a cell magic like `%%bash` hold
+    no Python at all and are left as they are. Duplicates are cells whose
+    source, as stored, equals that of an earlier cell, whatever their type, as
+    in `remove_duplicate_cells` of earlier releases. The first occurrence is kept.
+
+    Args:
+        cells: List of notebook cell dictionaries, modified in place.
+        clear_output: Whether to clear the outputs of code cells.
+        dedupe_cells: Whether to drop cells repeating an earlier cell.
+        drop_empty_cells: Whether to drop cells with a blank source.
+        strip_magics: Whether to remove magics and shell escapes from code cells.
+
+    Returns:
+        List of the cells that were kept.
+    """
+    needs_source = dedupe_cells or drop_empty_cells or strip_magics
+    seen = set()
+    kept = []
+    for cell in cells:
+        is_code = cell["cell_type"] == "code"
+        if is_code and clear_output:
+            _clear_cell_output(cell)
+        if not needs_source:
+            kept.append(cell)
+            continue
+
+        source = _join_source(cell["source"])
+        if is_code and strip_magics and not source.startswith(CELL_MAGIC_PREFIX):
+            stripped = _strip_magic_lines(source)
+            if stripped != source:
+                source = stripped
+                cell["source"] = _split_source(source)
+        if drop_empty_cells and not source.strip():
+            continue
+        if dedupe_cells:
+            raw = cell["source"]
+            key = tuple(raw) if isinstance(raw, list) else raw
+            if key in seen:
+                continue
+            seen.add(key)
+        kept.append(cell)
+    return kept
+
+
 def clean_python_code(
     python_source: str,
     isort: bool = True,
     black: bool = True,
     autoflake: bool = True,
     is_notebook_cell: bool = False,
+    backend: str = DEFAULT_BACKEND,
+    config: Optional[ProjectConfig] = None,
 ) -> str:
     """Clean Python source code using various formatting tools.
 
@@ -83,52 +174,41 @@ def clean_python_code(
         black: Whether to format code using black.
         autoflake: Whether to remove unused imports using autoflake.
         is_notebook_cell: Whether the source is from a notebook cell.
+        backend: Name of the backend cleaning the source, see `backends`.
+        config: Formatter settings of the project the source belongs to, see
+            `config.find_project_config`. None for the defaults.
 
     Returns:
         Cleaned Python source code.
-    """
-    # run source code string through autoflake, isort, and black
-    formatted_source = python_source
 
+    Raises:
+        BackendError: If the backend is unknown or unavailable.
+    """
     # For notebook cells, only apply black formatting to preserve imports
     if is_notebook_cell:
         if black:
-            mode = FileMode(
-                line_length=DEFAULT_LINE_LENGTH,
-                is_pyi=False,
-                string_normalization=True,
-            )
-            with contextlib.suppress(NothingChanged):
-                formatted_source = format_file_contents(
-                    formatted_source, fast=True, mode=mode
-                )
-        return formatted_source
-
-    # For regular Python files, apply all formatters
-    if autoflake:
-        formatted_source = fix_code(
-            formatted_source,
-            expand_star_imports=True,
-            remove_all_unused_imports=True,
-            remove_duplicate_keys=True,
-            remove_unused_variables=True,
-        )
+            with stage("black"):
+                return format_black(python_source, config)
+        return python_source
+
+    # run source code string through autoflake, isort, and black, or their
+    # stand-ins in another backend
+    return get_backend(backend).clean(
+        python_source, autoflake=autoflake, isort=isort, black=black, config=config
+    )
 
-    if isort:
-        formatted_source = code(formatted_source)
 
-    if black:
-        mode = FileMode(
-            line_length=DEFAULT_LINE_LENGTH,
-            is_pyi=False,
-            string_normalization=True,
-        )
-        with contextlib.suppress(NothingChanged):
-            formatted_source = format_file_contents(
-                formatted_source, fast=True, mode=mode
-            )
+def read_file(file_path: Union[str, Path]) -> str:
+    """Read the contents of a file to clean.
 
-    return formatted_source
+    Args:
+        file_path: Path to the file.
+
+    Returns:
+        Contents of the file.
+    """
+    with open(file_path, "r") as file:
+        return file.read()
 
 
 def create_file(file_path: Path, contents: str) -> None:
@@ -138,12 +218,114 @@ def create_file(file_path: Path, contents: str) -> None:
         file_path: Path to the file.
         contents: Contents to write to the file.
     """
-    file_path.touch()
     with file_path.open("w", encoding="utf-8") as f:
         f.write(contents)
 
 
-def clean_py(py_file_path: Union[str, Path], autoflake: bool = True, isort: bool = True, black: bool = True) -> None:
+class CleanResult(NamedTuple):
+    # None when the original contents were never held in memory
+    source: Optional[str]
+    cleaned: str
+    changed: bool
+
+
+def rewrite_file(
+    file_path: Path,
+    clean: Callable[[str], str],
+    flags: Dict[str, Any],
+    cache: Optional[ResultCache] = None,
+    write: bool = True,
+    timeout: Optional[float] = None,
+    source: Optional[str] = None,
+) -> CleanResult:
+    """Clean the contents of a file, writing them back only if they changed.
+
+    Args:
+        file_path: Path to the file.
+        clean: Function returning the cleaned version of the contents.
+        flags: Cleaning flags, part of the cache key.
+        cache: Result cache used to skip contents that were cleaned before.
+        write: Whether to write changes back, False to only report them.
+        timeout: Seconds `clean` may run for, the file is left untouched if it
+            takes longer. None for no limit.
+        source: Contents of the file if already read, e.g. ahead of time by
+            `pipeline.prefetch`.
+
+    Returns:
+        CleanResult with the original and cleaned contents.
+
+    Raises:
+        CleanTimeout: If cleaning took longer than `timeout`.
+    """
+    if source is None:
+        with stage("read"):
+            source = read_file(file_path)
+
+    cleaned = None
+    if cache is not None:
+        with stage("cache"):
+            cleaned = cache.get(source, flags)
+    cache_hit = cleaned is not None
+    if not cache_hit:
+        with time_limit(timeout):
+            cleaned = clean(source)
+
+    # leave unchanged files alone, rewriting them only churns mtimes
+    if write and cleaned != source:
+        with stage("write"):
+            create_file(file_path, cleaned)
+    if cache is not None and not cache_hit:
+        with stage("cache"):
+            cache.set(source, cleaned, flags)
+    return CleanResult(source, cleaned, cleaned != source)
+
+
+def unified_diff(source: str, cleaned: str, file_path: Union[str, Path]) -> str:
+    """Render the changes cleaning makes to a file as a unified diff.
+
+    The paths in the header get git's `a/` and `b/` prefixes, so the diff of
+    files given relative to the root of a repository applies with `git apply`
+    or `patch -p1`.
+
+    Args:
+        source: Original contents.
+        cleaned: Cleaned contents.
+        file_path: Path shown in the diff header.
+
+    Returns:
+        The diff, empty if the contents are identical.
+    """
+    path = Path(file_path).as_posix()
+    diff_lines = difflib.unified_diff(
+        _diff_lines(source),
+        _diff_lines(cleaned),
+        fromfile=f"a/{path}\t(original)",
+        tofile=f"b/{path}\t(cleaned)",
+    )
+    return "".join(diff_lines)
+
+
+def _diff_lines(contents: str) -> List[str]:
+    lines = contents.splitlines(keepends=True)
+    if lines and not lines[-1].endswith("\n"):
+        lines[-1] += "\n\\ No newline at end of file\n"
+    return lines
+
+
+def clean_py(
+    py_file_path: Union[str, Path],
+    autoflake: bool = True,
+    isort: bool = True,
+    black: bool = True,
+    cache: Optional[ResultCache] = None,
+    write: bool = True,
+    timeout: Optional[float] = None,
+    max_size: Optional[int] = None,
+    source: Optional[str] = None,
+    backend: str = DEFAULT_BACKEND,
+    config: Optional[ProjectConfig] = None,
+    cleaned: Optional[str] = None,
+) -> CleanResult:
     """Clean a Python file using various formatting tools.
 
     Args:
@@ -151,67 +333,503 @@ def clean_py(py_file_path: Union[str, Path], autoflake: bool = True, isort: bool
         autoflake: Whether to remove unused imports using autoflake.
         isort: Whether to sort imports using isort.
         black: Whether to format code using black.
+        cache: Result cache used to skip contents that were cleaned before.
+        write: Whether to write changes back, False to only report them.
+        timeout: Seconds cleaning may take, None for no limit.
+        max_size: Size in bytes over which the file is refused, None for no limit.
+        source: Contents of the file if already read.
+        backend: Name of the backend cleaning the source, see `backends`.
+        config: Formatter settings of the project the file belongs to.
+        cleaned: The cleaned source if already known, e.g. from a batch run of
+            the backend over `source`, only the file and the result cache are
+            updated then.
+
+    Returns:
+        CleanResult with the original and cleaned source.
+
+    Raises:
+        LimitExceeded: If the file is larger than `max_size`.
+        CleanTimeout: If cleaning took longer than `timeout`, the file is left
+            untouched.
     """
-    py_file_path = Path(py_file_path)
-    with open(py_file_path, "r") as file:
-        source = file.read()
+    check_file_size(py_file_path, max_size)
+
+    def clean(source: str) -> str:
+        if cleaned is not None:
+            return cleaned
+        return clean_python_code(
+            source, autoflake=autoflake, isort=isort, black=black, backend=backend, config=config
+        )
+
+    flags = py_flags(autoflake, isort, black, backend, config)
+    return rewrite_file(Path(py_file_path), clean, flags, cache, write, timeout, source)
 
-    clean_lines = clean_python_code(source, autoflake=autoflake, isort=isort, black=black)
-    create_file(py_file_path, clean_lines)
 
+def py_flags(
+    autoflake: bool = True,
+    isort: bool = True,
+    black: bool = True,
+    backend: str = DEFAULT_BACKEND,
+    config: Optional[ProjectConfig] = None,
+) -> Dict[str, Any]:
+    """Cleaning flags a .py file's result is cached under, see `clean_py`."""
+    flags = dict(file_type="py", autoflake=autoflake, isort=isort, black=black)
+    flags.update(backend_flags(backend))
+    flags.update(config_flags(config))
+    return flags
 
-def clear_ipynb_output(ipynb_file_path: Union[str, Path]) -> None:
+
+def clear_ipynb_output(ipynb_dict: Dict[str, Any]) -> Dict[str, Any]:
     """Clear cell outputs and reset execution counts in a Jupyter notebook.
 
+    Equivalent to nbconvert's ClearOutputPreprocessor, applied in place to the
+    loaded notebook rather than through a `jupyter nbconvert` subprocess.
+
     Args:
-        ipynb_file_path: Path to the notebook file.
+        ipynb_dict: Loaded notebook dictionary.
+
+    Returns:
+        The same notebook dictionary with outputs cleared.
+    """
+    for cell in ipynb_dict["cells"]:
+        if cell["cell_type"] == "code":
+            _clear_cell_output(cell)
+    return ipynb_dict
+
+
+def _clear_cell_output(cell: Dict[str, Any]) -> None:
+    cell["outputs"] = []
+    cell["execution_count"] = None
+    metadata = cell.get("metadata")
+    if metadata:
+        for field in OUTPUT_METADATA_FIELDS:
+            metadata.pop(field, None)
+
+
+def get_cell_pool() -> ProcessPoolExecutor:
+    """Return the process pool shared by all notebooks, creating it on first use.
+
+    Returns:
+        Process pool used to format the cells of large notebooks.
+    """
+    global _cell_pool
+    if _cell_pool is None:
+        _cell_pool = ProcessPoolExecutor(mp_context=multiprocessing.get_context("spawn"))
+    return _cell_pool
+
+
+def shutdown_cell_pool() -> None:
+    """Shut down the shared cell pool, if it was ever started."""
+    global _cell_pool
+    if _cell_pool is not None:
+        _cell_pool.shutdown()
+        _cell_pool = None
+
+
+def get_cell_cache(
+    max_entries: int = CELL_CACHE_SIZE, cache_dir: Optional[Union[str, Path]] = None
+) -> CellCache:
+    """Return the cell cache shared by all notebooks of this process.
+
+    The cache is created on first use and replaced when asked for different
+    settings, so pool workers keep their memo across the files they clean.
+
+    Args:
+        max_entries: Number of formatted cell sources kept in memory.
+        cache_dir: Directory of the on-disk tier, None to keep entries in memory only.
+
+    Returns:
+        The process-wide cell cache.
+    """
+    global _cell_cache
+    cache_dir = Path(cache_dir) if cache_dir else None
+    if _cell_cache is None or (_cell_cache.max_entries, _cell_cache.cache_dir) != (
+        max_entries,
+        cache_dir,
+    ):
+        _cell_cache = CellCache(max_entries, cache_dir)
+    return _cell_cache
+
+
+def clean_ipynb_cells(
+    cells: List[Dict[str, Any]],
+    cell_pool_threshold: int = CELL_POOL_THRESHOLD,
+    batch_cells: bool = True,
+    cell_cache: Optional[CellCache] = None,
+    config: Optional[ProjectConfig] = None,
+) -> List[Dict[str, Any]]:
+    """Clean the cells of a notebook, inline or across the shared process pool.
+
+    Formatting is CPU bound, so small notebooks are cleaned inline and only
+    notebooks with enough code cells to amortise the inter-process overhead are
+    sent to the pool. With a cell cache, only sources it doesn't know are
+    formatted, each of them once.
+
+    Args:
+        cells: List of notebook cell dictionaries.
+        cell_pool_threshold: Minimum number of code cells for the process pool
+            to be used, 0 to always clean inline.
+        batch_cells: Whether to format code cells together in a single black
+            pass (per pool worker) instead of one call per cell.
+        cell_cache: Memo of formatted cell sources, shared across notebooks.
+        config: Formatter settings of the project the notebook belongs to.
+
+    Returns:
+        List of cleaned cells.
+    """
+    code_cells = [cell for cell in cells if cell["cell_type"] == "code"]
+    sources = [_join_source(cell["source"]) for cell in code_cells]
+
+    if cell_cache is None:
+        formatted_sources = _format_cell_sources(
+            sources, cell_pool_threshold, batch_cells, config
+        )
+    else:
+        # copy-pasted cells are looked up and formatted once
+        cell_flags = dict(CELL_FLAGS, **config_flags(config))
+        unique_sources = list(dict.fromkeys(sources))
+        with stage("cell cache"):
+            known = {source: cell_cache.get(source, cell_flags) for source in unique_sources}
+        missing = [source for source, formatted in known.items() if formatted is None]
+        formatted_missing = _format_cell_sources(
+            missing, cell_pool_threshold, batch_cells, config
+        )
+        with stage("cell cache"):
+            for source, formatted in zip(missing, formatted_missing):
+                known[source] = formatted
+                if formatted is not None:
+                    cell_cache.set(source, formatted, cell_flags)
+        formatted_sources = [known[source] for source in sources]
+
+    for cell, formatted in zip(code_cells, formatted_sources):
+        if formatted is not None:
+            cell["source"] = _split_source(formatted)
+    return cells
+
+
+def _format_cell_sources(
+    sources: List[str],
+    cell_pool_threshold: int,
+    batch_cells: bool,
+    config: Optional[ProjectConfig] = None,
+) -> List[Optional[str]]:
+    """Format code cell sources, None for those that could not be formatted."""
+    format_cell = partial(_format_cell, config=config)
+    if not batch_cells:
+        if not cell_pool_threshold or len(sources) < cell_pool_threshold:
+            return [format_cell(source) for source in sources]
+
+        chunksize = max(1, len(sources) // (4 * (os.cpu_count() or 1)))
+        with stage("cell pool"):
+            return list(get_cell_pool().map(format_cell, sources, chunksize=chunksize))
+
+    formatted_sources: List[Optional[str]] = [None] * len(sources)
+    batch_indices, batch_sources = [], []
+    for index, source in enumerate(sources):
+        if _is_batchable(source):
+            batch_indices.append(index)
+            batch_sources.append(source)
+        else:
+            formatted_sources[index] = format_cell(source)
+
+    if not cell_pool_threshold or len(batch_sources) < cell_pool_threshold:
+        formatted_batch = format_cell_batch(batch_sources, config)
+    else:
+        n_batches = os.cpu_count() or 1
+        batch_size = -(-len(batch_sources) // n_batches)
+        batches = [
+            batch_sources[i : i + batch_size] for i in range(0, len(batch_sources), batch_size)
+        ]
+        with stage("cell pool"):
+            formatted_batch = [
+                formatted
+                for formatted_chunk in get_cell_pool().map(
+                    partial(format_cell_batch, config=config), batches
+                )
+                for formatted in formatted_chunk
+            ]
+
+    for index, source, formatted in zip(batch_indices, batch_sources, formatted_batch):
+        # fall back to formatting the cell on its own
+        formatted_sources[index] = format_cell(source) if formatted is None else formatted
+    return formatted_sources
+
+
+def format_cell_batch(
+    sources: List[str], config: Optional[ProjectConfig] = None
+) -> List[Optional[str]]:
+    """Format the sources of several code cells in as few black passes as possible.
+
+    The sources are joined with `CELL_SEPARATOR`, formatted once and split back,
+    which avoids paying black's per-call setup for every cell.
+
+    Unless the project sets target versions, black infers them from the
+    features the source uses, e.g. f-strings, and they decide details like
+    trailing commas after `**kwargs`. So cells are only batched with cells
+    black infers the same target versions for, and each cell formats as it
+    would on its own, whichever cells it is batched with.
+
+    Args:
+        sources: Cell sources, each of which must parse on its own.
+        config: Formatter settings of the project the notebook belongs to.
+
+    Returns:
+        Formatted sources in order, None for those whose batch could not be
+        formatted.
     """
-    run(
-        (
-            "jupyter",
-            "nbconvert",
-            "--ClearOutputPreprocessor.enabled=True",
-            "--inplace",
-            str(ipynb_file_path),
-        ),
-        check=True,
+    if black_mode(config).target_versions:
+        return _format_cell_group(sources, config)
+
+    groups: Dict[Optional[FrozenSet[Any]], List[int]] = {}
+    for index, source in enumerate(sources):
+        groups.setdefault(_inferred_target_versions(source), []).append(index)
+    formatted_sources: List[Optional[str]] = [None] * len(sources)
+    for target_versions, indices in groups.items():
+        if target_versions is None:
+            # left for the caller to format on their own
+            continue
+        formatted = _format_cell_group([sources[index] for index in indices], config)
+        for index, formatted_source in zip(indices, formatted):
+            formatted_sources[index] = formatted_source
+    return formatted_sources
+
+
+def _inferred_target_versions(source: str) -> Optional[FrozenSet[Any]]:
+    """Target versions black infers for a source, None if black can't parse it."""
+    from black import detect_target_versions, get_future_imports, lib2to3_parse
+
+    try:
+        node = lib2to3_parse(source.lstrip())
+    except Exception:
+        return None
+    return frozenset(detect_target_versions(node, future_imports=get_future_imports(node)))
+
+
+def _format_cell_group(
+    sources: List[str], config: Optional[ProjectConfig] = None
+) -> List[Optional[str]]:
+    if not sources:
+        return []
+    try:
+        formatted = clean_python_code(
+            f"\n{CELL_SEPARATOR}\n".join(sources), is_notebook_cell=True, config=config
+        )
+    except Exception as e:
+        logging.debug(f"Unable to format cells in a batch: {e}")
+        return [None] * len(sources)
+
+    chunks: List[List[str]] = [[]]
+    for line in formatted.split("\n"):
+        if line == CELL_SEPARATOR:
+            chunks.append([])
+        else:
+            chunks[-1].append(line)
+    if len(chunks) != len(sources):
+        return [None] * len(sources)
+    return ["\n".join(chunk).strip("\n") + "\n" for chunk in chunks]
+
+
+def _is_batchable(source: str) -> bool:
+    """Check whether a cell formats the same inside a batch as on its own."""
+    if not source.strip() or CELL_SEPARATOR in source:
+        return False
+    # formatter directives like `# fmt: off` could leak into the following cells,
+    # and black only reads __future__ imports at the start of the source
+    if "fmt:" in source or "yapf:" in source or "__future__" in source:
+        return False
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return False
+    # a leading string is only treated as a docstring when formatted on its own
+    first = tree.body[0] if tree.body else None
+    return not (
+        isinstance(first, ast.Expr)
+        and isinstance(first.value, ast.Constant)
+        and isinstance(first.value.value, str)
     )
 
 
-def clean_ipynb_cell(cell_dict: Dict[str, Any]) -> Dict[str, Any]:
+def _join_source(source: Union[str, List[str]]) -> str:
+    # Handle both string and list source inputs
+    return "".join(source) if isinstance(source, list) else source
+
+
+def _split_source(source: str) -> List[str]:
+    # Split into lines and ensure each line (except last) ends with newline
+    lines = source.split("\n")
+    if lines[-1] == "":
+        lines = lines[:-1]
+    if lines:
+        lines = [line + "\n" for line in lines[:-1]] + [lines[-1]]
+    return lines
+
+
+def clean_ipynb_cell(
+    cell_dict: Dict[str, Any], config: Optional[ProjectConfig] = None
+) -> Dict[str, Any]:
     """Clean a single Jupyter notebook cell.
 
     Args:
         cell_dict: Dictionary containing cell data.
+        config: Formatter settings of the project the notebook belongs to.
 
     Returns:
         Cleaned cell dictionary.
     """
     if cell_dict["cell_type"] != "code":
         return cell_dict
-    try:
-        # Handle both string and list source inputs
-        source = cell_dict["source"]
-        if isinstance(source, list):
-            source = "".join(source)
+    formatted = _format_cell(_join_source(cell_dict["source"]), config)
+    if formatted is not None:
+        cell_dict["source"] = _split_source(formatted)
+    # return original cell dict otherwise
+    return cell_dict
+
 
+def _format_cell(source: str, config: Optional[ProjectConfig] = None) -> Optional[str]:
+    try:
         # Preserve imports by setting is_notebook_cell=True
-        clean_source = clean_python_code(source, is_notebook_cell=True)
+        return clean_python_code(source, is_notebook_cell=True, config=config)
+    except Exception as e:
+        logging.error(f"Error cleaning cell: {e}")
+        return None
 
-        # Split into lines and ensure each line (except last) ends with newline
-        clean_lines = clean_source.split("\n")
-        if clean_lines[-1] == "":
-            clean_lines = clean_lines[:-1]
-        if clean_lines:
-            clean_lines = [line + "\n" for line in clean_lines[:-1]] + [clean_lines[-1]]
 
-        cell_dict["source"] = clean_lines
-        return cell_dict
+def clean_ipynb_contents(
+    contents: str,
+    clear_output: bool = True,
+    cell_pool_threshold: int = CELL_POOL_THRESHOLD,
+    batch_cells: bool = True,
+    cell_cache: Optional[CellCache] = None,
+    dedupe_cells: bool = False,
+    drop_empty_cells: bool = False,
+    strip_magics: bool = False,
+    config: Optional[ProjectConfig] = None,
+) -> str:
+    """Clean a notebook document held in memory.
+
+    The document is parsed and validated once, transformed in place and
+    serialized once.
+
+    Args:
+        contents: Notebook JSON.
+        clear_output: Whether to clear cell outputs.
+        cell_pool_threshold: Minimum number of code cells for cells to be
+            formatted across processes, 0 to always format inline.
+        batch_cells: Whether to format code cells in a single black pass.
+        cell_cache: Memo of formatted cell sources, shared across notebooks.
+        dedupe_cells: Whether to drop cells repeating an earlier cell.
+        drop_empty_cells: Whether to drop cells with a blank source.
+        strip_magics: Whether to remove magics and shell escapes from code cells.
+        config: Formatter settings of the project the notebook belongs to.
+
+    Returns:
+        Cleaned notebook JSON.
+
+    Raises:
+        json.JSONDecodeError: If the contents are not valid JSON.
+        InvalidNotebookError: If the JSON does not describe a notebook.
+    """
+    with stage("parse"):
+        ipynb_dict = loads_notebook(contents)
+    return _clean_notebook(
+        ipynb_dict,
+        clear_output,
+        cell_pool_threshold,
+        batch_cells,
+        cell_cache,
+        dedupe_cells=dedupe_cells,
+        drop_empty_cells=drop_empty_cells,
+        strip_magics=strip_magics,
+        config=config,
+    )
 
-    except Exception as e:
-        # return original cell dict otherwise
-        logging.error(f"Error cleaning cell: {e}")
-        return cell_dict
+
+def _clean_notebook(
+    ipynb_dict: Dict[str, Any],
+    clear_output: bool,
+    cell_pool_threshold: int,
+    batch_cells: bool,
+    cell_cache: Optional[CellCache],
+    dedupe_cells: bool = False,
+    drop_empty_cells: bool = False,
+    strip_magics: bool = False,
+    config: Optional[ProjectConfig] = None,
+) -> str:
+    with stage("cell passes"):
+        cells = apply_cell_passes(
+            ipynb_dict["cells"], clear_output, dedupe_cells, drop_empty_cells, strip_magics
+        )
+    ipynb_dict["cells"] = clean_ipynb_cells(
+        cells, cell_pool_threshold, batch_cells, cell_cache, config
+    )
+    with stage("serialize"):
+        return dumps_notebook(normalize_notebook(ipynb_dict))
+
+
+def clean_source(
+    source: str,
+    file_type: str,
+    autoflake: bool = True,
+    isort: bool = True,
+    black: bool = True,
+    clear_output: bool = True,
+    cell_pool_threshold: int = CELL_POOL_THRESHOLD,
+    batch_cells: bool = True,
+    cell_cache: Optional[CellCache] = None,
+    dedupe_cells: bool = False,
+    drop_empty_cells: bool = False,
+    strip_magics: bool = False,
+    backend: str = DEFAULT_BACKEND,
+    config: Optional[ProjectConfig] = None,
+) -> str:
+    """Clean the contents of a .py or .ipynb file held in memory.
+
+    Args:
+        source: File contents.
+        file_type: Either "py" or "ipynb".
+        autoflake: Whether to remove unused imports using autoflake.
+        isort: Whether to sort imports using isort.
+        black: Whether to format code using black.
+        clear_output: Whether to clear notebook cell outputs.
+        cell_pool_threshold: Minimum number of code cells for notebook cells to
+            be formatted across processes, 0 to always format inline.
+        batch_cells: Whether to format notebook code cells in a single black pass.
+        cell_cache: Memo of formatted notebook cell sources.
+        dedupe_cells: Whether to drop notebook cells repeating an earlier cell.
+        drop_empty_cells: Whether to drop notebook cells with a blank source.
+        strip_magics: Whether to remove magics and shell escapes from code cells.
+        backend: Name of the backend cleaning .py source, notebook cells are
+            always formatted with black.
+        config: Formatter settings of the project the file belongs to.
+
+    Returns:
+        Cleaned contents.
+
+    Raises:
+        ValueError: If the file type is not supported.
+        json.JSONDecodeError: If a notebook is not valid JSON.
+        InvalidNotebookError: If the JSON does not describe a notebook.
+    """
+    if file_type == "py":
+        return clean_python_code(
+            source, autoflake=autoflake, isort=isort, black=black, backend=backend, config=config
+        )
+    if file_type == "ipynb":
+        return clean_ipynb_contents(
+            source,
+            clear_output,
+            cell_pool_threshold,
+            batch_cells,
+            cell_cache,
+            dedupe_cells=dedupe_cells,
+            drop_empty_cells=drop_empty_cells,
+            strip_magics=strip_magics,
+            config=config,
+        )
+    raise ValueError(f"Unsupported file type: {file_type}")
 
 
 def clean_ipynb(
@@ -220,7 +838,19 @@ def clean_ipynb(
     autoflake: bool = True,
     isort: bool = True,
     black: bool = True,
-) -> None:
+    cache: Optional[ResultCache] = None,
+    cell_pool_threshold: int = CELL_POOL_THRESHOLD,
+    batch_cells: bool = True,
+    write: bool = True,
+    cell_cache: Optional[CellCache] = None,
+    dedupe_cells: bool = False,
+    drop_empty_cells: bool = False,
+    strip_magics: bool = False,
+    timeout: Optional[float] = None,
+    max_size: Optional[int] = None,
+    source: Optional[str] = None,
+    config: Optional[ProjectConfig] = None,
+) -> CleanResult:
     """Clean a Jupyter notebook file.
 
     Args:
@@ -229,18 +859,110 @@ def clean_ipynb(
         autoflake: Whether to remove unused imports using autoflake.
         isort: Whether to sort imports using isort.
         black: Whether to format code using black.
+        cache: Result cache used to skip contents that were cleaned before.
+        cell_pool_threshold: Minimum number of code cells for cells to be
+            formatted across processes, 0 to always format inline.
+        batch_cells: Whether to format code cells in a single black pass.
+        write: Whether to write changes back, False to only report them.
+        cell_cache: Memo of formatted cell sources, shared across notebooks.
+        dedupe_cells: Whether to drop cells repeating an earlier cell.
+        drop_empty_cells: Whether to drop cells with a blank source.
+        strip_magics: Whether to remove magics and shell escapes from code cells.
+        timeout: Seconds cleaning may take, None for no limit.
+        max_size: Size in bytes over which the file is refused, None for no limit.
+        source: Contents of the file if already read, large notebooks are
+            streamed from disk regardless.
+        config: Formatter settings of the project the notebook belongs to.
+
+    Returns:
+        CleanResult with the original and cleaned notebook JSON.
+
+    Raises:
+        json.JSONDecodeError: If the file is not valid JSON.
+        InvalidNotebookError: If the JSON does not describe a notebook.
+        LimitExceeded: If the file is larger than `max_size`.
+        CleanTimeout: If cleaning took longer than `timeout`, the file is left
+            untouched.
     """
-    ipynb_file_path = Path(ipynb_file_path)
-    if clear_output:
-        clear_ipynb_output(ipynb_file_path)
+    check_file_size(ipynb_file_path, max_size)
 
-    with open(ipynb_file_path) as ipynb_file:
-        ipynb_dict = load(ipynb_file)
+    ipynb_file_path = Path(ipynb_file_path)
+    passes = dict(
+        dedupe_cells=dedupe_cells, drop_empty_cells=drop_empty_cells, strip_magics=strip_magics
+    )
+    if clear_output and ipynb_file_path.stat().st_size >= STREAM_NOTEBOOK_SIZE:
+        return _clean_large_ipynb(
+            ipynb_file_path,
+            cell_pool_threshold,
+            batch_cells,
+            write,
+            cell_cache,
+            passes,
+            timeout,
+            config,
+        )
 
-    # multithread the map operation
-    processed_cells = pool.map(clean_ipynb_cell, ipynb_dict["cells"])
-    ipynb_dict["cells"] = processed_cells
+    def clean(contents: str) -> str:
+        return clean_ipynb_contents(
+            contents,
+            clear_output,
+            cell_pool_threshold,
+            batch_cells,
+            cell_cache,
+            **passes,
+            config=config,
+        )
 
-    with open(ipynb_file_path, "w") as ipynb_file:
-        dump(ipynb_dict, ipynb_file, indent=1)
-        ipynb_file.write("\n")
+    flags = dict(
+        file_type="ipynb",
+        clear_output=clear_output,
+        autoflake=autoflake,
+        isort=isort,
+        black=black,
+        **passes,
+    )
+    flags.update(config_flags(config))
+    return rewrite_file(ipynb_file_path, clean, flags, cache, write, timeout, source)
+
+
+def _clean_large_ipynb(
+    ipynb_file_path: Path,
+    cell_pool_threshold: int,
+    batch_cells: bool,
+    write: bool,
+    cell_cache: Optional[CellCache],
+    passes: Dict[str, bool],
+    timeout: Optional[float],
+    config: Optional[ProjectConfig] = None,
+) -> CleanResult:
+    """Clean a large notebook, clearing its outputs, without ever loading them.
+
+    The notebook is streamed rather than read into memory, so it bypasses the
+    result cache, which is keyed on the full contents. Once cleaned it is
+    small enough to go through the cache on later runs.
+    """
+    with time_limit(timeout):
+        with stage("parse"), open(ipynb_file_path) as ipynb_file:
+            ipynb_dict = load_notebook_without_outputs(ipynb_file)
+        cleaned = _clean_notebook(
+            ipynb_dict, True, cell_pool_threshold, batch_cells, cell_cache, **passes, config=config
+        )
+    with stage("compare"):
+        changed = not _file_matches(ipynb_file_path, cleaned)
+    if write and changed:
+        with stage("write"):
+            create_file(ipynb_file_path, cleaned)
+    return CleanResult(None, cleaned, changed)
+
+
+def _file_matches(file_path: Path, contents: str) -> bool:
+    """Compare a file with some contents, reading it a chunk at a time."""
+    with open(file_path) as f:
+        offset = 0
+        while True:
+            chunk = f.read(STREAM_CHUNK_SIZE)
+            if not chunk:
+                return offset == len(contents)
+            if contents[offset : offset + len(chunk)] != chunk:
+                return False
+            offset += len(chunk)
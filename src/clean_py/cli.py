@@ -1,13 +1,51 @@
 import glob
+import json
 import logging
+import signal
+import sys
+import time
+from enum import Enum
 from pathlib import Path
-import json
+from typing import Any, Dict, List, Optional
 
 import typer
 from rich.console import Console
 from rich.logging import RichHandler
+from typer.core import TyperGroup
 
-from .clean_py import clean_ipynb, clean_py
+from .api import (
+    CLEANED,
+    FAILED,
+    INVALID,
+    OVER_LIMIT,
+    SKIPPED,
+    FileResult,
+    clean_named_source,
+    is_selected,
+    iter_paths,
+    iter_results,
+    shutdown_worker_pool,
+)
+from .backends import DEFAULT_BACKEND, BackendError, backend_names, get_backend
+from .cache import CELL_CACHE_SIZE, CELL_CACHE_SUBDIR, ResultCache, default_cache_dir
+from .clean_py import CELL_POOL_THRESHOLD, shutdown_cell_pool, unified_diff
+from .config import clear_project_configs, find_project_config
+from .daemon import Address, DaemonError, make_server, parse_address
+from .daemon import serve as serve_daemon
+from .daemon import warm_up
+from .git import GitError, changed_files
+from .scheduling import TIMINGS_FILE, TimingHistory
+from .scheduling import schedule as order_by_cost
+from .sharding import (
+    Shard,
+    merge_reports,
+    parse_shard,
+    select_shard,
+    shard_key,
+    shard_report,
+)
+from .watch import DEFAULT_DEBOUNCE, DEFAULT_POLL_INTERVAL
+from .watch import watch as watch_tree
 
 # Configure rich logging
 logging.basicConfig(
@@ -18,22 +56,318 @@ logging.basicConfig(
 )
 
 console = Console()
+# Messages go to stderr when stdout carries cleaned source
+err_console = Console(stderr=True)
+
+
+class DefaultCommandGroup(TyperGroup):
+    """Command group that runs `main` unless another command, or an option of
+    the group itself like --help, is named.
+
+    This keeps `clean-py PATH` working alongside subcommands like `clean-py serve`.
+    Paths named like a command are cleaned with `clean-py main PATH`.
+    """
+
+    default_command = "main"
+
+    def parse_args(self, ctx, args):
+        group_options = {opt for param in self.get_params(ctx) for opt in param.opts}
+        if not args or (args[0] not in self.commands and args[0] not in group_options):
+            args = [self.default_command, *args]
+        return super().parse_args(ctx, args)
+
+
 app = typer.Typer(
     name="clean-py",
-    help="Auto-lint .py and .ipynb files with autoflake, isort and black",
+    help="Auto-lint .py and .ipynb files with autoflake, isort and black. "
+    "Run `clean-py PATH` to clean files, short for `clean-py main PATH`",
     add_completion=False,
+    cls=DefaultCommandGroup,
 )
 
+# Number of files listed in the --profile report
+PROFILE_TOP_FILES = 10
+
+
+class Schedule(str, Enum):
+    """Order files are handed to the workers in."""
+
+    walk = "walk"
+    cost = "cost"
+
+
+def profile_report(results: List[FileResult], elapsed: float) -> Dict[str, Any]:
+    """Summarise the timings of profiled files.
+
+    Args:
+        results: Results of files cleaned with profiling enabled.
+        elapsed: Wall time of the whole run in seconds.
+
+    Returns:
+        Report with the run's wall time, the total time per stage, event
+        counters like cell cache hits and the per-file timings, slowest file first.
+    """
+    stages: Dict[str, float] = {}
+    counters: Dict[str, int] = {}
+    for result in results:
+        for name, seconds in (result.timings or {}).items():
+            stages[name] = stages.get(name, 0.0) + seconds
+        for name, n in (result.counters or {}).items():
+            counters[name] = counters.get(name, 0) + n
+    files = sorted(results, key=lambda result: result.seconds or 0.0, reverse=True)
+    return {
+        "elapsed": elapsed,
+        "files_cleaned": len(results),
+        "stages": dict(sorted(stages.items(), key=lambda item: item[1], reverse=True)),
+        "counters": dict(sorted(counters.items())),
+        "files": [
+            {
+                "path": str(result.path),
+                "status": result.status,
+                "seconds": result.seconds,
+                "stages": result.timings or {},
+            }
+            for result in files
+        ],
+    }
+
+
+def _print_profile(results: List[FileResult], elapsed: float) -> None:
+    from rich.table import Table
+
+    report = profile_report(results, elapsed)
+    file_time = sum(entry["seconds"] or 0.0 for entry in report["files"])
+
+    slowest = Table(title=f"Slowest files ({len(results)} cleaned in {elapsed:.2f}s)")
+    slowest.add_column("File")
+    slowest.add_column("Seconds", justify="right")
+    slowest.add_column("Slowest stage")
+    for entry in report["files"][:PROFILE_TOP_FILES]:
+        stage_name = max(entry["stages"], key=entry["stages"].get, default="")
+        slowest.add_row(entry["path"], f"{entry['seconds']:.3f}", stage_name)
+    console.print(slowest)
+
+    stages = Table(title="Time per stage")
+    stages.add_column("Stage")
+    stages.add_column("Seconds", justify="right")
+    stages.add_column("Share", justify="right")
+    # time spent outside any stage, e.g. cell splitting and result handling
+    other = file_time - sum(report["stages"].values())
+    for name, seconds in [*report["stages"].items(), ("other", max(other, 0.0))]:
+        share = seconds / file_time if file_time else 0.0
+        stages.add_row(name, f"{seconds:.3f}", f"{share:.1%}")
+    console.print(stages)
+
+    counters = report["counters"]
+    hits = counters.get("cell cache hits", 0)
+    lookups = hits + counters.get("cell cache misses", 0)
+    if lookups:
+        console.print(
+            f"Cell cache: {hits} of {lookups} cells hit ({hits / lookups:.1%}), "
+            f"{counters.get('cell cache disk hits', 0)} from disk"
+        )
+
+
+def _clean_stdin(
+    filename: Path,
+    autoflake: bool,
+    isort: bool,
+    black: bool,
+    cache: Optional[ResultCache],
+    daemon_address: Optional[Address],
+    check: bool,
+    diff: bool,
+    passes: Dict[str, bool],
+    backend: str,
+    project_config: bool,
+) -> None:
+    """Clean source read from stdin and write it to stdout, for editor integrations.
+
+    Nothing but the cleaned source, or the diff, goes to stdout. Messages and
+    log records go to stderr. Project settings are those of the pyproject.toml
+    above the given filename, as if the source was saved there.
+    """
+    logging.getLogger().handlers = [RichHandler(console=err_console, rich_tracebacks=True)]
+    file_type = filename.suffix[1:]
+    if file_type not in ("py", "ipynb"):
+        err_console.print(f"[red]Error: Unsupported file type for {filename}[/red]")
+        raise typer.Exit(1)
+
+    source = sys.stdin.read()
+    result = clean_named_source(
+        str(filename),
+        source,
+        autoflake=autoflake,
+        isort=isort,
+        black=black,
+        cache=cache,
+        daemon_address=daemon_address,
+        backend=backend,
+        config=find_project_config(filename) if project_config else None,
+        **passes,
+    )
+    if result.status == INVALID:
+        err_console.print(f"[red]Error: Invalid notebook format in {filename}[/red]")
+        raise typer.Exit(1)
+    if result.status != CLEANED:
+        err_console.print(f"[red]Error: Unable to clean {filename}: {result.error}[/red]")
+        raise typer.Exit(1)
+
+    cleaned = result.cleaned
+    if diff:
+        sys.stdout.write(unified_diff(source, cleaned, filename))
+    elif not check:
+        sys.stdout.write(cleaned)
+    if check and cleaned != source:
+        err_console.print(f"Would reformat {filename}")
+        raise typer.Exit(1)
+
+
+def _check_backend_option(name: str) -> str:
+    try:
+        get_backend(name)
+    except BackendError as e:
+        raise typer.BadParameter(str(e))
+    return name
+
+
+def _parse_shard_option(spec: Optional[str]) -> Optional[Shard]:
+    if spec is None:
+        return None
+    try:
+        return parse_shard(spec)
+    except ValueError as e:
+        raise typer.BadParameter(str(e))
+
+
+def _log_file(file_path: Path) -> Path:
+    logging.info(f"Cleaning file: {file_path}")
+    return file_path
+
 
 @app.command()
 def main(
-    path: str = typer.Argument(..., help="File or directory to clean"),
+    path: str = typer.Argument(..., help="File or directory to clean, - to read from stdin"),
     py: bool = typer.Option(True, help="Apply to .py source"),
     ipynb: bool = typer.Option(True, help="Apply to .ipynb source"),
     autoflake: bool = typer.Option(True, help="Apply autoflake to source"),
     isort: bool = typer.Option(True, help="Apply isort to source"),
     black: bool = typer.Option(True, help="Apply black to source"),
     verbose: bool = typer.Option(False, help="Enable verbose output"),
+    jobs: int = typer.Option(
+        1, "--jobs", "-j", min=0, help="Number of worker processes (0 for all cores)"
+    ),
+    cache: bool = typer.Option(True, help="Skip files already known to be clean"),
+    cache_dir: Optional[Path] = typer.Option(
+        None, help="Directory for the result cache [default: ~/.cache/clean-py]"
+    ),
+    changed_since: Optional[str] = typer.Option(
+        None, metavar="REF", help="Only clean files changed since a git ref"
+    ),
+    staged: bool = typer.Option(False, "--staged", help="Only clean files staged in git"),
+    cell_pool_threshold: int = typer.Option(
+        CELL_POOL_THRESHOLD,
+        min=0,
+        help="Format notebook cells across processes from this many code cells (0 to disable)",
+    ),
+    batch_cells: bool = typer.Option(
+        True, help="Format all code cells of a notebook in a single black pass"
+    ),
+    exclude: Optional[List[str]] = typer.Option(
+        None, help="Glob of files or directories to skip (repeatable)"
+    ),
+    include: Optional[List[str]] = typer.Option(
+        None, help="Glob files must match to be cleaned (repeatable)"
+    ),
+    gitignore: bool = typer.Option(True, help="Skip files ignored by .gitignore"),
+    daemon: bool = typer.Option(
+        False, help="Clean through a running `clean-py serve` daemon, in-process if none is running"
+    ),
+    daemon_address: Optional[str] = typer.Option(
+        None, metavar="ADDRESS", help="Socket path or HOST:PORT of the daemon"
+    ),
+    profile: bool = typer.Option(
+        False, help="Report the slowest files and the time spent in each stage"
+    ),
+    profile_json: Optional[Path] = typer.Option(
+        None, help="Write the profile as JSON to this file (implies --profile)"
+    ),
+    cprofile: Optional[Path] = typer.Option(
+        None, metavar="FILE", help="Write a cProfile dump of cleaning this file"
+    ),
+    cprofile_output: Path = typer.Option(
+        Path("clean-py.prof"), help="File the --cprofile dump is written to"
+    ),
+    check: bool = typer.Option(
+        False, "--check", help="Don't write files, exit with 1 if any file would change"
+    ),
+    diff: bool = typer.Option(
+        False, "--diff", help="Don't write files, print a diff of the changes instead"
+    ),
+    stdin_filename: Optional[Path] = typer.Option(
+        None, help="Name of the file read from stdin, its suffix sets the file type [default: stdin.py]"
+    ),
+    cell_cache_size: int = typer.Option(
+        CELL_CACHE_SIZE,
+        min=0,
+        help="Formatted notebook cells remembered across notebooks (0 to disable)",
+    ),
+    cell_cache_disk: bool = typer.Option(
+        False, help="Also keep formatted notebook cells in the cache directory, across runs"
+    ),
+    dedupe_cells: bool = typer.Option(False, help="Drop notebook cells repeating an earlier cell"),
+    drop_empty_cells: bool = typer.Option(False, help="Drop notebook cells with a blank source"),
+    strip_magics: bool = typer.Option(
+        False,
+        help="Remove magics, shell escapes and ? queries from notebook code cells, "
+        "leaving cells run through a cell magic like %%bash as they are",
+    ),
+    timeout: Optional[float] = typer.Option(
+        None, min=0, metavar="SECONDS", help="Skip files that take longer than this to clean"
+    ),
+    max_file_size: Optional[int] = typer.Option(
+        None, min=0, metavar="BYTES", help="Skip files larger than this"
+    ),
+    max_memory: Optional[int] = typer.Option(
+        None,
+        min=1,
+        metavar="MB",
+        help="Cap the memory of each worker process, skipping files that need more",
+    ),
+    backend: str = typer.Option(
+        DEFAULT_BACKEND,
+        callback=_check_backend_option,
+        help=f"Engine cleaning .py files: {', '.join(backend_names())}. "
+        "Notebook cells are always formatted with black",
+    ),
+    project_config: bool = typer.Option(
+        True, help="Use the black, isort and autoflake settings of each file's pyproject.toml"
+    ),
+    io_threads: int = typer.Option(
+        0,
+        min=0,
+        help="Read and write files on this many threads while others are formatted, "
+        "e.g. on network filesystems (0 to disable)",
+    ),
+    schedule: Schedule = typer.Option(
+        Schedule.walk,
+        help="Clean files in the order they are found, or the most expensive first, "
+        "estimated from their size and cell count and the timings of earlier runs",
+    ),
+    shard: Optional[str] = typer.Option(
+        None,
+        metavar="i/N",
+        callback=_parse_shard_option,
+        help="Only clean the i-th of N shards of the files, e.g. one per CI job",
+    ),
+    shard_by_size: bool = typer.Option(
+        False, help="Balance shards by file size rather than by path alone"
+    ),
+    report: Optional[Path] = typer.Option(
+        None,
+        metavar="FILE",
+        help="Write the outcome as JSON, `clean-py merge-reports` combines those of shards",
+    ),
 ):
     """
     Clean Python files and Jupyter notebooks using various code formatting tools.
@@ -41,93 +375,387 @@ def main(
     The tool can process both individual files and entire directories recursively.
     For Python files, it can apply autoflake, isort, and black formatting.
     For Jupyter notebooks, it can also clear outputs and reset execution counts.
+    See `clean-py serve --help` to keep the formatters warm in a daemon.
+
+    This is the default command, `clean-py PATH` is `clean-py main PATH`. Clean
+    a path named like a command, e.g. watch, with `clean-py main watch`.
     """
     if verbose:
         logging.getLogger().setLevel(logging.DEBUG)
 
+    passes = dict(
+        dedupe_cells=dedupe_cells, drop_empty_cells=drop_empty_cells, strip_magics=strip_magics
+    )
+    if path == "-":
+        _clean_stdin(
+            stdin_filename or Path("stdin.py"),
+            autoflake=autoflake,
+            isort=isort,
+            black=black,
+            cache=ResultCache(cache_dir) if cache else None,
+            daemon_address=parse_address(daemon_address) if daemon else None,
+            check=check,
+            diff=diff,
+            passes=passes,
+            backend=backend,
+            project_config=project_config,
+        )
+        return
+
     path = Path(path)
     if not path.exists():
         console.print(f"[red]Error: Path '{path}' does not exist[/red]")
         raise typer.Exit(1)
 
+    profile = profile or profile_json is not None
+    cprofile_target = cprofile.resolve() if cprofile is not None else None
+    result_cache = ResultCache(cache_dir) if cache else None
+    cell_cache_dir = None
+    if cell_cache_disk:
+        cell_cache_dir = (cache_dir or default_cache_dir()) / CELL_CACHE_SUBDIR
+    options = dict(
+        py=py,
+        ipynb=ipynb,
+        autoflake=autoflake,
+        isort=isort,
+        black=black,
+        cache=result_cache,
+        # pool workers already use every core, don't nest a cell pool inside them
+        cell_pool_threshold=cell_pool_threshold if jobs == 1 else 0,
+        batch_cells=batch_cells,
+        daemon_address=parse_address(daemon_address) if daemon else None,
+        profile=profile,
+        cprofile=(cprofile_target, cprofile_output.resolve()) if cprofile_target else None,
+        write=not (check or diff),
+        diff=diff,
+        cell_cache_size=cell_cache_size,
+        cell_cache_dir=cell_cache_dir,
+        **passes,
+        timeout=timeout,
+        max_file_size=max_file_size,
+        backend=backend,
+        project_config=project_config,
+    )
     has_errors = False
+    would_change = 0
+    n_files = 0
+    reported = []
+    profiled = []
+    cprofiled = False
     try:
-        if path.is_file():
-            if py and path.suffix == ".py":
-                try:
-                    logging.info(f"Cleaning file: {path}")
-                    clean_py(path, autoflake, isort, black)
-                except Exception as e:
-                    console.print(f"[yellow]Warning: Unable to clean file {path}: {e}[/yellow]")
-                    if verbose:
-                        logging.exception("Detailed error:")
-                    has_errors = True
-
-            elif ipynb and path.suffix == ".ipynb":
-                try:
-                    logging.info(f"Cleaning file: {path}")
-                    # Try to load the notebook first to validate JSON
-                    with open(path) as f:
-                        try:
-                            json.load(f)  # Use json.load instead of load to be explicit
-                        except json.JSONDecodeError:
-                            console.print(f"[red]Error: Invalid notebook format in {path}[/red]")
-                            raise typer.Exit(code=1)
-                    clean_ipynb(path, autoflake=autoflake, isort=isort, black=black)
-                except json.JSONDecodeError:
-                    console.print(f"[red]Error: Invalid notebook format in {path}[/red]")
-                    raise typer.Exit(code=1)
-                except Exception as e:
-                    console.print(f"[yellow]Warning: Unable to clean file {path}: {e}[/yellow]")
-                    if verbose:
-                        logging.exception("Detailed error:")
-                    has_errors = True
-
-            else:
+        if changed_since is not None or staged:
+            try:
+                changed = changed_files(path, ref=changed_since, staged=staged)
+            except GitError as e:
+                console.print(f"[red]Error: Unable to list changed files: {e}[/red]")
+                raise typer.Exit(1)
+            files = [file_path for file_path in changed if is_selected(file_path, py, ipynb)]
+        elif path.is_file():
+            if not is_selected(path, py, ipynb):
                 console.print(
                     f"[yellow]Warning: Skipping {path} (unsupported file type)[/yellow]"
                 )
-
+                files = []
+            else:
+                files = [path]
         else:  # path is a directory
-            for file_path in path.rglob("*"):
-                if py and file_path.suffix == ".py":
-                    try:
-                        logging.info(f"Cleaning file: {file_path}")
-                        clean_py(file_path, autoflake, isort, black)
-                    except Exception as e:
-                        console.print(f"[yellow]Warning: Unable to clean file {file_path}: {e}[/yellow]")
-                        if verbose:
-                            logging.exception("Detailed error:")
-                        has_errors = True
-
-                elif ipynb and file_path.suffix == ".ipynb":
-                    try:
-                        logging.info(f"Cleaning file: {file_path}")
-                        # Try to load the notebook first to validate JSON
-                        with open(file_path) as f:
-                            try:
-                                json.load(f)  # Use json.load instead of load to be explicit
-                            except json.JSONDecodeError:
-                                console.print(f"[yellow]Warning: Invalid notebook format in {file_path}[/yellow]")
-                                has_errors = True
-                                continue
-                        clean_ipynb(file_path, autoflake=autoflake, isort=isort, black=black)
-                    except Exception as e:
-                        console.print(f"[yellow]Warning: Unable to clean file {file_path}: {e}[/yellow]")
-                        if verbose:
-                            logging.exception("Detailed error:")
-                        has_errors = True
-
-        if has_errors:
+            files = iter_paths(
+                [path], py=py, ipynb=ipynb, exclude=exclude, include=include, use_gitignore=gitignore
+            )
+        if shard is not None:
+            root = path if path.is_dir() else path.parent
+            files = select_shard(files, shard, root, weight_by_size=shard_by_size)
+            logging.debug(f"Cleaning {len(files)} file(s) in shard {shard}")
+        history = None
+        if schedule == Schedule.cost:
+            history = TimingHistory((cache_dir or default_cache_dir()) / TIMINGS_FILE)
+            files = order_by_cost(files, history)
+
+        start = time.perf_counter()
+        if options["write"]:
+            files = map(_log_file, files)
+        # without writing, stdout is kept for the diff so it can be piped to a patch
+        messages = console if options["write"] else err_console
+        max_memory_bytes = max_memory * 1024 * 1024 if max_memory is not None else None
+        results = iter_results(
+            files, jobs=jobs, max_memory=max_memory_bytes, io_threads=io_threads, **options
+        )
+        for result in results:
+            n_files += 1
+            if history is not None and result.seconds is not None:
+                history.record(result.path, result.seconds)
+            if report is not None and (result.changed or result.status not in (CLEANED, SKIPPED)):
+                reported.append(_report_entry(result, path))
+            if profile:
+                profiled.append(result)
+            if cprofile_target is not None and result.path.resolve() == cprofile_target:
+                cprofiled = True
+            if result.changed and not options["write"]:
+                would_change += 1
+                if diff:
+                    typer.echo(result.diff, nl=False)
+                else:
+                    messages.print(f"Would reformat {result.path}")
+            if result.status == INVALID:
+                if path.is_file():
+                    messages.print(f"[red]Error: Invalid notebook format in {result.path}[/red]")
+                    raise typer.Exit(code=1)
+                messages.print(f"[yellow]Warning: Invalid notebook format in {result.path}[/yellow]")
+                has_errors = True
+            elif result.status == OVER_LIMIT:
+                messages.print(f"[yellow]Warning: Skipping {result.path}: {result.error}[/yellow]")
+                has_errors = True
+            elif result.status == FAILED:
+                messages.print(f"[yellow]Warning: Unable to clean file {result.path}: {result.error}[/yellow]")
+                if verbose:
+                    logging.error(f"Detailed error:\n{result.details}")
+                has_errors = True
+
+        elapsed = time.perf_counter() - start
+
+        if history is not None:
+            history.save()
+        if result_cache is not None:
+            result_cache.prune()
+        if cell_cache_dir is not None:
+            ResultCache(cell_cache_dir).prune()
+
+        if profile:
+            _print_profile(profiled, elapsed)
+        if profile_json is not None:
+            with open(profile_json, "w") as f:
+                json.dump(profile_report(profiled, elapsed), f, indent=2)
+        if cprofile_target is not None:
+            if cprofiled:
+                console.print(f"Wrote cProfile dump of {cprofile} to {cprofile_output}")
+            else:
+                console.print(f"[yellow]Warning: {cprofile} was not cleaned, no cProfile dump written[/yellow]")
+
+        exit_code = 1 if check and (would_change or has_errors) else 0
+        if report is not None:
+            mode = "check" if check else "diff" if diff else "write"
+            with open(report, "w") as f:
+                json.dump(shard_report(shard, mode, n_files, reported, exit_code), f, indent=2)
+
+        if not options["write"]:
+            if would_change:
+                messages.print(f"[yellow]{would_change} file(s) would be changed.[/yellow]")
+            else:
+                messages.print("[green]No files would be changed.[/green]")
+            if exit_code:
+                raise typer.Exit(exit_code)
+        elif has_errors:
             console.print("[yellow]Cleaning completed with some warnings.[/yellow]")
         else:
             console.print("[green]Cleaning completed successfully![/green]")
 
+    except typer.Exit:
+        raise
     except Exception as e:
         console.print(f"[red]Error: An unexpected error occurred: {e}[/red]")
         if verbose:
             logging.exception("Detailed error:")
         raise typer.Exit(1)
+    finally:
+        shutdown_worker_pool()
+
+
+def _report_entry(result: FileResult, root: Path) -> Dict[str, Any]:
+    error = result.error
+    if error is None and result.status not in (CLEANED, SKIPPED):
+        error = result.status
+    return {
+        "path": shard_key(result.path, root if root.is_dir() else root.parent),
+        "status": result.status,
+        "changed": result.changed,
+        "error": error,
+    }
+
+
+@app.command("merge-reports")
+def merge_reports_command(
+    reports: List[Path] = typer.Argument(..., help="Reports written by `clean-py --report`"),
+    output: Optional[Path] = typer.Option(
+        None, metavar="FILE", help="Also write the merged report as JSON to this file"
+    ),
+):
+    """
+    Combine the reports of a sharded run into one summary and exit code.
+
+    Exits with 1 if any shard failed, or if a shard is missing or reported twice.
+    """
+    loaded = []
+    for report_path in reports:
+        try:
+            with open(report_path) as f:
+                loaded.append(json.load(f))
+        except (OSError, json.JSONDecodeError) as e:
+            console.print(f"[red]Error: Unable to read report {report_path}: {e}[/red]")
+            raise typer.Exit(1)
+    try:
+        merged = merge_reports(loaded)
+    except (KeyError, ValueError) as e:
+        console.print(f"[red]Error: Unable to merge reports: {e}[/red]")
+        raise typer.Exit(1)
+    if output is not None:
+        with open(output, "w") as f:
+            json.dump(merged, f, indent=2)
+
+    for entry in merged["results"]:
+        if entry["error"] is not None:
+            console.print(f"[yellow]Warning: Unable to clean {entry['path']}: {entry['error']}[/yellow]")
+        elif merged["mode"] != "write":
+            console.print(f"Would reformat {entry['path']}")
+    for spec in merged["missing"]:
+        console.print(f"[red]Error: No report for shard {spec}[/red]")
+    for spec in merged["duplicate"]:
+        console.print(f"[red]Error: Shard {spec} was reported more than once[/red]")
+
+    verb = "were changed" if merged["mode"] == "write" else "would be changed"
+    summary = (
+        f"{merged['files']} file(s) in {len(merged['shards'])} shard(s): "
+        f"{merged['changed']} {verb}, {merged['errors']} could not be cleaned."
+    )
+    if merged["exit_code"]:
+        console.print(f"[red]{summary}[/red]")
+        raise typer.Exit(merged["exit_code"])
+    console.print(f"[green]{summary}[/green]")
+
+
+@app.command()
+def serve(
+    address: Optional[str] = typer.Option(
+        None,
+        metavar="ADDRESS",
+        help="Unix socket path or HOST:PORT to listen on [default: $XDG_RUNTIME_DIR/clean-py-UID.sock]",
+        show_default=False,
+    ),
+    verbose: bool = typer.Option(False, help="Enable verbose output"),
+):
+    """
+    Run a daemon that keeps the formatters loaded, for editors and git hooks.
+
+    Clients send one JSON request per connection, with the `source` to clean and
+    its `file_type` ("py" or "ipynb"), and get the cleaned `source` back.
+    `clean-py --daemon PATH` cleans through it, falling back to cleaning
+    in-process when no daemon is running.
+    """
+    if verbose:
+        logging.getLogger().setLevel(logging.DEBUG)
+
+    parsed_address = parse_address(address)
+    try:
+        server = make_server(parsed_address)
+    except (DaemonError, OSError) as e:
+        console.print(f"[red]Error: Unable to start the daemon: {e}[/red]")
+        raise typer.Exit(1)
+    # stop cleanly, removing the socket, when a service manager terminates us
+    signal.signal(signal.SIGTERM, _exit_on_signal)
+    console.print(f"[green]Listening on {parsed_address}[/green]")
+    serve_daemon(parsed_address, server)
+
+
+@app.command()
+def watch(
+    path: Path = typer.Argument(..., help="Directory to watch"),
+    py: bool = typer.Option(True, help="Apply to .py source"),
+    ipynb: bool = typer.Option(True, help="Apply to .ipynb source"),
+    autoflake: bool = typer.Option(True, help="Apply autoflake to source"),
+    isort: bool = typer.Option(True, help="Apply isort to source"),
+    black: bool = typer.Option(True, help="Apply black to source"),
+    verbose: bool = typer.Option(False, help="Enable verbose output"),
+    cache: bool = typer.Option(True, help="Skip files already known to be clean"),
+    cache_dir: Optional[Path] = typer.Option(
+        None, help="Directory for the result cache [default: ~/.cache/clean-py]"
+    ),
+    exclude: Optional[List[str]] = typer.Option(
+        None, help="Glob of files or directories to skip (repeatable)"
+    ),
+    include: Optional[List[str]] = typer.Option(
+        None, help="Glob files must match to be cleaned (repeatable)"
+    ),
+    gitignore: bool = typer.Option(True, help="Skip files ignored by .gitignore"),
+    debounce: float = typer.Option(
+        DEFAULT_DEBOUNCE, min=0, metavar="SECONDS", help="Wait for changes to settle this long"
+    ),
+    polling: bool = typer.Option(False, help="Poll for changes even where inotify is available"),
+    poll_interval: float = typer.Option(
+        DEFAULT_POLL_INTERVAL, min=0.01, metavar="SECONDS", help="Seconds between polls"
+    ),
+    timeout: Optional[float] = typer.Option(
+        None, min=0, metavar="SECONDS", help="Skip files that take longer than this to clean"
+    ),
+    backend: str = typer.Option(
+        DEFAULT_BACKEND,
+        callback=_check_backend_option,
+        help=f"Engine cleaning .py files: {', '.join(backend_names())}. "
+        "Notebook cells are always formatted with black",
+    ),
+    project_config: bool = typer.Option(
+        True, help="Use the black, isort and autoflake settings of each file's pyproject.toml"
+    ),
+):
+    """
+    Clean files as they change, keeping the formatters loaded between saves.
+
+    Only files that changed are cleaned, once changes have settled for the
+    debounce delay. Changes are picked up from inotify on Linux and by polling
+    elsewhere. The writes of the watcher itself are ignored.
+    """
+    if verbose:
+        logging.getLogger().setLevel(logging.DEBUG)
+    if not path.is_dir():
+        console.print(f"[red]Error: '{path}' is not a directory[/red]")
+        raise typer.Exit(1)
+
+    options = dict(
+        py=py,
+        ipynb=ipynb,
+        autoflake=autoflake,
+        isort=isort,
+        black=black,
+        cache=ResultCache(cache_dir) if cache else None,
+        timeout=timeout,
+        backend=backend,
+        project_config=project_config,
+    )
+
+    def clean(paths: List[Path]) -> List[Path]:
+        # pick up edits to pyproject.toml files made since the last changes
+        clear_project_configs()
+        written = []
+        for result in iter_results(
+            [file_path for file_path in paths if is_selected(file_path, py, ipynb)], **options
+        ):
+            if result.status == CLEANED and result.changed:
+                console.print(f"Cleaned {result.path}")
+                written.append(result.path)
+            elif result.status in (INVALID, OVER_LIMIT, FAILED):
+                console.print(f"[yellow]Warning: Unable to clean {result.path}: {result.error}[/yellow]")
+                if verbose and result.details:
+                    logging.error(f"Detailed error:\n{result.details}")
+        return written
+
+    warm_up()
+    signal.signal(signal.SIGTERM, _exit_on_signal)
+    console.print(f"[green]Watching {path} for changes, press Ctrl+C to stop[/green]")
+    try:
+        watch_tree(
+            path,
+            clean,
+            debounce=debounce,
+            polling=polling,
+            poll_interval=poll_interval,
+            exclude=exclude,
+            include=include,
+            use_gitignore=gitignore,
+        )
+    finally:
+        shutdown_cell_pool()
+
+
+def _exit_on_signal(signum, frame):
+    raise SystemExit(0)
 
 
 if __name__ == "__main__":
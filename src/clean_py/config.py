@@ -0,0 +1,243 @@
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, NamedTuple, Optional, Union
+
+# File holding a project's formatter settings
+PYPROJECT_FILE = "pyproject.toml"
+# Directories marking the root of a repository, settings are not looked up past them
+VCS_DIRECTORIES = (".git", ".hg")
+# autoflake options cleaning uses unless a project's [tool.autoflake] sets them
+DEFAULT_AUTOFLAKE_OPTIONS = dict(
+    expand_star_imports=True,
+    remove_all_unused_imports=True,
+    remove_duplicate_keys=True,
+    remove_unused_variables=True,
+)
+# Settings of [tool.autoflake] passed on to autoflake, by the argument they set
+AUTOFLAKE_SETTINGS = dict(
+    expand_star_imports="expand_star_imports",
+    remove_all_unused_imports="remove_all_unused_imports",
+    remove_duplicate_keys="remove_duplicate_keys",
+    remove_unused_variables="remove_unused_variables",
+    remove_rhs_for_unused_variables="remove_rhs_for_unused_variables",
+    ignore_init_module_imports="ignore_init_module_imports",
+    ignore_pass_statements="ignore_pass_statements",
+    ignore_pass_after_docstring="ignore_pass_after_docstring",
+    imports="additional_imports",
+)
+
+
+class ProjectConfig(NamedTuple):
+    """Formatter settings of a project, from the [tool.black], [tool.isort] and
+    [tool.autoflake] tables of its pyproject.toml.
+
+    It only holds the parsed tables, so it is cheap to send to workers along
+    with each file. The black mode and isort config are built from it once per
+    process, see `black_mode` and `isort_config`.
+    """
+
+    # pyproject.toml the settings come from, None for the defaults
+    path: Optional[Path] = None
+    black: Dict[str, Any] = {}
+    # whether the project has an isort table, isort reads it itself
+    isort: bool = False
+    # arguments of autoflake's fix_code, defaults included
+    autoflake: Dict[str, Any] = DEFAULT_AUTOFLAKE_OPTIONS
+    # digest of the settings, None when the project sets none of them
+    key: Optional[str] = None
+
+
+DEFAULT_CONFIG = ProjectConfig()
+
+# Settings of the pyproject.toml files read so far, by path
+_configs: Dict[Path, ProjectConfig] = {}
+# pyproject.toml governing each directory looked up so far, None if there is none
+_directories: Dict[str, Optional[Path]] = {}
+# Formatter settings built from configs in this process, by config key
+_black_modes: Dict[Optional[str], Any] = {}
+_isort_configs: Dict[Optional[str], Any] = {}
+
+
+def _normalize(table: Dict[str, Any]) -> Dict[str, Any]:
+    return {key.replace("-", "_"): value for key, value in table.items()}
+
+
+def read_project_config(path: Path) -> ProjectConfig:
+    """Read the formatter settings of a pyproject.toml.
+
+    Unreadable or invalid files are logged and give the default settings.
+
+    Args:
+        path: Path to the pyproject.toml.
+
+    Returns:
+        The project's settings.
+    """
+    try:
+        import tomllib
+    except ImportError:  # pragma: no cover - Python < 3.11, where black needs tomli
+        import tomli as tomllib
+
+    try:
+        with open(path, "rb") as f:
+            tool = tomllib.load(f).get("tool", {})
+    except (OSError, ValueError) as e:
+        logging.warning(f"Ignoring settings of {path}: {e}")
+        return DEFAULT_CONFIG
+
+    black = _normalize(tool.get("black", {}))
+    isort = "isort" in tool
+    autoflake = dict(DEFAULT_AUTOFLAKE_OPTIONS)
+    for setting, value in _normalize(tool.get("autoflake", {})).items():
+        if setting == "imports" and isinstance(value, str):
+            value = [name.strip() for name in value.split(",") if name.strip()]
+        if setting in AUTOFLAKE_SETTINGS:
+            autoflake[AUTOFLAKE_SETTINGS[setting]] = value
+    if not (black or isort or autoflake != DEFAULT_AUTOFLAKE_OPTIONS):
+        return ProjectConfig(path)
+
+    # isort resolves first party modules relative to the project, so its
+    # results depend on where the project is as well as on its settings
+    settings = dict(black=black, isort=tool.get("isort") if isort else None, autoflake=autoflake)
+    if isort:
+        settings["root"] = str(path.parent)
+    key = hashlib.blake2b(
+        json.dumps(settings, sort_keys=True, default=str).encode("utf-8"), digest_size=16
+    ).hexdigest()
+    return ProjectConfig(path, black, isort, autoflake, key)
+
+
+def load_project_config(path: Union[str, Path]) -> ProjectConfig:
+    """Return the settings of a pyproject.toml, reading it on first use only.
+
+    Args:
+        path: Path to the pyproject.toml.
+
+    Returns:
+        The project's settings.
+    """
+    path = Path(path)
+    config = _configs.get(path)
+    if config is None:
+        config = _configs[path] = read_project_config(path)
+    return config
+
+
+def find_project_config(file_path: Union[str, Path]) -> ProjectConfig:
+    """Return the settings of the project a file belongs to.
+
+    The project is the nearest directory above the file holding a
+    pyproject.toml, not looking past the root of a repository. Directories are
+    looked up once and each pyproject.toml is read once, so this is a dict
+    lookup for all but the first file of a directory.
+
+    Args:
+        file_path: Path to a file to clean.
+
+    Returns:
+        The project's settings, the defaults if the file is in no project.
+    """
+    directory = os.path.dirname(os.path.abspath(file_path))
+    visited = []
+    pyproject: Optional[Path] = None
+    while True:
+        if directory in _directories:
+            pyproject = _directories[directory]
+            break
+        visited.append(directory)
+        candidate = os.path.join(directory, PYPROJECT_FILE)
+        if os.path.isfile(candidate):
+            pyproject = Path(candidate)
+            break
+        parent = os.path.dirname(directory)
+        if parent == directory or any(
+            os.path.exists(os.path.join(directory, name)) for name in VCS_DIRECTORIES
+        ):
+            break
+        directory = parent
+    for directory in visited:
+        _directories[directory] = pyproject
+    return DEFAULT_CONFIG if pyproject is None else load_project_config(pyproject)
+
+
+def clear_project_configs() -> None:
+    """Forget the settings read so far, so edited pyproject.toml files are read again."""
+    _configs.clear()
+    _directories.clear()
+
+
+def config_flags(config: Optional[ProjectConfig]) -> Dict[str, Any]:
+    """Cleaning flags telling apart results of a project's settings in the caches.
+
+    Projects setting nothing add no flag, so their results stay cached under
+    the same keys as before project settings were read.
+
+    Args:
+        config: Project settings, None for the defaults.
+
+    Returns:
+        Flags to add to the cache key.
+    """
+    if config is None or config.key is None:
+        return {}
+    return dict(config=config.key)
+
+
+def black_mode(config: Optional[ProjectConfig] = None) -> Any:
+    """Return the black mode of a project's settings, built once per process.
+
+    Args:
+        config: Project settings, None for the defaults.
+
+    Returns:
+        black.Mode for the [tool.black] table.
+
+    Raises:
+        ValueError: If the table sets an unknown target version.
+    """
+    config = config or DEFAULT_CONFIG
+    mode = _black_modes.get(config.key)
+    if mode is None:
+        from black import DEFAULT_LINE_LENGTH, Mode, TargetVersion
+
+        settings = config.black
+        target_versions = set()
+        for version in settings.get("target_version", []):
+            try:
+                target_versions.add(TargetVersion[version.upper()])
+            except KeyError:
+                raise ValueError(f"Unknown black target version '{version}' in {config.path}")
+        mode = _black_modes[config.key] = Mode(
+            target_versions=target_versions,
+            line_length=settings.get("line_length", DEFAULT_LINE_LENGTH),
+            string_normalization=not settings.get("skip_string_normalization", False),
+            magic_trailing_comma=not settings.get("skip_magic_trailing_comma", False),
+            preview=settings.get("preview", False),
+        )
+    return mode
+
+
+def isort_config(config: Optional[ProjectConfig] = None) -> Any:
+    """Return the isort config of a project's settings, built once per process.
+
+    Args:
+        config: Project settings, None for the defaults.
+
+    Returns:
+        isort.Config read from the [tool.isort] table.
+    """
+    config = config or DEFAULT_CONFIG
+    isort_settings = _isort_configs.get(config.key)
+    if isort_settings is None:
+        from isort.settings import DEFAULT_CONFIG as ISORT_DEFAULT_CONFIG
+        from isort.settings import Config
+
+        if config.isort:
+            isort_settings = Config(settings_file=str(config.path))
+        else:
+            isort_settings = ISORT_DEFAULT_CONFIG
+        _isort_configs[config.key] = isort_settings
+    return isort_settings
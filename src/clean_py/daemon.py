@@ -0,0 +1,400 @@
+import contextlib
+import json
+import logging
+import os
+import socket
+import socketserver
+import stat
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple, Union
+
+from .backends import DEFAULT_BACKEND, backend_flags
+from .cache import ResultCache
+from .clean_py import (
+    CleanResult,
+    clean_source,
+    get_cell_cache,
+    rewrite_file,
+    shutdown_cell_pool,
+)
+from .config import ProjectConfig, config_flags, load_project_config
+from .limits import check_file_size
+from .notebook import InvalidNotebookError
+from .profiling import stage
+
+PROTOCOL_VERSION = 1
+# Seconds a client waits on the daemon before giving up on a request
+DEFAULT_TIMEOUT = 60.0
+# Cleaning options a request may carry, anything else is rejected
+REQUEST_OPTIONS = (
+    "autoflake",
+    "isort",
+    "black",
+    "clear_output",
+    "batch_cells",
+    "dedupe_cells",
+    "drop_empty_cells",
+    "strip_magics",
+    "backend",
+    # path of the pyproject.toml whose settings to clean with
+    "config",
+)
+
+Address = Union[str, Tuple[str, int]]
+
+
+class DaemonUnavailable(Exception):
+    """Raised when no daemon is listening on an address."""
+
+
+class DaemonError(Exception):
+    """Raised when the daemon fails to clean a source."""
+
+
+def default_address() -> str:
+    """Return the default daemon socket path, honouring XDG_RUNTIME_DIR.
+
+    Returns:
+        Path of the daemon's Unix socket.
+    """
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    return str(Path(runtime_dir) / f"clean-py-{os.getuid()}.sock")
+
+
+def parse_address(address: Optional[str]) -> Address:
+    """Parse a daemon address given on the command line.
+
+    Args:
+        address: Either a Unix socket path or HOST:PORT, the default socket if None.
+
+    Returns:
+        The socket path, or a (host, port) tuple for TCP.
+    """
+    if not address:
+        return default_address()
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit() and "/" not in address:
+        return (host or "127.0.0.1", int(port))
+    return address
+
+
+def _is_tcp(address: Address) -> bool:
+    return isinstance(address, tuple)
+
+
+def _send(stream, message: Dict[str, Any]) -> None:
+    stream.write(json.dumps(message).encode("utf-8") + b"\n")
+    stream.flush()
+
+
+def _receive(stream) -> Optional[Dict[str, Any]]:
+    line = stream.readline()
+    if not line:
+        return None
+    return json.loads(line)
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """Serve a single request: one JSON line in, one JSON line out."""
+
+    def handle(self) -> None:
+        try:
+            request = _receive(self.rfile)
+        except (ValueError, UnicodeDecodeError) as e:
+            _send(self.wfile, {"status": "error", "error": f"Malformed request: {e}"})
+            return
+        if request is None:
+            return
+        _send(self.wfile, handle_request(request))
+
+
+def handle_request(request: Dict[str, Any]) -> Dict[str, Any]:
+    """Clean the source carried by a daemon request.
+
+    Requests are JSON objects with a `source`, a `file_type` of "py" or "ipynb"
+    and optional `options` out of `REQUEST_OPTIONS`. The `config` option names
+    a pyproject.toml, which the daemon reads once and remembers.
+
+    Args:
+        request: Decoded request.
+
+    Returns:
+        Response with a `status` of "ok" and the cleaned `source`, "invalid" for
+        notebooks that can't be parsed, or "error" with an `error` message.
+    """
+    if request.get("version", PROTOCOL_VERSION) != PROTOCOL_VERSION:
+        return {"status": "error", "error": f"Unsupported protocol version {request['version']}"}
+    source = request.get("source")
+    file_type = request.get("file_type")
+    options = request.get("options") or {}
+    if not isinstance(source, str) or file_type not in ("py", "ipynb"):
+        return {"status": "error", "error": "Request needs a source and a file_type of py or ipynb"}
+    unknown = set(options) - set(REQUEST_OPTIONS)
+    if unknown:
+        return {"status": "error", "error": f"Unknown options: {', '.join(sorted(unknown))}"}
+    if "config" in options:
+        if not isinstance(options["config"], str):
+            return {"status": "error", "error": "The config option must be a path"}
+        options["config"] = load_project_config(options["config"])
+
+    try:
+        # the daemon outlives many requests, so copy-pasted cells are formatted once
+        cleaned = clean_source(source, file_type, cell_cache=get_cell_cache(), **options)
+    except (json.JSONDecodeError, InvalidNotebookError) as e:
+        return {"status": "invalid", "error": str(e)}
+    except Exception as e:
+        logging.exception("Unable to clean request")
+        return {"status": "error", "error": str(e)}
+    return {"status": "ok", "source": cleaned}
+
+
+class _TCPServer(socketserver.TCPServer):
+    allow_reuse_address = True
+
+
+def warm_up() -> None:
+    """Import and exercise every formatter, so the first request is already fast."""
+    clean_source("import os\nx = 1\n", "py")
+
+
+def _claim_socket(path: str) -> None:
+    """Remove a stale socket left by a daemon that died, refuse to start twice."""
+    try:
+        mode = os.stat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise DaemonError(f"{path} exists and is not a socket")
+    if is_running(path):
+        raise DaemonError(f"A daemon is already listening on {path}")
+    os.unlink(path)
+
+
+def make_server(address: Address) -> socketserver.BaseServer:
+    """Bind a daemon server to an address without serving yet.
+
+    Unix sockets are only accessible to the current user, TCP servers should
+    only be bound to localhost as requests are not authenticated.
+
+    Args:
+        address: Socket path or (host, port) tuple.
+
+    Returns:
+        The bound server.
+
+    Raises:
+        DaemonError: If a daemon is already listening on the address.
+    """
+    if _is_tcp(address):
+        return _TCPServer(address, _RequestHandler)
+    if not hasattr(socketserver, "UnixStreamServer"):  # pragma: no cover - Windows
+        raise DaemonError("Unix sockets are not supported here, listen on HOST:PORT instead")
+    _claim_socket(address)
+    old_umask = os.umask(0o177)
+    try:
+        return socketserver.UnixStreamServer(address, _RequestHandler)
+    finally:
+        os.umask(old_umask)
+
+
+def serve(address: Address, server: Optional[socketserver.BaseServer] = None) -> None:
+    """Run the daemon until interrupted.
+
+    Requests are handled one at a time, as the formatters are not guaranteed to
+    be thread safe. Large notebooks still fan out over the warm cell pool.
+
+    Args:
+        address: Socket path or (host, port) tuple to listen on.
+        server: An already bound server, as returned by `make_server`.
+    """
+    server = server or make_server(address)
+    warm_up()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        shutdown_cell_pool()
+        if not _is_tcp(address):
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(address)
+
+
+def _connect(address: Address, timeout: float) -> socket.socket:
+    family = socket.AF_INET if _is_tcp(address) else getattr(socket, "AF_UNIX", None)
+    if family is None:  # pragma: no cover - Windows
+        raise DaemonUnavailable("Unix sockets are not supported here")
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(address)
+    except (FileNotFoundError, ConnectionRefusedError, socket.timeout) as e:
+        sock.close()
+        raise DaemonUnavailable(f"No daemon listening on {address}") from e
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def is_running(address: Address) -> bool:
+    """Check whether a daemon is listening on an address.
+
+    Args:
+        address: Socket path or (host, port) tuple.
+
+    Returns:
+        True if a connection could be made.
+    """
+    try:
+        _connect(address, timeout=1.0).close()
+    except (DaemonUnavailable, OSError):
+        return False
+    return True
+
+
+def request_clean(
+    source: str,
+    file_type: str,
+    address: Address,
+    timeout: float = DEFAULT_TIMEOUT,
+    **options,
+) -> str:
+    """Ask a running daemon to clean some source.
+
+    Args:
+        source: File contents.
+        file_type: Either "py" or "ipynb".
+        address: Socket path or (host, port) tuple of the daemon.
+        timeout: Seconds to wait for the daemon.
+        **options: Cleaning options out of `REQUEST_OPTIONS`.
+
+    Returns:
+        Cleaned contents.
+
+    Raises:
+        DaemonUnavailable: If no daemon is listening on the address.
+        InvalidNotebookError: If the daemon could not parse a notebook.
+        DaemonError: If the daemon failed to clean the source.
+    """
+    request = {
+        "version": PROTOCOL_VERSION,
+        "file_type": file_type,
+        "source": source,
+        "options": options,
+    }
+    with _connect(address, timeout) as sock, sock.makefile("rwb") as stream:
+        _send(stream, request)
+        sock.shutdown(socket.SHUT_WR)
+        response = _receive(stream)
+
+    if response is None:
+        raise DaemonError("Daemon closed the connection without responding")
+    if response.get("status") == "invalid":
+        raise InvalidNotebookError(response.get("error", "invalid notebook"))
+    if response.get("status") != "ok":
+        raise DaemonError(response.get("error", "unknown error"))
+    return response["source"]
+
+
+def clean_with_daemon(
+    source: str,
+    file_type: str,
+    address: Optional[Address] = None,
+    timeout: float = DEFAULT_TIMEOUT,
+    config: Optional[ProjectConfig] = None,
+    **options,
+) -> str:
+    """Clean some source through the daemon, in-process if none is running.
+
+    Args:
+        source: File contents.
+        file_type: Either "py" or "ipynb".
+        address: Socket path or (host, port) tuple, the default socket if None.
+        timeout: Seconds to wait for the daemon.
+        config: Formatter settings to clean with, the daemon is sent the path
+            of their pyproject.toml.
+        **options: Cleaning options out of `REQUEST_OPTIONS`.
+
+    Returns:
+        Cleaned contents.
+    """
+    address = address or default_address()
+    request_options = dict(options)
+    if config is not None and config.key is not None:
+        # only sent when needed, daemons predating project settings refuse the option
+        request_options.update(config=str(config.path))
+    try:
+        with stage("daemon"):
+            return request_clean(source, file_type, address, timeout, **request_options)
+    except DaemonUnavailable:
+        logging.debug(f"No clean-py daemon on {address}, cleaning in-process")
+        return clean_source(source, file_type, config=config, **options)
+
+
+def clean_path_with_daemon(
+    file_path: Union[str, Path],
+    address: Optional[Address] = None,
+    autoflake: bool = True,
+    isort: bool = True,
+    black: bool = True,
+    cache: Optional[ResultCache] = None,
+    write: bool = True,
+    dedupe_cells: bool = False,
+    drop_empty_cells: bool = False,
+    strip_magics: bool = False,
+    timeout: Optional[float] = None,
+    max_size: Optional[int] = None,
+    backend: str = DEFAULT_BACKEND,
+    config: Optional[ProjectConfig] = None,
+) -> CleanResult:
+    """Clean a .py or .ipynb file through the daemon, in-process if none is running.
+
+    Args:
+        file_path: Path to the file.
+        address: Socket path or (host, port) tuple, the default socket if None.
+        autoflake: Whether to remove unused imports using autoflake.
+        isort: Whether to sort imports using isort.
+        black: Whether to format code using black.
+        cache: Result cache used to skip contents that were cleaned before.
+        write: Whether to write changes back, False to only report them.
+        dedupe_cells: Whether to drop notebook cells repeating an earlier cell.
+        drop_empty_cells: Whether to drop notebook cells with a blank source.
+        strip_magics: Whether to remove magics and shell escapes from code cells.
+        timeout: Seconds cleaning may take, None for no limit.
+        max_size: Size in bytes over which the file is refused, None for no limit.
+        backend: Name of the backend cleaning .py files.
+        config: Formatter settings of the project the file belongs to.
+
+    Returns:
+        CleanResult with the original and cleaned contents.
+
+    Raises:
+        LimitExceeded: If the file is larger than `max_size`.
+        CleanTimeout: If cleaning took longer than `timeout`.
+    """
+    file_path = Path(file_path)
+    check_file_size(file_path, max_size)
+    file_type = file_path.suffix[1:]
+    options = dict(autoflake=autoflake, isort=isort, black=black)
+    flags = dict(file_type=file_type, **options)
+    if file_type == "ipynb":
+        options.update(
+            clear_output=True,
+            dedupe_cells=dedupe_cells,
+            drop_empty_cells=drop_empty_cells,
+            strip_magics=strip_magics,
+        )
+        flags.update(options)
+    elif backend != DEFAULT_BACKEND:
+        # only sent when needed, daemons predating backends refuse the option
+        options.update(backend=backend)
+        flags.update(backend_flags(backend))
+    flags.update(config_flags(config))
+
+    def clean(source: str) -> str:
+        return clean_with_daemon(source, file_type, address, config=config, **options)
+
+    return rewrite_file(file_path, clean, flags, cache, write, timeout)
@@ -0,0 +1,180 @@
+import fnmatch
+import os
+import re
+from pathlib import Path
+from typing import Iterator, List, Optional, Pattern, Sequence, Tuple
+
+# Directories that never hold source worth cleaning
+DEFAULT_EXCLUDES = (
+    ".git",
+    ".hg",
+    ".svn",
+    ".venv",
+    "venv",
+    ".tox",
+    ".nox",
+    ".eggs",
+    "*.egg-info",
+    ".mypy_cache",
+    ".pytest_cache",
+    ".ruff_cache",
+    "__pycache__",
+    "__pypackages__",
+    ".ipynb_checkpoints",
+    "node_modules",
+    "_build",
+    "buck-out",
+    "build",
+    "dist",
+)
+SUPPORTED_SUFFIXES = (".py", ".ipynb")
+
+
+def load_gitignore(directory: Path):
+    """Parse the .gitignore file of a directory.
+
+    Args:
+        directory: Directory that may contain a .gitignore file.
+
+    Returns:
+        A pathspec GitIgnoreSpec, or None if there is no .gitignore.
+    """
+    gitignore = directory / ".gitignore"
+    try:
+        with open(gitignore, encoding="utf-8") as f:
+            lines = f.read().splitlines()
+    except (OSError, UnicodeDecodeError):
+        return None
+
+    from pathspec import GitIgnoreSpec
+
+    return GitIgnoreSpec.from_lines(lines)
+
+
+def _ancestor_gitignores(root: Path) -> List[Tuple[Path, object]]:
+    """Collect .gitignore files of the directories above root, up to the repository root."""
+    gitignores = []
+    for directory in root.parents:
+        spec = load_gitignore(directory)
+        if spec is not None:
+            gitignores.append((directory, spec))
+        if (directory / ".git").exists():
+            return gitignores[::-1]
+    # not inside a repository, parent .gitignore files don't apply
+    return []
+
+
+def _compile_globs(patterns: Sequence[str]) -> Optional[Pattern[str]]:
+    # one combined regex is much cheaper per entry than fnmatch over each glob
+    if not patterns:
+        return None
+    return re.compile("|".join(f"(?:{fnmatch.translate(pattern)})" for pattern in patterns))
+
+
+def _matches(regex: Pattern[str], name: str, relative_path: str) -> bool:
+    return bool(regex.match(name) or regex.match(relative_path))
+
+
+def _is_gitignored(path: str, is_dir: bool, gitignores: List[Tuple[str, object]]) -> bool:
+    for base, spec in gitignores:
+        relative_path = path[len(base) + 1 :]
+        if is_dir:
+            relative_path += "/"
+        if spec.match_file(relative_path):
+            return True
+    return False
+
+
+def iter_files(
+    root: Path,
+    suffixes: Sequence[str] = SUPPORTED_SUFFIXES,
+    exclude: Optional[Sequence[str]] = None,
+    include: Optional[Sequence[str]] = None,
+    use_gitignore: bool = True,
+) -> Iterator[Path]:
+    """Walk a directory tree, yielding files to clean as they are found.
+
+    Directories matching the built-in excludes, an `exclude` glob or a .gitignore
+    rule are pruned without being entered. Globs are matched against both the
+    entry name and its path relative to root.
+
+    Args:
+        root: Directory to walk.
+        suffixes: File suffixes to yield.
+        exclude: Globs for files and directories to skip.
+        include: Globs files must match to be yielded, all files if empty.
+        use_gitignore: Whether to honour .gitignore files.
+
+    Yields:
+        Paths of matching files, in sorted order within each directory.
+    """
+    for _, files in walk_tree(root, suffixes, exclude, include, use_gitignore):
+        yield from files
+
+
+def walk_tree(
+    root: Path,
+    suffixes: Sequence[str] = SUPPORTED_SUFFIXES,
+    exclude: Optional[Sequence[str]] = None,
+    include: Optional[Sequence[str]] = None,
+    use_gitignore: bool = True,
+) -> Iterator[Tuple[Path, List[Path]]]:
+    """Walk a directory tree like `iter_files`, one directory at a time.
+
+    Takes the same arguments as `iter_files`.
+
+    Yields:
+        Each directory entered, with the files to clean directly inside it.
+    """
+    root = Path(root)
+    excludes = _compile_globs(DEFAULT_EXCLUDES + tuple(exclude or ()))
+    includes = _compile_globs(include or ())
+    resolved_root = root.resolve()
+    gitignores = (
+        [(base.as_posix(), spec) for base, spec in _ancestor_gitignores(resolved_root)]
+        if use_gitignore
+        else []
+    )
+
+    # depth first, so files start flowing before the whole tree has been walked.
+    # Each entry holds the directory, its resolved and root-relative forms and the
+    # .gitignore specs that apply to it.
+    stack = [(root, resolved_root.as_posix(), "", gitignores)]
+    while stack:
+        directory, resolved_directory, relative_directory, gitignores = stack.pop()
+        if use_gitignore:
+            spec = load_gitignore(directory)
+            if spec is not None:
+                gitignores = gitignores + [(resolved_directory, spec)]
+
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError:
+            continue
+
+        files = []
+        subdirectories = []
+        for entry in entries:
+            name = entry.name
+            is_dir = entry.is_dir(follow_symlinks=False)
+            if not is_dir and os.path.splitext(name)[1] not in suffixes:
+                continue
+            relative_path = f"{relative_directory}/{name}" if relative_directory else name
+            if _matches(excludes, name, relative_path):
+                continue
+            if not is_dir and includes and not _matches(includes, name, relative_path):
+                continue
+            resolved_path = f"{resolved_directory}/{name}"
+            if gitignores and _is_gitignored(resolved_path, is_dir, gitignores):
+                continue
+
+            if is_dir:
+                subdirectories.append(
+                    (Path(entry.path), resolved_path, relative_path, gitignores)
+                )
+            else:
+                files.append(Path(entry.path))
+
+        yield directory, files
+        stack.extend(reversed(subdirectories))
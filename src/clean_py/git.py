@@ -0,0 +1,76 @@
+import subprocess
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+
+class GitError(Exception):
+    """Raised when a git command fails, e.g. outside a repository or on a bad ref."""
+
+
+def run_git(args: Sequence[str], cwd: Path) -> str:
+    """Run a git command and return its standard output.
+
+    Args:
+        args: Arguments passed to git.
+        cwd: Directory to run git in.
+
+    Returns:
+        Standard output of the command.
+
+    Raises:
+        GitError: If git is missing or the command fails.
+    """
+    try:
+        completed = subprocess.run(
+            ("git", *args), cwd=cwd, capture_output=True, text=True, check=True
+        )
+    except FileNotFoundError as e:
+        raise GitError("git executable not found") from e
+    except subprocess.CalledProcessError as e:
+        raise GitError(e.stderr.strip() or f"git {' '.join(args)} failed") from e
+    return completed.stdout
+
+
+def repository_root(path: Path) -> Path:
+    """Find the root of the git repository containing a path.
+
+    Args:
+        path: File or directory inside the repository.
+
+    Returns:
+        Absolute path of the repository's working tree root.
+    """
+    cwd = path if path.is_dir() else path.parent
+    return Path(run_git(("rev-parse", "--show-toplevel"), cwd).strip())
+
+
+def changed_files(
+    path: Path, ref: Optional[str] = None, staged: bool = False
+) -> List[Path]:
+    """List files under a path that changed relative to a ref or the index.
+
+    Only added, copied, modified and renamed files are returned, renames are
+    reported under their new name and deleted files are left out.
+
+    Args:
+        path: File or directory to restrict the diff to.
+        ref: Commit to diff against. Without one the working tree is diffed
+            against the index, or the index against HEAD when `staged`.
+        staged: Diff the index (staged changes) instead of the working tree.
+
+    Returns:
+        Absolute paths of the changed files that still exist on disk.
+    """
+    path = path.resolve()
+    cwd = path if path.is_dir() else path.parent
+    root = repository_root(path)
+    args = ["diff", "--name-only", "-z", "--no-ext-diff", "--diff-filter=ACMR", "--find-renames"]
+    if staged:
+        args.append("--cached")
+    if ref is not None:
+        args.append(ref)
+    args += ["--", str(path)]
+
+    output = run_git(args, cwd)
+    files = (root / name for name in output.split("\0") if name)
+    return [file_path for file_path in files if file_path.is_file()]
@@ -0,0 +1,114 @@
+import contextlib
+import logging
+import os
+import signal
+import threading
+from pathlib import Path
+from typing import Iterator, Optional, Union
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - Windows
+    resource = None
+
+
+class LimitExceeded(Exception):
+    """Raised when a file is skipped for going over a size or memory limit."""
+
+
+class CleanTimeout(BaseException):
+    """Raised when cleaning a file takes longer than its time limit.
+
+    This derives from BaseException, like KeyboardInterrupt, so the broad
+    handlers around individual formatters and cells don't swallow it and carry
+    on cleaning the rest of the file.
+    """
+
+
+def check_file_size(file_path: Union[str, Path], max_size: Optional[int]) -> None:
+    """Refuse files larger than a size limit, before reading them.
+
+    Args:
+        file_path: Path to the file.
+        max_size: Maximum size in bytes, None for no limit.
+
+    Raises:
+        LimitExceeded: If the file is larger than `max_size`.
+    """
+    if max_size is None:
+        return
+    size = os.stat(file_path).st_size
+    if size > max_size:
+        raise LimitExceeded(f"File is {size} bytes, over the {max_size} byte limit")
+
+
+def _raise_timeout(signum, frame):
+    raise CleanTimeout()
+
+
+@contextlib.contextmanager
+def time_limit(seconds: Optional[float]) -> Iterator[None]:
+    """Interrupt the enclosed code with CleanTimeout once it runs too long.
+
+    The limit is enforced with SIGALRM, which interrupts pure Python and the
+    formatters alike. Where that is unavailable, off the main thread or on
+    Windows, the code runs without a limit.
+
+    Args:
+        seconds: Time limit, None or 0 for no limit.
+
+    Raises:
+        CleanTimeout: If the enclosed code is still running after `seconds`.
+    """
+    if not seconds:
+        yield
+        return
+    on_main_thread = threading.current_thread() is threading.main_thread()
+    if not hasattr(signal, "setitimer") or not on_main_thread:
+        logging.debug("Time limits need SIGALRM on the main thread, running without one")
+        yield
+        return
+
+    previous = signal.signal(signal.SIGALRM, _raise_timeout)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def set_memory_limit(max_bytes: int) -> None:
+    """Cap the address space of the current process and its future children.
+
+    Allocations past the cap raise MemoryError rather than exhausting the
+    machine.
+
+    Args:
+        max_bytes: Maximum address space in bytes.
+    """
+    if resource is None:  # pragma: no cover - Windows
+        logging.debug("Memory limits are not supported here, running without one")
+        return
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    if hard != resource.RLIM_INFINITY:
+        max_bytes = min(max_bytes, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (max_bytes, hard))
+
+
+@contextlib.contextmanager
+def memory_limit(max_bytes: Optional[int]) -> Iterator[None]:
+    """Cap the memory of the current process for the enclosed code.
+
+    Args:
+        max_bytes: Maximum address space in bytes, None for no limit.
+    """
+    if max_bytes is None or resource is None:
+        yield
+        return
+    previous = resource.getrlimit(resource.RLIMIT_AS)
+    set_memory_limit(max_bytes)
+    try:
+        yield
+    finally:
+        resource.setrlimit(resource.RLIMIT_AS, previous)
@@ -0,0 +1,373 @@
+import json
+import re
+from typing import IO, Any, Callable, Dict, List, Tuple, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+# Characters json.dumps(ensure_ascii=True) escapes beyond those orjson does: non-ASCII
+# ones, and DEL, which is ASCII but escaped all the same
+_NON_ASCII = re.compile("[^\x00-\x7e]")
+_NON_WHITESPACE = re.compile(r"[^ \t\n\r]")
+# Runs of text without brackets, short strings included, skipped in one go.
+# Long strings are left to str.find, which scans them much faster.
+_SKIPPABLE = re.compile(
+    r'(?:[^"\[\]{}]+|"[^"\\]{0,256}(?:\\.[^"\\]{0,256})*")*', re.DOTALL
+)
+# Characters read from a notebook at a time when streaming it
+STREAM_CHUNK_SIZE = 1024 * 1024
+# Mime types besides text/* whose multi-line strings nbformat writes as lists of lines
+SPLIT_MIME_TYPES = ("application/javascript", "image/svg+xml")
+# Notebook metadata nbformat never writes to files
+TRANSIENT_METADATA = ("orig_nbformat", "orig_nbformat_minor", "signature")
+
+
+class InvalidNotebookError(ValueError):
+    """Raised when a document is valid JSON but not a notebook."""
+
+
+class _FloatFreeNotebook(dict):
+    """A loaded notebook without floats or NaN/Infinity, so orjson can write it.
+
+    orjson formats exponents differently to `repr` and writes NaN as null, so only
+    notebooks known to hold neither are sent to it.
+    """
+
+
+def loads_notebook(contents: Union[str, bytes]) -> Dict[str, Any]:
+    """Parse and validate a notebook document.
+
+    Args:
+        contents: Notebook JSON.
+
+    Returns:
+        Loaded notebook dictionary.
+
+    Raises:
+        json.JSONDecodeError: If the contents are not valid JSON.
+        InvalidNotebookError: If the JSON does not describe a notebook.
+    """
+    hooks, floats_seen = _float_tracking_hooks()
+    ipynb_dict = json.loads(contents, **hooks)
+    return _validate(ipynb_dict, floats_seen)
+
+
+def _float_tracking_hooks() -> Tuple[Dict[str, Callable[[str], float]], List[str]]:
+    """Create decoder hooks recording the floats and NaN/Infinity constants decoded."""
+    # the C decoder only calls these hooks for floats and constants, so tracking
+    # them is free for the usual float-free notebook
+    floats_seen: List[str] = []
+
+    def parse_float(value: str) -> float:
+        floats_seen.append(value)
+        return float(value)
+
+    def parse_constant(value: str) -> float:
+        floats_seen.append(value)
+        return float(value.replace("Infinity", "inf"))
+
+    return dict(parse_float=parse_float, parse_constant=parse_constant), floats_seen
+
+
+def _validate(ipynb_dict: Any, floats_seen: List[str]) -> Dict[str, Any]:
+    if not isinstance(ipynb_dict, dict) or not isinstance(ipynb_dict.get("cells"), list):
+        raise InvalidNotebookError("notebook has no list of cells")
+    if not floats_seen:
+        ipynb_dict = _FloatFreeNotebook(ipynb_dict)
+    return ipynb_dict
+
+
+def load_notebook_without_outputs(
+    file: IO[str], chunk_size: int = STREAM_CHUNK_SIZE
+) -> Dict[str, Any]:
+    """Parse a notebook from a file, skipping the outputs of its cells unread.
+
+    Outputs are scanned past without being decoded or held in memory and are
+    loaded as empty lists, so memory use depends on the notebook's code rather
+    than on its outputs. Only use this when the outputs are cleared anyway, as
+    they are only checked for balanced brackets and quotes.
+
+    Args:
+        file: Notebook file opened in text mode.
+        chunk_size: Number of characters read at a time.
+
+    Returns:
+        Loaded notebook dictionary, with empty cell outputs.
+
+    Raises:
+        json.JSONDecodeError: If the file is not valid JSON.
+        InvalidNotebookError: If the JSON does not describe a notebook.
+    """
+    reader = _StreamReader(file, chunk_size)
+    ipynb_dict = reader.read_notebook()
+    return _validate(ipynb_dict, reader.floats_seen)
+
+
+class _StreamReader:
+    """Incremental JSON parser over a text file, just capable enough for notebooks.
+
+    Only the consumed prefix of the text is ever dropped, the buffer holds the
+    unconsumed rest. Values worth keeping are decoded by the C decoder from the
+    buffer, reading further chunks while they are incomplete.
+    """
+
+    def __init__(self, file: IO[str], chunk_size: int):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        hooks, self.floats_seen = _float_tracking_hooks()
+        self.decoder = json.JSONDecoder(**hooks)
+
+    def _error(self, message: str) -> json.JSONDecodeError:
+        return json.JSONDecodeError(message, self.buffer, self.pos)
+
+    def _fill(self) -> bool:
+        """Read another chunk, returns False at the end of the file."""
+        if self.eof:
+            return False
+        # grow reads with the pending text, so retrying large values stays linear
+        chunk = self.file.read(max(self.chunk_size, len(self.buffer) - self.pos))
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos :] + chunk
+        self.pos = 0
+        return True
+
+    def _peek(self) -> str:
+        """Skip whitespace and return the next character without consuming it."""
+        while True:
+            match = _NON_WHITESPACE.search(self.buffer, self.pos)
+            if match is not None:
+                self.pos = match.start()
+                return self.buffer[self.pos]
+            self.pos = len(self.buffer)
+            if not self._fill():
+                raise self._error("Expecting value")
+
+    def _expect(self, char: str) -> None:
+        if self._peek() != char:
+            raise self._error(f"Expecting '{char}'")
+        self.pos += 1
+
+    def _decode(self) -> Any:
+        """Decode the next value in full."""
+        self._peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                # possibly just cut off by the end of the buffer
+                if self._fill():
+                    continue
+                raise
+            # a number at the end of the buffer may continue in the next chunk
+            if end == len(self.buffer) and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def _skip(self) -> None:
+        """Scan past the next value without decoding it."""
+        char = self._peek()
+        if char == '"':
+            self.pos += 1
+            self._skip_string()
+            return
+        if char not in "[{":
+            self._decode()
+            return
+        depth = 0
+        while True:
+            self.pos = _SKIPPABLE.match(self.buffer, self.pos).end()
+            if self.pos == len(self.buffer):
+                if not self._fill():
+                    raise self._error("Unterminated value")
+                continue
+            char = self.buffer[self.pos]
+            self.pos += 1
+            if char == '"':
+                # a long string, or one cut off by the end of the buffer
+                self._skip_string()
+            elif char in "[{":
+                depth += 1
+            else:
+                depth -= 1
+            if depth == 0:
+                return
+
+    def _skip_string(self) -> None:
+        """Scan past the rest of a string, starting after its opening quote."""
+        while True:
+            end = self.buffer.find('"', self.pos)
+            if end == -1:
+                # keep trailing backslashes, they may escape the next chunk's quote
+                trailing = len(self.buffer) - len(self.buffer.rstrip("\\"))
+                self.pos = max(self.pos, len(self.buffer) - trailing)
+                if not self._fill():
+                    raise self._error("Unterminated string")
+                continue
+            backslashes = 0
+            while end - backslashes > 0 and self.buffer[end - backslashes - 1] == "\\":
+                backslashes += 1
+            self.pos = end + 1
+            if backslashes % 2 == 0:
+                return
+
+    def _members(self):
+        """Iterate over the keys of an object, leaving each value to the caller."""
+        self._expect("{")
+        if self._peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            if self._peek() != '"':
+                raise self._error("Expecting property name enclosed in double quotes")
+            key = self._decode()
+            self._expect(":")
+            yield key
+            char = self._peek()
+            self.pos += 1
+            if char == "}":
+                return
+            if char != ",":
+                raise self._error("Expecting ',' delimiter")
+
+    def _read_cell(self) -> Any:
+        if self._peek() != "{":
+            return self._decode()
+        cell = {}
+        for key in self._members():
+            if key == "outputs" and cell.get("cell_type", "code") == "code":
+                self._skip()
+                cell[key] = []
+            else:
+                cell[key] = self._decode()
+        return cell
+
+    def _read_cells(self) -> Any:
+        if self._peek() != "[":
+            return self._decode()
+        self.pos += 1
+        cells = []
+        if self._peek() == "]":
+            self.pos += 1
+            return cells
+        while True:
+            cells.append(self._read_cell())
+            char = self._peek()
+            self.pos += 1
+            if char == "]":
+                return cells
+            if char != ",":
+                raise self._error("Expecting ',' delimiter")
+
+    def read_notebook(self) -> Any:
+        if self._peek() != "{":
+            value = self._decode()
+        else:
+            value = {}
+            for key in self._members():
+                value[key] = self._read_cells() if key == "cells" else self._decode()
+        while True:
+            if _NON_WHITESPACE.search(self.buffer, self.pos) is not None:
+                raise self._error("Extra data")
+            self.pos = len(self.buffer)
+            if not self._fill():
+                return value
+
+
+def normalize_notebook(ipynb_dict: Dict[str, Any]) -> Dict[str, Any]:
+    """Lay out a notebook the way nbformat writes it, in place.
+
+    Multi-line strings of sources and text outputs become lists of lines and
+    transient metadata is dropped, as `nbformat.writes` does. Together with the
+    sorted keys of `dumps_notebook`, notebooks are written byte for byte as
+    `jupyter nbconvert --inplace` used to write them.
+
+    Args:
+        ipynb_dict: Loaded notebook dictionary.
+
+    Returns:
+        The same notebook dictionary.
+    """
+    metadata = ipynb_dict.get("metadata")
+    if metadata:
+        for field in TRANSIENT_METADATA:
+            metadata.pop(field, None)
+    for cell in ipynb_dict["cells"]:
+        source = cell.get("source")
+        if isinstance(source, str):
+            cell["source"] = source.splitlines(True)
+        if cell.get("metadata"):
+            cell["metadata"].pop("trusted", None)
+        for attachment in (cell.get("attachments") or {}).values():
+            _split_mime_bundle(attachment)
+        for output in cell.get("outputs") or ():
+            if output.get("output_type") in ("execute_result", "display_data"):
+                _split_mime_bundle(output.get("data") or {})
+            elif output.get("output_type") == "stream" and isinstance(output.get("text"), str):
+                output["text"] = output["text"].splitlines(True)
+    return ipynb_dict
+
+
+def _split_mime_bundle(data: Dict[str, Any]) -> None:
+    for mime_type, value in data.items():
+        if isinstance(value, str) and (
+            mime_type.startswith("text/") or mime_type in SPLIT_MIME_TYPES
+        ):
+            data[mime_type] = value.splitlines(True)
+
+
+def dumps_notebook(ipynb_dict: Dict[str, Any]) -> str:
+    """Serialize a notebook the way `json.dump(..., indent=1, sort_keys=True)`
+    plus a newline does.
+
+    The standard library only has a pure Python encoder when indenting. For
+    notebooks loaded by `loads_notebook` without floats, orjson is used instead
+    when installed, with its output rewritten to the same indentation and ASCII
+    escaping so both paths produce byte-identical files.
+
+    Args:
+        ipynb_dict: Notebook dictionary.
+
+    Returns:
+        Serialized notebook.
+    """
+    if orjson is not None and isinstance(ipynb_dict, _FloatFreeNotebook):
+        try:
+            data = orjson.dumps(ipynb_dict, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS)
+        except orjson.JSONEncodeError:
+            # e.g. integers beyond 64 bits
+            pass
+        else:
+            text = _halve_indent(data).decode("utf-8")
+            if not text.isascii() or "\x7f" in text:
+                text = _NON_ASCII.sub(_escape, text)
+            return text + "\n"
+    return json.dumps(ipynb_dict, indent=1, sort_keys=True) + "\n"
+
+
+def _halve_indent(data: bytes) -> bytes:
+    # Lines never start inside a string, so every line starts with its exact
+    # indent. Rewriting the deepest level first, to NUL placeholders that can't
+    # occur in the output, keeps each plain replace from touching other levels.
+    depth = 1
+    while b"\n" + b"  " * depth in data:
+        depth += 1
+    for level in range(depth - 1, 0, -1):
+        data = data.replace(b"\n" + b"  " * level, b"\n" + b"\0" * level)
+    return data.replace(b"\0", b" ")
+
+
+def _escape(match: "re.Match[str]") -> str:
+    # same \uXXXX escapes (with surrogate pairs) as json.dumps(ensure_ascii=True)
+    code = ord(match.group())
+    if code < 0x10000:
+        return f"\\u{code:04x}"
+    code -= 0x10000
+    return f"\\u{0xD800 | (code >> 10):04x}\\u{0xDC00 | (code & 0x3FF):04x}"
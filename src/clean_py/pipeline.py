@@ -0,0 +1,91 @@
+import collections
+import os
+import time
+from concurrent.futures import Executor, Future
+from pathlib import Path
+from typing import Callable, Deque, Iterable, Iterator, NamedTuple, Optional, TypeVar
+
+from .clean_py import STREAM_NOTEBOOK_SIZE, create_file, read_file
+
+# Files in flight between each pair of stages, bounding the memory of a run
+# to this many files per stage however large the tree
+DEFAULT_QUEUE_SIZE = 32
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class Prefetched(NamedTuple):
+    """A file read ahead of cleaning it."""
+
+    path: Path
+    # None when the file was left for the cleaner to read, or stream
+    source: Optional[str] = None
+    seconds: Optional[float] = None
+
+
+def bounded_map(
+    executor: Executor, fn: Callable[[T], R], items: Iterable[T], queue_size: int
+) -> Iterator["Future[R]"]:
+    """Run a function over items on an executor, keeping a bounded number in flight.
+
+    Unlike `Executor.map`, which submits every item up front, the next item is
+    only taken from `items` once the oldest of `queue_size` pending calls is
+    handed out, so lazily discovered items are consumed at the pace of the
+    results.
+
+    Args:
+        executor: Executor to run the calls on.
+        fn: Function to call.
+        items: Arguments to call it with, one call per item.
+        queue_size: Maximum number of calls submitted but not yet handed out.
+
+    Yields:
+        The future of each call, in input order.
+    """
+    pending: Deque["Future[R]"] = collections.deque()
+    try:
+        for item in items:
+            pending.append(executor.submit(fn, item))
+            if len(pending) >= queue_size:
+                yield pending.popleft()
+        while pending:
+            yield pending.popleft()
+    finally:
+        # calls not handed out are of no use once the consumer stops early
+        for future in pending:
+            future.cancel()
+
+
+def prefetch(file_path: Path, max_size: Optional[int] = None) -> Prefetched:
+    """Read a file ahead of cleaning it.
+
+    Files that are streamed rather than read whole, or that are over the size
+    limit, and files that can't be read are left to the cleaner, which reads
+    them or reports why it can't in its usual way.
+
+    Args:
+        file_path: Path to the file.
+        max_size: Size in bytes over which the file is refused, None for no limit.
+
+    Returns:
+        The file's contents, and the seconds it took to read them.
+    """
+    start = time.perf_counter()
+    try:
+        size = os.stat(file_path).st_size
+        if size >= STREAM_NOTEBOOK_SIZE or (max_size is not None and size > max_size):
+            return Prefetched(file_path)
+        source = read_file(file_path)
+    except (OSError, UnicodeDecodeError):
+        return Prefetched(file_path)
+    return Prefetched(file_path, source, time.perf_counter() - start)
+
+
+def write_later(file_path: Path, contents: Optional[str]) -> Optional[float]:
+    """Write a cleaned file, returning the seconds it took, if there is anything to write."""
+    if contents is None:
+        return None
+    start = time.perf_counter()
+    create_file(file_path, contents)
+    return time.perf_counter() - start
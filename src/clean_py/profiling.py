@@ -0,0 +1,98 @@
+import contextlib
+import time
+from typing import Dict, Iterator, Optional
+
+# Stage timings of the file being cleaned, None while profiling is disabled
+_timings: Optional[Dict[str, float]] = None
+# Event counts of the file being cleaned, None while counting is disabled
+_counters: Optional[Dict[str, int]] = None
+
+
+class _Stage:
+    __slots__ = ("name", "timings", "start")
+
+    def __init__(self, name: str, timings: Dict[str, float]):
+        self.name = name
+        self.timings = timings
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info) -> None:
+        elapsed = time.perf_counter() - self.start
+        self.timings[self.name] = self.timings.get(self.name, 0.0) + elapsed
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        pass
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+def stage(name: str):
+    """Time a stage of cleaning a file, e.g. `with stage("black"): ...`.
+
+    While profiling is disabled this returns a shared no-op context manager, so
+    instrumented code pays a function call and nothing else.
+
+    Args:
+        name: Stage name, time spent in stages of the same name adds up.
+
+    Returns:
+        Context manager timing its body.
+    """
+    if _timings is None:
+        return _NULL_STAGE
+    return _Stage(name, _timings)
+
+
+@contextlib.contextmanager
+def record() -> Iterator[Dict[str, float]]:
+    """Enable profiling and collect the stage timings of the enclosed code.
+
+    Yields:
+        Mapping of stage name to seconds spent in it, filled in as stages end.
+    """
+    global _timings
+    previous = _timings
+    _timings = timings = {}
+    try:
+        yield timings
+    finally:
+        _timings = previous
+
+
+def count(name: str, n: int = 1) -> None:
+    """Count an event while cleaning a file, e.g. `count("cell cache hits")`.
+
+    Does nothing while counting is disabled.
+
+    Args:
+        name: Counter name.
+        n: Amount added to the counter.
+    """
+    if _counters is not None:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+@contextlib.contextmanager
+def counting() -> Iterator[Dict[str, int]]:
+    """Enable counters and collect the events counted by the enclosed code.
+
+    Yields:
+        Mapping of counter name to count, filled in as events happen.
+    """
+    global _counters
+    previous = _counters
+    _counters = counters = {}
+    try:
+        yield counters
+    finally:
+        _counters = previous
@@ -0,0 +1,147 @@
+import json
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .clean_py import STREAM_NOTEBOOK_SIZE
+
+# Rough seconds spent cleaning, measured on the benchmark corpus: per file, per
+# byte of .py source, per notebook code cell and per byte of notebook JSON,
+# most of which is usually outputs that are cleared rather than formatted
+FILE_SECONDS = 5e-3
+PY_SECONDS_PER_BYTE = 20e-6
+CELL_SECONDS = 2e-3
+NOTEBOOK_SECONDS_PER_BYTE = 20e-9
+# File in the cache directory remembering how long files took to clean
+TIMINGS_FILE = "timings.json"
+
+_CODE_CELL = re.compile(rb'"cell_type"\s*:\s*"code"')
+
+# Size and mtime of a file, telling whether a saved timing still applies
+Signature = Tuple[int, int]
+
+
+def count_code_cells(file_path: Path) -> Optional[int]:
+    """Count the code cells of a notebook without parsing it.
+
+    Args:
+        file_path: Path to the notebook.
+
+    Returns:
+        Number of code cells, None if the notebook can't be read.
+    """
+    try:
+        with open(file_path, "rb") as f:
+            return len(_CODE_CELL.findall(f.read()))
+    except OSError:
+        return None
+
+
+def estimate_cost(file_path: Path, size: int) -> float:
+    """Estimate the seconds cleaning a file takes, from its size and cell count.
+
+    Only notebooks are read, to count their code cells, and only those small
+    enough to be read whole when cleaned.
+
+    Args:
+        file_path: Path to the file.
+        size: Size of the file in bytes.
+
+    Returns:
+        Estimated seconds, only meaningful relative to other estimates.
+    """
+    if file_path.suffix != ".ipynb":
+        return FILE_SECONDS + size * PY_SECONDS_PER_BYTE
+    cells = count_code_cells(file_path) if size < STREAM_NOTEBOOK_SIZE else None
+    return FILE_SECONDS + (cells or 0) * CELL_SECONDS + size * NOTEBOOK_SECONDS_PER_BYTE
+
+
+class TimingHistory:
+    """How long files took to clean on earlier runs, saved as JSON.
+
+    Timings are keyed by absolute path and only apply while the file keeps the
+    size and mtime it had once cleaned.
+
+    Args:
+        path: JSON file the timings are loaded from and saved to.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.timings: Dict[str, Tuple[int, int, float]] = {}
+        try:
+            with open(path, encoding="utf-8") as f:
+                self.timings = {key: tuple(value) for key, value in json.load(f).items()}
+        except (OSError, ValueError, TypeError, AttributeError):
+            # history is best effort, start afresh if it is missing or corrupt
+            pass
+
+    def get(self, file_path: Path, signature: Signature) -> Optional[float]:
+        """Seconds the file took last time, None if unknown or it changed since."""
+        timing = self.timings.get(os.path.abspath(file_path))
+        if timing is None or tuple(timing[:2]) != signature:
+            return None
+        return timing[2]
+
+    def record(self, file_path: Path, seconds: float) -> None:
+        """Remember how long a file took to clean, as it is on disk now."""
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return
+        self.timings[os.path.abspath(file_path)] = (stat.st_size, stat.st_mtime_ns, seconds)
+
+    def save(self) -> None:
+        """Write the timings back, dropping those of files that no longer exist."""
+        timings = {key: value for key, value in self.timings.items() if os.path.exists(key)}
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # write then rename, so concurrent runs never read a partial file
+            fd, tmp_path = tempfile.mkstemp(dir=self.path.parent)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(timings, f)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass
+
+
+def expected_cost(file_path: Path, history: Optional[TimingHistory] = None) -> float:
+    """Expected seconds cleaning a file takes, from its history or else an estimate.
+
+    Args:
+        file_path: Path to the file.
+        history: Timings of earlier runs.
+
+    Returns:
+        Expected seconds, 0 if the file can't be found.
+    """
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return 0.0
+    if history is not None:
+        seconds = history.get(file_path, (stat.st_size, stat.st_mtime_ns))
+        if seconds is not None:
+            return seconds
+    return estimate_cost(file_path, stat.st_size)
+
+
+def schedule(files: Iterable[Path], history: Optional[TimingHistory] = None) -> List[Path]:
+    """Order files most expensive first, so no large file starts near the end of a run.
+
+    When files are cleaned in parallel the run lasts at least as long as its
+    last file to start takes, so starting the largest files first and filling
+    in with small ones keeps the workers evenly busy until the end.
+
+    Args:
+        files: Files to clean.
+        history: Timings of earlier runs, refining the estimates.
+
+    Returns:
+        The files by decreasing expected cost, files of equal cost in their
+        original order.
+    """
+    costed = [(expected_cost(file_path, history), file_path) for file_path in files]
+    return [file_path for _, file_path in sorted(costed, key=lambda item: -item[0])]
@@ -0,0 +1,175 @@
+import hashlib
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+# Version of the run report written by `clean-py --report`
+REPORT_VERSION = 1
+
+
+class Shard(NamedTuple):
+    """One of `count` shards of a run, numbered from 1."""
+
+    index: int
+    count: int
+
+    def __str__(self) -> str:
+        return f"{self.index}/{self.count}"
+
+
+def parse_shard(spec: str) -> Shard:
+    """Parse a shard given as `i/N`, e.g. `2/4` for the second of four shards.
+
+    Args:
+        spec: Shard number and number of shards, separated by a slash.
+
+    Returns:
+        The parsed Shard.
+
+    Raises:
+        ValueError: If the spec is malformed or the shard is out of range.
+    """
+    index, sep, count = spec.partition("/")
+    try:
+        shard = Shard(int(index), int(count))
+    except ValueError:
+        raise ValueError(f"Shard '{spec}' is not of the form i/N") from None
+    if not sep or shard.count < 1 or not 1 <= shard.index <= shard.count:
+        raise ValueError(f"Shard '{spec}' is not of the form i/N with 1 <= i <= N")
+    return shard
+
+
+def shard_key(file_path: Path, root: Path) -> str:
+    """The path a file is sharded by, the same on every checkout of a tree."""
+    relative = os.path.relpath(os.path.abspath(file_path), os.path.abspath(root))
+    return Path(relative).as_posix()
+
+
+def shard_of(key: str, count: int) -> int:
+    """Assign a path to one of `count` shards from a stable hash of it.
+
+    Unlike `hash()`, the digest doesn't vary between processes, machines or
+    Python versions.
+    """
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % count + 1
+
+
+def select_shard(
+    files: Iterable[Path], shard: Shard, root: Path, weight_by_size: bool = False
+) -> List[Path]:
+    """Pick the files of a tree that belong to one shard.
+
+    Every shard of a run must be given the same files, so the shards together
+    clean each file exactly once. By default a file's shard depends only on its
+    path relative to `root`, so adding or removing files doesn't move others
+    between shards. Weighting by size instead balances the bytes each shard
+    cleans, assigning the largest files first to the lightest shard. That
+    depends on every file of the tree, so the shards must also see the same
+    file sizes.
+
+    Args:
+        files: Files of the whole run.
+        shard: Shard to select.
+        root: Directory the paths are made relative to before hashing.
+        weight_by_size: Whether to balance shards by file size.
+
+    Returns:
+        The files of the shard, in their original order.
+    """
+    keyed = [(shard_key(file_path, root), file_path) for file_path in files]
+    if not weight_by_size:
+        return [file_path for key, file_path in keyed if shard_of(key, shard.count) == shard.index]
+
+    sizes = {key: os.stat(file_path).st_size for key, file_path in keyed}
+    loads = [0] * shard.count
+    assigned = {}
+    for key in sorted(sizes, key=lambda key: (-sizes[key], key)):
+        lightest = min(range(shard.count), key=lambda index: (loads[index], index))
+        loads[lightest] += sizes[key]
+        assigned[key] = lightest + 1
+    return [file_path for key, file_path in keyed if assigned[key] == shard.index]
+
+
+def merge_reports(reports: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Combine the run reports of the shards of a run into one.
+
+    A sharded run only passes if every shard passed and every shard reported,
+    once. Reports of runs that were not sharded count as shard 1/1.
+
+    Args:
+        reports: Reports written by `clean-py --report`.
+
+    Returns:
+        Report of the whole run, with the `shards` merged and any `missing` or
+        `duplicate` ones, the summed counts and the results of every shard.
+
+    Raises:
+        ValueError: If the reports are of different versions, modes or numbers
+            of shards.
+    """
+    if not reports:
+        raise ValueError("No reports to merge")
+    versions = {report.get("version") for report in reports}
+    if versions != {REPORT_VERSION}:
+        raise ValueError(f"Unsupported report version(s): {sorted(map(str, versions))}")
+    modes = {report["mode"] for report in reports}
+    if len(modes) > 1:
+        raise ValueError(f"Reports come from runs in different modes: {', '.join(sorted(modes))}")
+    shards = [parse_shard(report["shard"] or "1/1") for report in reports]
+    counts = {shard.count for shard in shards}
+    if len(counts) > 1:
+        raise ValueError(f"Reports split the run into different numbers of shards: {sorted(counts)}")
+
+    count = counts.pop()
+    indices = [shard.index for shard in shards]
+    missing = [str(Shard(index, count)) for index in range(1, count + 1) if index not in indices]
+    duplicate = sorted({str(shard) for shard in shards if indices.count(shard.index) > 1})
+    results: List[Tuple[str, Dict[str, Any]]] = []
+    for report in reports:
+        results.extend((entry["path"], entry) for entry in report["results"])
+    failed = any(report["exit_code"] for report in reports)
+    return {
+        "version": REPORT_VERSION,
+        "mode": modes.pop(),
+        "shards": sorted(map(str, set(shards)), key=lambda spec: parse_shard(spec).index),
+        "missing": missing,
+        "duplicate": duplicate,
+        "files": sum(report["files"] for report in reports),
+        "changed": sum(report["changed"] for report in reports),
+        "errors": sum(report["errors"] for report in reports),
+        "exit_code": 1 if failed or missing or duplicate else 0,
+        "results": [entry for _, entry in sorted(results, key=lambda item: item[0])],
+    }
+
+
+def shard_report(
+    shard: Optional[Shard],
+    mode: str,
+    files: int,
+    results: List[Dict[str, Any]],
+    exit_code: int,
+) -> Dict[str, Any]:
+    """Build the machine-readable report of one run or shard.
+
+    Args:
+        shard: Shard the run cleaned, None if it was not sharded.
+        mode: "write", "check" or "diff".
+        files: Number of files the run cleaned.
+        results: Entries with the `path`, `status`, whether the file `changed`
+            and any `error`, for files that changed or could not be cleaned.
+        exit_code: Exit code of the run.
+
+    Returns:
+        Report that `merge_reports` combines across shards.
+    """
+    return {
+        "version": REPORT_VERSION,
+        "shard": str(shard) if shard is not None else None,
+        "mode": mode,
+        "files": files,
+        "changed": sum(1 for entry in results if entry["changed"]),
+        "errors": sum(1 for entry in results if entry["error"] is not None),
+        "exit_code": exit_code,
+        "results": sorted(results, key=lambda entry: entry["path"]),
+    }
@@ -0,0 +1,298 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from .discovery import SUPPORTED_SUFFIXES, walk_tree
+
+# Seconds a burst of events must be quiet for before the files are cleaned
+DEFAULT_DEBOUNCE = 0.2
+# Seconds between scans of the tree when polling for changes
+DEFAULT_POLL_INTERVAL = 1.0
+# Seconds waited for events before checking whether to stop
+IDLE_TIMEOUT = 0.5
+
+# inotify(7) event flags
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+WATCH_MASK = (
+    IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+    | IN_MOVE_SELF
+    | IN_ONLYDIR
+)
+_EVENT_HEADER = struct.Struct("iIII")
+
+# A file's identity and contents as far as change detection is concerned
+Signature = Tuple[int, int, int]
+
+
+def _signature(path: Path) -> Optional[Signature]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+class _Tree:
+    """The directories and files of a tree that cleaning applies to."""
+
+    def __init__(self, root: Path, **discovery):
+        self.root = root
+        self.discovery = discovery
+        self.suffixes = discovery.get("suffixes", SUPPORTED_SUFFIXES)
+        self.directories: List[Path] = []
+        self.files: Set[Path] = set()
+
+    def scan(self) -> Set[Path]:
+        """Walk the tree again, returning the files that were not in it before."""
+        directories, files = [], set()
+        for directory, directory_files in walk_tree(self.root, **self.discovery):
+            directories.append(directory)
+            files.update(directory_files)
+        new_files = files - self.files
+        self.directories, self.files = directories, files
+        return new_files
+
+
+class PollingWatcher:
+    """Detect changed files by scanning the tree and comparing file signatures.
+
+    Works everywhere, at the cost of a walk of the tree per scan.
+
+    Args:
+        root: Directory to watch.
+        interval: Minimum seconds between scans.
+        **discovery: Keyword arguments forwarded to `walk_tree`.
+    """
+
+    def __init__(self, root: Path, interval: float = DEFAULT_POLL_INTERVAL, **discovery):
+        self.tree = _Tree(root, **discovery)
+        self.interval = interval
+        self.tree.scan()
+        self.signatures = {path: _signature(path) for path in self.tree.files}
+        self.last_scan = time.monotonic()
+
+    def wait(self, timeout: float) -> Set[Path]:
+        """Wait up to `timeout` seconds, then return the files changed since the last call."""
+        time.sleep(max(0.0, min(timeout, self.last_scan + self.interval - time.monotonic())))
+        if time.monotonic() - self.last_scan < self.interval:
+            return set()
+        self.last_scan = time.monotonic()
+        self.tree.scan()
+        signatures = {path: _signature(path) for path in self.tree.files}
+        changed = {
+            path
+            for path, signature in signatures.items()
+            if signature is not None and signature != self.signatures.get(path)
+        }
+        self.signatures = signatures
+        return changed
+
+    def close(self) -> None:
+        pass
+
+
+class InotifyWatcher:
+    """Detect changed files from Linux inotify events, without scanning the tree.
+
+    Every directory cleaning applies to is watched. Files count as changed once
+    they are closed after writing or moved into place, as editors saving
+    atomically do. New files and directories and .gitignore changes trigger a
+    rescan.
+
+    Args:
+        root: Directory to watch.
+        **discovery: Keyword arguments forwarded to `walk_tree`.
+
+    Raises:
+        OSError: If inotify is not available.
+    """
+
+    def __init__(self, root: Path, **discovery):
+        self._libc = _load_libc()
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f"inotify_init1 failed: {os.strerror(errno)}")
+        self.tree = _Tree(root, **discovery)
+        self.directories: Dict[int, Path] = {}
+        self.tree.scan()
+        self._add_watches()
+
+    def _add_watches(self) -> None:
+        watched = set(self.directories.values())
+        for directory in self.tree.directories:
+            if directory in watched:
+                continue
+            wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+            if wd < 0:
+                # the directory went away, or the watch limit was reached
+                errno = ctypes.get_errno()
+                logging.debug(f"Unable to watch {directory}: {os.strerror(errno)}")
+                continue
+            self.directories[wd] = directory
+
+    def wait(self, timeout: float) -> Set[Path]:
+        """Wait up to `timeout` seconds for events, returning the files they changed."""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+
+        changed, rescan = set(), False
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    # events were dropped, anything may have changed
+                    changed.update(self.tree.files)
+                    rescan = True
+                elif mask & IN_IGNORED:
+                    self.directories.pop(wd, None)
+                elif mask & (IN_ISDIR | IN_DELETE_SELF | IN_MOVE_SELF) or name == ".gitignore":
+                    rescan = True
+                elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO) and wd in self.directories:
+                    changed.add(self.directories[wd] / name)
+
+        # new files may be excluded or ignored, only a walk of the tree can tell
+        rescan = rescan or any(
+            path.suffix in self.tree.suffixes and path not in self.tree.files for path in changed
+        )
+        if rescan:
+            # files created before their new directory was watched count as changed
+            changed.update(self.tree.scan())
+            self._add_watches()
+        return changed & self.tree.files
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+def _load_libc() -> ctypes.CDLL:
+    if not sys.platform.startswith("linux"):
+        raise OSError("inotify is only available on Linux")
+    libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    if not hasattr(libc, "inotify_init1"):
+        raise OSError("inotify is not available in this libc")
+    libc.inotify_init1.argtypes = [ctypes.c_int]
+    libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    return libc
+
+
+def make_watcher(
+    root: Path, polling: bool = False, poll_interval: float = DEFAULT_POLL_INTERVAL, **discovery
+):
+    """Watch a tree with inotify where available, by polling otherwise.
+
+    Args:
+        root: Directory to watch.
+        polling: Whether to poll even where inotify is available.
+        poll_interval: Seconds between scans when polling.
+        **discovery: Keyword arguments forwarded to `walk_tree`.
+
+    Returns:
+        An InotifyWatcher or a PollingWatcher.
+    """
+    if not polling:
+        try:
+            return InotifyWatcher(root, **discovery)
+        except OSError as e:
+            logging.debug(f"Falling back to polling: {e}")
+    return PollingWatcher(root, interval=poll_interval, **discovery)
+
+
+def watch(
+    root: Path,
+    clean: Callable[[List[Path]], Iterable[Path]],
+    debounce: float = DEFAULT_DEBOUNCE,
+    polling: bool = False,
+    poll_interval: float = DEFAULT_POLL_INTERVAL,
+    exclude: Optional[Sequence[str]] = None,
+    include: Optional[Sequence[str]] = None,
+    use_gitignore: bool = True,
+    stop: Optional[threading.Event] = None,
+    ready: Optional[threading.Event] = None,
+) -> None:
+    """Clean files of a tree as they change, until stopped or interrupted.
+
+    Changes are collected until none arrive for `debounce` seconds, so a burst
+    of saves cleans each file once. Files written by `clean` are remembered by
+    signature, and the change events of those writes are ignored.
+
+    Args:
+        root: Directory to watch.
+        clean: Called with the changed files, returns the files it rewrote.
+        debounce: Seconds without changes before the changed files are cleaned.
+        polling: Whether to poll even where inotify is available.
+        poll_interval: Seconds between scans when polling.
+        exclude: Globs for files and directories to skip.
+        include: Globs files must match to be cleaned, all files if empty.
+        use_gitignore: Whether to honour .gitignore files.
+        stop: Event ending the watch once set.
+        ready: Event set once the tree is being watched.
+    """
+    watcher = make_watcher(
+        Path(root),
+        polling=polling,
+        poll_interval=poll_interval,
+        exclude=exclude,
+        include=include,
+        use_gitignore=use_gitignore,
+    )
+    logging.debug(f"Watching {root} with {type(watcher).__name__}")
+    if ready is not None:
+        ready.set()
+    own_writes: Dict[Path, Optional[Signature]] = {}
+    pending: Set[Path] = set()
+    try:
+        while stop is None or not stop.is_set():
+            changed = watcher.wait(debounce if pending else IDLE_TIMEOUT)
+            if changed:
+                pending |= changed
+                continue
+            if not pending:
+                continue
+
+            paths = []
+            for path in sorted(pending):
+                signature = _signature(path)
+                if signature is None or own_writes.pop(path, None) == signature:
+                    continue
+                paths.append(path)
+            pending.clear()
+            if paths:
+                for path in clean(paths):
+                    own_writes[path] = _signature(path)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
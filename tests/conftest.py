@@ -75,3 +75,53 @@ def black_only():
 @pytest.fixture
 def autoflake_only():
     return """\nx = {  \'a\':37,\'b\':42,\n\n\'c\':927}\n\nx = 123456789.123456789E123456789\n\nif very_long_variable_name is not None and  very_long_variable_name.field > 0 or  very_long_variable_name.is_debug:\n z = \'hello \'+\'world\'\nelse:\n world = \'world\'\n a = \'hello {}\'.format(world)\n f = rf\'hello {world}\'\nif (this\nand that): y = \'hello \'\'world\'#FIXME: https://github.com/python/black/issues/26\nclass Foo  (     object  ):\n  def f    (self   ):\n    return       37*-2\n  def g(self, x,y=42):\n      return y\ndef f  (   a: List[ int ]) :\n  return      37-a[42-u :  y**3]\ndef very_important_function(template: str,*variables,file: os.PathLike,debug:bool=False,):\n    with open(file, "w") as f:\n     ...\n# fmt: off\ncustom_formatting = [\n    0,  1,  2,\n    3,  4,  5,\n    6,  7,  8,\n]\n# fmt: on\nregular_formatting = [\n    0,  1,  2,\n    3,  4,  5,\n    6,  7,  8,\n]"""
+
+
+@pytest.fixture
+def notebook_with_outputs():
+    return {
+        "cells": [
+            {
+                "cell_type": "code",
+                "execution_count": 3,
+                "metadata": {"collapsed": True, "scrolled": "auto", "tags": ["keep"]},
+                "outputs": [
+                    {
+                        "name": "stdout",
+                        "output_type": "stream",
+                        "text": ["hello\n"],
+                    },
+                    {
+                        "data": {"image/png": "iVBORw0KGgo=", "text/plain": ["<Figure>"]},
+                        "execution_count": 3,
+                        "metadata": {},
+                        "output_type": "execute_result",
+                    },
+                ],
+                "source": ["print('hello')\n", "fig"],
+            },
+            {
+                "cell_type": "markdown",
+                "metadata": {"collapsed": True},
+                "source": ["# Title"],
+            },
+            {
+                "cell_type": "code",
+                "execution_count": None,
+                "metadata": {},
+                "outputs": [],
+                "source": [],
+            },
+        ],
+        "metadata": {"kernelspec": {"name": "python3", "display_name": "Python 3", "language": "python"}},
+        "nbformat": 4,
+        "nbformat_minor": 4,
+    }
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache_dir(tmp_path, monkeypatch):
+    # keep the result cache out of the user's home directory
+    cache_home = tmp_path / "cache_home"
+    monkeypatch.setenv("XDG_CACHE_HOME", str(cache_home))
+    return cache_home / "clean-py"
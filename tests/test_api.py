@@ -0,0 +1,148 @@
+import json
+
+import pytest
+
+from clean_py.api import (
+    CLEANED,
+    FAILED,
+    INVALID,
+    SKIPPED,
+    clean_paths,
+    clean_sources,
+    get_worker_pool,
+    iter_paths,
+    shutdown_worker_pool,
+)
+from clean_py import backends
+from clean_py.backends import Backend, find_ruff, register_backend
+from clean_py.cache import ResultCache
+
+
+def test_iter_paths(tmp_path):
+    (tmp_path / "pkg").mkdir()
+    (tmp_path / "pkg" / "module.py").write_text("x = 1\n")
+    (tmp_path / "pkg" / "notes.txt").write_text("notes\n")
+    script = tmp_path / "script.py"
+    script.write_text("x = 1\n")
+    assert list(iter_paths([tmp_path / "pkg", script, tmp_path / "pkg" / "notes.txt"])) == [
+        tmp_path / "pkg" / "module.py",
+        script,
+    ]
+    assert list(iter_paths([tmp_path], py=False)) == []
+
+
+def test_clean_paths(tmp_path, capsys):
+    messy = tmp_path / "messy.py"
+    messy.write_text("import os\nx=1\n")
+    clean = tmp_path / "clean.py"
+    clean.write_text("x = 1\n")
+    results = clean_paths([tmp_path], write=False, diff=True, profile=True)
+    by_name = {result.path.name: result for result in results}
+    assert by_name["messy.py"].status == CLEANED and by_name["messy.py"].changed
+    assert "+x = 1" in by_name["messy.py"].diff
+    assert not by_name["clean.py"].changed
+    assert by_name["messy.py"].seconds > 0 and "black" in by_name["messy.py"].timings
+    assert messy.read_text() == "import os\nx=1\n"
+    # results are returned, never printed
+    assert capsys.readouterr().out == ""
+
+    clean_paths([messy])
+    assert messy.read_text() == "x = 1\n"
+
+
+def test_clean_sources(notebook_with_outputs):
+    results = clean_sources(
+        {
+            "script.py": "import os\nx=1\n",
+            "notebook.ipynb": json.dumps(notebook_with_outputs),
+            "broken.ipynb": "{}",
+            "notes.txt": "notes",
+        }
+    )
+    assert [result.name for result in results] == [
+        "script.py",
+        "notebook.ipynb",
+        "broken.ipynb",
+        "notes.txt",
+    ]
+    script, notebook, broken, notes = results
+    assert (script.status, script.cleaned, script.changed) == (CLEANED, "x = 1\n", True)
+    assert notebook.changed and json.loads(notebook.cleaned)["cells"][0]["outputs"] == []
+    assert broken.status == INVALID and broken.cleaned is None
+    assert notes.status == SKIPPED
+
+
+def test_clean_sources_reuses_workers():
+    sources = [(f"script_{index}.py", "x=1\n") for index in range(4)]
+    try:
+        results = clean_sources(sources, jobs=2)
+        pool = get_worker_pool(2)
+        assert [result.cleaned for result in results] == ["x = 1\n"] * 4
+        clean_sources(sources, jobs=2)
+        assert get_worker_pool(2) is pool
+        assert get_worker_pool(1) is not pool
+    finally:
+        shutdown_worker_pool()
+
+
+@pytest.mark.skipif(find_ruff() is None, reason="ruff is not installed")
+def test_clean_sources_ruff_batch():
+    sources = {f"script_{index}.py": f"import os\nx={index}\n" for index in range(3)}
+    sources["broken.py"] = "def f(:\n"
+    results = clean_sources(sources, backend="ruff")
+    assert [result.cleaned for result in results[:3]] == [f"x = {index}\n" for index in range(3)]
+    # the batch falls back to cleaning one by one, failing only the broken source
+    assert results[3].status == FAILED and results[3].cleaned is None
+
+
+class RecordingBackend(Backend):
+    name = "recording"
+    batches = []
+
+    def clean(self, source, autoflake=True, isort=True, black=True, config=None):
+        return source.upper()
+
+    def clean_batch(self, sources, config=None, **flags):
+        self.batches.append(len(sources))
+        return super().clean_batch(sources, config, **flags)
+
+
+@pytest.fixture
+def recording_backend():
+    register_backend(RecordingBackend.name, RecordingBackend)
+    RecordingBackend.batches = []
+    yield RecordingBackend
+    backends._BACKENDS.pop(RecordingBackend.name)
+    backends._instances.pop(RecordingBackend.name, None)
+
+
+@pytest.mark.parametrize("io_threads", [0, 2])
+def test_clean_paths_batches_backend(tmp_path, recording_backend, notebook_with_outputs, io_threads):
+    files = []
+    for project, count in [("a", 3), ("b", 2)]:
+        (tmp_path / project).mkdir()
+        (tmp_path / project / "pyproject.toml").write_text(f"[tool.black]\nline-length = {80 + count}\n")
+        for index in range(count):
+            files.append(tmp_path / project / f"module_{index}.py")
+            files[-1].write_text(f"x = {index}\n")
+    notebook = tmp_path / "a" / "notebook.ipynb"
+    notebook.write_text(json.dumps(notebook_with_outputs))
+    files.insert(1, notebook)
+
+    cache = ResultCache(tmp_path / "cache")
+    options = dict(backend=recording_backend.name, cache=cache, io_threads=io_threads)
+    results = clean_paths(files, **options)
+    assert [result.path for result in results] == files
+    assert all(result.status == CLEANED for result in results)
+    # one batch per project, the notebook cleaned as usual in between
+    assert recording_backend.batches == [3, 2]
+    assert files[0].read_text() == "X = 0\n"
+    assert json.loads(notebook.read_text())["cells"][0]["outputs"] == []
+
+    # cached files aren't cleaned again
+    files[0].write_text("y = 1\n")
+    recording_backend.batches = []
+    results = clean_paths(files, **options)
+    assert [result.changed for result in results] == [True] + [False] * 5
+    assert files[0].read_text() == "Y = 1\n"
+    assert recording_backend.batches == []
@@ -0,0 +1,96 @@
+import pytest
+
+from clean_py import backends
+from clean_py.backends import (
+    DEFAULT_BACKEND,
+    Backend,
+    BackendError,
+    RuffBackend,
+    backend_flags,
+    backend_names,
+    find_ruff,
+    get_backend,
+    register_backend,
+)
+from clean_py.clean_py import clean_python_code
+
+needs_ruff = pytest.mark.skipif(find_ruff() is None, reason="ruff is not installed")
+
+# Sources both backends clean alike
+SOURCES = [
+    "import sys\nimport os\nx=os.path.join( 'a','b' )\n",
+    "from typing import List, Dict\ndef f(a:List[int])->int:\n    return len( a )\n",
+    "import json\n\n\n\nclass A:\n    def f(self):\n        return json.dumps({ 'a':1 })\n",
+    "x = 1\n",
+]
+
+
+class UpperBackend(Backend):
+    name = "upper"
+
+    def clean(self, source, autoflake=True, isort=True, black=True, config=None):
+        return source.upper()
+
+
+@pytest.fixture
+def upper_backend():
+    register_backend(UpperBackend.name, UpperBackend)
+    yield UpperBackend.name
+    backends._BACKENDS.pop(UpperBackend.name)
+    backends._instances.pop(UpperBackend.name, None)
+
+
+def test_get_backend():
+    assert get_backend().name == DEFAULT_BACKEND
+    assert get_backend(DEFAULT_BACKEND) is get_backend()
+    assert {DEFAULT_BACKEND, "ruff"} <= set(backend_names())
+    with pytest.raises(BackendError, match="Unknown backend 'nope'"):
+        get_backend("nope")
+
+
+def test_default_backend():
+    source = "import os\nimport sys\nx=sys.argv\n"
+    assert get_backend().clean(source) == clean_python_code(source) == "import sys\n\nx = sys.argv\n"
+    assert get_backend().clean(source, black=False) == "import sys\n\nx=sys.argv\n"
+    assert backend_flags(DEFAULT_BACKEND) == {}
+
+
+def test_backend_needs_clean():
+    with pytest.raises(TypeError):
+        Backend()
+
+
+def test_register_backend(upper_backend):
+    assert upper_backend in backend_names()
+    assert clean_python_code("x = 1\n", backend=upper_backend) == "X = 1\n"
+    assert get_backend(upper_backend).clean_batch(["a\n", "b\n"]) == ["A\n", "B\n"]
+    assert backend_flags(upper_backend) == {"backend": upper_backend, "backend_version": None}
+    # notebook cells are always formatted with black
+    assert clean_python_code("x=1", is_notebook_cell=True, backend=upper_backend) == "x = 1\n"
+
+
+def test_ruff_backend_missing(monkeypatch):
+    monkeypatch.setattr(backends, "find_ruff", lambda: None)
+    with pytest.raises(BackendError, match="pip install ruff"):
+        RuffBackend()
+    with pytest.raises(BackendError, match="Unable to run ruff"):
+        RuffBackend(binary="/nonexistent/ruff").version()
+
+
+@needs_ruff
+@pytest.mark.parametrize("source", SOURCES)
+def test_ruff_backend_matches_default(source):
+    ruff = get_backend("ruff")
+    assert ruff.clean(source) == get_backend().clean(source)
+    for flags in [dict(autoflake=False), dict(isort=False), dict(black=False)]:
+        assert ruff.clean(source, **flags) == get_backend().clean(source, **flags)
+
+
+@needs_ruff
+def test_ruff_backend_batch():
+    ruff = get_backend("ruff")
+    assert ruff.clean_batch(SOURCES) == [ruff.clean(source) for source in SOURCES]
+    # one invalid source falls back to cleaning one by one, raising for it
+    with pytest.raises(BackendError):
+        ruff.clean_batch([*SOURCES, "def f(:\n"])
+    assert backend_flags("ruff")["backend_version"].startswith("ruff ")
@@ -0,0 +1,141 @@
+import os
+from importlib.metadata import version
+
+from clean_py import cache as cache_module
+from clean_py import clean_py as clean_py_module
+from clean_py.cache import CellCache, ResultCache, default_cache_dir
+from clean_py.clean_py import clean_ipynb, clean_py
+
+FLAGS = {"file_type": "py", "autoflake": True, "isort": True, "black": True}
+
+
+def test_default_cache_dir(isolated_cache_dir):
+    assert default_cache_dir() == isolated_cache_dir
+
+
+def test_cache_miss(tmp_path):
+    cache = ResultCache(tmp_path)
+    assert cache.get("x = 1\n", FLAGS) is None
+
+
+def test_cache_roundtrip(tmp_path):
+    cache = ResultCache(tmp_path)
+    cache.set("x=1", "x = 1\n", FLAGS)
+    assert cache.get("x=1", FLAGS) == "x = 1\n"
+    # the cleaned output is known to be clean as well
+    assert cache.get("x = 1\n", FLAGS) == "x = 1\n"
+
+
+def test_cache_empty_output(tmp_path):
+    cache = ResultCache(tmp_path)
+    cache.set("import os\n", "", FLAGS)
+    assert cache.get("import os\n", FLAGS) == ""
+
+
+def test_cache_key_depends_on_flags_and_versions(tmp_path):
+    cache = ResultCache(tmp_path)
+    key = cache.key("x = 1\n", FLAGS)
+    assert key != cache.key("x = 1\n", dict(FLAGS, black=False))
+    cache.versions = dict(cache.versions, black="0.0.0")
+    assert key != cache.key("x = 1\n", FLAGS)
+
+
+def test_cache_misses_after_clean_py_upgrade(tmp_path, monkeypatch):
+    cache = ResultCache(tmp_path)
+    assert cache.versions["clean-py"] == version("clean-py")
+    cache.set("x=1", "x = 1\n", FLAGS)
+    assert ResultCache(tmp_path).get("x=1", FLAGS) == "x = 1\n"
+
+    def bumped_version(package):
+        return "999.0.0" if package == "clean-py" else version(package)
+
+    monkeypatch.setattr(cache_module, "version", bumped_version)
+    assert ResultCache(tmp_path).get("x=1", FLAGS) is None
+
+
+def test_cache_prune(tmp_path):
+    cache = ResultCache(tmp_path, max_size=10000)
+    for i in range(20):
+        cache.set(f"x={i}", f"x = {i}\n" + "#" * 200, FLAGS)
+        # spread out mtimes so eviction order is deterministic
+        entry = cache._entry_path(cache.key(f"x={i}", FLAGS))
+        os.utime(entry, (i, i))
+
+    cache.prune()
+    sizes = [
+        entry.stat().st_size + 256
+        for shard in os.scandir(tmp_path)
+        for entry in os.scandir(shard.path)
+    ]
+    assert sum(sizes) <= cache.max_size
+    # most recently used entries survive
+    assert cache.get("x=19", FLAGS) is not None
+    assert cache.get("x=0", FLAGS) is None
+
+
+def test_cache_prune_leaves_cell_cache_alone(tmp_path):
+    cells = CellCache(cache_dir=tmp_path / "cells")
+    cells.set("x=1", "x = 1\n", FLAGS)
+    ResultCache(tmp_path, max_size=0).prune()
+    assert CellCache(cache_dir=tmp_path / "cells").get("x=1", FLAGS) == "x = 1\n"
+
+
+def test_cell_cache_roundtrip_and_counters():
+    cells = CellCache()
+    assert cells.get("x=1", FLAGS) is None
+    cells.set("x=1", "x = 1\n", FLAGS)
+    assert cells.get("x=1", FLAGS) == "x = 1\n"
+    # formatted sources are known to be formatted
+    assert cells.get("x = 1\n", FLAGS) == "x = 1\n"
+    assert cells.get("x=1", dict(FLAGS, black=False)) is None
+    assert (cells.hits, cells.misses, cells.disk_hits) == (2, 2, 0)
+    assert cells.hit_rate == 0.5
+
+
+def test_cell_cache_evicts_least_recently_used():
+    cells = CellCache(max_entries=4)
+    for i in range(3):
+        cells.set(f"x={i}", f"x = {i}\n", FLAGS)
+    assert cells.get("x=0", FLAGS) is None
+    assert cells.get("x=2", FLAGS) == "x = 2\n"
+    assert len(cells._entries) == 4
+
+
+def test_cell_cache_disk_tier(tmp_path):
+    CellCache(cache_dir=tmp_path).set("x=1", "x = 1\n", FLAGS)
+    cells = CellCache(max_entries=0, cache_dir=tmp_path)
+    assert cells.get("x=1", FLAGS) == "x = 1\n"
+    assert (cells.hits, cells.disk_hits) == (1, 1)
+
+
+def test_clean_py_cache_hit_skips_formatters(tmp_path, monkeypatch):
+    cache = ResultCache(tmp_path / "cache")
+    script = tmp_path / "script.py"
+    script.write_text("x=1\n")
+    clean_py(script, cache=cache)
+    assert script.read_text() == "x = 1\n"
+
+    def fail(*args, **kwargs):
+        raise AssertionError("formatters should not run on a cache hit")
+
+    monkeypatch.setattr(clean_py_module, "clean_python_code", fail)
+    clean_py(script, cache=cache)
+    script.write_text("x=1\n")
+    clean_py(script, cache=cache)
+    assert script.read_text() == "x = 1\n"
+
+
+def test_clean_ipynb_cache_hit(tmp_path, monkeypatch):
+    cache = ResultCache(tmp_path / "cache")
+    notebook = tmp_path / "notebook.ipynb"
+    notebook.write_text(
+        '{"cells": [{"cell_type": "code", "execution_count": 1, "metadata": {},'
+        ' "outputs": [], "source": ["x=1"]}], "metadata": {}, "nbformat": 4,'
+        ' "nbformat_minor": 4}'
+    )
+    clean_ipynb(notebook, cache=cache)
+    cleaned = notebook.read_text()
+
+    monkeypatch.setattr(clean_py_module, "clean_ipynb_cell", None)
+    clean_ipynb(notebook, cache=cache)
+    assert notebook.read_text() == cleaned
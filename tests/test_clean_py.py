@@ -1,13 +1,25 @@
+import copy
+import json
 from pathlib import Path
 import pytest
 from clean_py.clean_py import (
+    apply_cell_passes,
+    clean_ipynb,
+    clean_ipynb_cells,
+    clean_py,
     clean_python_code,
+    clear_ipynb_output,
+    format_cell_batch,
     remove_duplicate_cells,
     remove_empty_cells,
     remove_magics,
     create_file,
     clean_ipynb_cell,
+    get_cell_cache,
+    unified_diff,
 )
+from clean_py.cache import CellCache
+from clean_py.notebook import dumps_notebook, normalize_notebook
 
 
 def test_clean_source_apply_all(black_playground_template_input, apply_all):
@@ -68,6 +80,74 @@ print(2)"""
     assert result == "print(1)\nprint(2)"
 
 
+def test_remove_magics_drops_blank_lines():
+    source = "!pip install numpy\nimport numpy\n\n\nx = 1"
+    assert remove_magics(source) == "!pip install numpy\nimport numpy\nx = 1"
+
+
+def test_cell_passes_keep_blank_lines_and_list_sources():
+    cells = [
+        {"cell_type": "code", "source": "!pip install numpy\nimport numpy\n\n\nx = 1"},
+        {"cell_type": "code", "source": ["print(1)\n", "print(2)"]},
+        {"cell_type": "code", "source": ["\n", "  "]},
+        {"cell_type": "markdown", "source": []},
+    ]
+    result = apply_cell_passes(
+        copy.deepcopy(cells), clear_output=False, drop_empty_cells=True, strip_magics=True
+    )
+    assert result == [
+        {"cell_type": "code", "source": ["import numpy\n", "\n", "\n", "x = 1"]},
+        cells[1],
+    ]
+
+
+def test_apply_cell_passes():
+    cells = [
+        {"cell_type": "code", "source": ["%matplotlib inline\n", "x = 1"], "outputs": [1]},
+        {"cell_type": "code", "source": "%time\n", "outputs": [1]},
+        {"cell_type": "code", "source": "x = 1", "outputs": [1]},
+        {"cell_type": "markdown", "source": ["x = 1"]},
+        {"cell_type": "markdown", "source": "", "metadata": {}},
+        {"cell_type": "markdown", "source": "x = 1"},
+    ]
+    result = apply_cell_passes(
+        copy.deepcopy(cells), dedupe_cells=True, drop_empty_cells=True, strip_magics=True
+    )
+    # duplicates are cells storing the same source, of whatever type
+    assert result == [
+        {"cell_type": "code", "source": ["x = 1"], "outputs": [], "execution_count": None},
+        {"cell_type": "code", "source": "x = 1", "outputs": [], "execution_count": None},
+    ]
+    # passes are opt-in, only outputs are cleared by default
+    assert len(apply_cell_passes(copy.deepcopy(cells))) == len(cells)
+
+
+def test_apply_cell_passes_keeps_cell_magics(tmp_path):
+    cells = [
+        {"cell_type": "code", "source": ["%%bash\n", "ls -la\n", "%env"]},
+        {"cell_type": "code", "source": ["%%writefile script.py\n", "x=1"]},
+    ]
+    result = apply_cell_passes(copy.deepcopy(cells), clear_output=False, strip_magics=True)
+    assert result == cells
+
+    notebook = tmp_path / "notebook.ipynb"
+    ipynb_dict = {"cells": cells, "metadata": {}, "nbformat": 4, "nbformat_minor": 4}
+    notebook.write_text(json.dumps(ipynb_dict))
+    clean_ipynb(notebook, strip_magics=True)
+    assert [cell["source"] for cell in json.loads(notebook.read_text())["cells"]] == [
+        cell["source"] for cell in cells
+    ]
+
+
+def test_clean_ipynb_cell_passes(tmp_path, notebook_with_outputs):
+    notebook_with_outputs["cells"].append(copy.deepcopy(notebook_with_outputs["cells"][0]))
+    notebook = tmp_path / "notebook.ipynb"
+    notebook.write_text(json.dumps(notebook_with_outputs))
+    clean_ipynb(notebook, dedupe_cells=True, drop_empty_cells=True)
+    cells = json.loads(notebook.read_text())["cells"]
+    assert [cell["cell_type"] for cell in cells] == ["code", "markdown"]
+
+
 def test_create_file(tmp_path):
     test_file = tmp_path / "test.txt"
     content = "test content"
@@ -111,3 +191,199 @@ def test_clean_ipynb_cell_error():
     }
     result = clean_ipynb_cell(cell)
     assert result == cell  # Should return original cell on error
+
+
+def test_clear_ipynb_output(notebook_with_outputs):
+    result = clear_ipynb_output(notebook_with_outputs)
+    code_cell, markdown_cell, _ = result["cells"]
+    assert code_cell["outputs"] == []
+    assert code_cell["execution_count"] is None
+    assert code_cell["metadata"] == {"tags": ["keep"]}
+    # Only code cells carry outputs
+    assert markdown_cell["metadata"] == {"collapsed": True}
+
+
+def test_clear_ipynb_output_matches_nbconvert(notebook_with_outputs):
+    nbformat = pytest.importorskip("nbformat")
+    preprocessors = pytest.importorskip("nbconvert.preprocessors")
+
+    expected, _ = preprocessors.ClearOutputPreprocessor().preprocess(
+        nbformat.from_dict(copy.deepcopy(notebook_with_outputs)), {}
+    )
+    result = clear_ipynb_output(notebook_with_outputs)
+    # compare the text written, nbformat.writes would hide differences in key order
+    expected = json.dumps(json.loads(nbformat.writes(expected)), indent=1) + "\n"
+    assert dumps_notebook(normalize_notebook(result)) == expected
+
+
+def test_clean_ipynb_clears_output(tmp_path, notebook_with_outputs):
+    notebook_path = tmp_path / "outputs.ipynb"
+    notebook_path.write_text(json.dumps(notebook_with_outputs))
+    clean_ipynb(notebook_path)
+    result = json.loads(notebook_path.read_text())
+    assert result["cells"][0]["outputs"] == []
+    assert result["cells"][0]["source"] == ["print(\"hello\")\n", "fig"]
+
+
+def test_clean_ipynb_without_write(tmp_path, notebook_with_outputs):
+    notebook_path = tmp_path / "outputs.ipynb"
+    contents = json.dumps(notebook_with_outputs)
+    notebook_path.write_text(contents)
+    result = clean_ipynb(notebook_path, write=False)
+    assert result.changed
+    assert result.source == contents
+    assert notebook_path.read_text() == contents
+
+
+def test_clean_ipynb_streams_large_notebooks(tmp_path, monkeypatch, notebook_with_outputs):
+    expected_path = tmp_path / "expected.ipynb"
+    streamed_path = tmp_path / "streamed.ipynb"
+    for notebook_path in (expected_path, streamed_path):
+        notebook_path.write_text(json.dumps(notebook_with_outputs))
+    clean_ipynb(expected_path)
+
+    monkeypatch.setattr("clean_py.clean_py.STREAM_NOTEBOOK_SIZE", 0)
+    result = clean_ipynb(streamed_path)
+    assert result.changed and result.source is None
+    assert streamed_path.read_text() == expected_path.read_text()
+    assert not clean_ipynb(streamed_path).changed
+
+
+def test_clean_py_skips_unchanged_files(tmp_path, monkeypatch):
+    script = tmp_path / "script.py"
+    script.write_text("import os\nx=1\n")
+    assert clean_py(script).changed
+    assert script.read_text() == "x = 1\n"
+
+    def fail(*args):
+        raise AssertionError("unchanged file was rewritten")
+
+    monkeypatch.setattr("clean_py.clean_py.create_file", fail)
+    assert not clean_py(script).changed
+
+
+def test_unified_diff():
+    diff = unified_diff("import os\nx=1", "x = 1\n", "script.py")
+    assert diff.splitlines() == [
+        "--- a/script.py\t(original)",
+        "+++ b/script.py\t(cleaned)",
+        "@@ -1,2 +1 @@",
+        "-import os",
+        "-x=1",
+        "\\ No newline at end of file",
+        "+x = 1",
+    ]
+    assert unified_diff("x = 1\n", "x = 1\n", "script.py") == ""
+
+
+def test_clean_ipynb_cells_pool_matches_inline():
+    cells = [
+        {"cell_type": "code", "source": [f"x  =  {i}\n", "print ( x )"]} for i in range(4)
+    ] + [{"cell_type": "markdown", "source": ["# Title"]}]
+    inline = clean_ipynb_cells(copy.deepcopy(cells), cell_pool_threshold=0)
+    pooled = clean_ipynb_cells(copy.deepcopy(cells), cell_pool_threshold=2)
+    assert pooled == inline
+    assert inline[0]["source"] == ["x = 0\n", "print(x)"]
+
+
+BATCH_CELL_SOURCES = [
+    "x=1",
+    "def f( a ):\n  return a",
+    "if x:\n  y=1\n# dedented comment",
+    "class A :\n\n\n  pass",
+    "import os\n# trailing comment",
+    "\n\nprint( 'padded' )\n\n\n",
+    "%matplotlib inline\nx  =  1",
+    "'docstring'\nx=1",
+    "# fmt: off\ny  =  [1,2]",
+    "",
+    "invalid python code :",
+]
+
+
+def test_clean_ipynb_cells_batch_matches_per_cell():
+    cells = [{"cell_type": "code", "source": source} for source in BATCH_CELL_SOURCES]
+    cells.append({"cell_type": "markdown", "source": "# Title"})
+    expected = [clean_ipynb_cell(cell) for cell in copy.deepcopy(cells)]
+    batched = clean_ipynb_cells(copy.deepcopy(cells), cell_pool_threshold=0, batch_cells=True)
+    assert batched == expected
+
+
+def test_clean_ipynb_cells_batch_example_notebook():
+    cells = json.loads(pytest.example_notebook.read_text())["cells"]
+    expected = clean_ipynb_cells(copy.deepcopy(cells), cell_pool_threshold=0, batch_cells=False)
+    batched = clean_ipynb_cells(copy.deepcopy(cells), cell_pool_threshold=0, batch_cells=True)
+    assert batched == expected
+
+
+@pytest.mark.parametrize("batch_cells", [True, False])
+def test_clean_ipynb_cells_cell_cache(batch_cells, monkeypatch):
+    from clean_py import clean_py as clean_py_module
+
+    cells = [{"cell_type": "code", "source": source} for source in BATCH_CELL_SOURCES * 2]
+    expected = clean_ipynb_cells(copy.deepcopy(cells), cell_pool_threshold=0)
+    cell_cache = CellCache()
+    formatted = []
+    format_cell_sources = clean_py_module._format_cell_sources
+
+    def record(sources, *args):
+        formatted.extend(sources)
+        return format_cell_sources(sources, *args)
+
+    monkeypatch.setattr(clean_py_module, "_format_cell_sources", record)
+    cached = clean_ipynb_cells(
+        copy.deepcopy(cells), 0, batch_cells=batch_cells, cell_cache=cell_cache
+    )
+    assert cached == expected
+    # copy-pasted cells are formatted once, then come from the cache
+    assert sorted(formatted) == sorted(BATCH_CELL_SOURCES)
+    assert clean_ipynb_cells(copy.deepcopy(cells), 0, cell_cache=cell_cache) == expected
+    # cells that fail to format are not remembered, and so miss every time
+    failing = ["%matplotlib inline\nx  =  1", "invalid python code :"]
+    assert formatted[len(BATCH_CELL_SOURCES) :] == failing
+    assert (cell_cache.hits, cell_cache.misses) == (9, 13)
+
+
+def test_get_cell_cache_is_shared():
+    cell_cache = get_cell_cache()
+    assert get_cell_cache() is cell_cache
+    assert get_cell_cache(max_entries=1) is not cell_cache
+
+
+def test_format_cell_batch():
+    assert format_cell_batch(["x=1", "def f( a ):\n  return a"]) == [
+        "x = 1\n",
+        "def f(a):\n    return a\n",
+    ]
+
+
+def test_format_cell_batch_matches_cell_alone():
+    # black adds a trailing comma after **kwargs only when the source uses
+    # features of Python 3.6+, here an f-string
+    cell = (
+        "def function_name(argument_number_one, argument_number_two, "
+        "argument_number_three, argument_number_four, *args, **kwargssssssssss):\n"
+        "    pass\n"
+    )
+    f_string = 'x = f"{1}"\n'
+    alone = clean_ipynb_cell({"cell_type": "code", "source": cell})["source"]
+    assert alone[-3:] == ["    **kwargssssssssss\n", "):\n", "    pass"]
+    assert format_cell_batch([cell, f_string]) == format_cell_batch([f_string, cell])[::-1]
+    assert format_cell_batch([cell, f_string])[0] == "".join(alone) + "\n"
+
+    # nor do cells cached while formatting one notebook depend on its other cells
+    cell_cache = CellCache()
+    cells = [{"cell_type": "code", "source": source} for source in (f_string, cell)]
+    clean_ipynb_cells(cells, cell_cache=cell_cache)
+    cells = [{"cell_type": "code", "source": cell}]
+    assert clean_ipynb_cells(cells, cell_cache=cell_cache)[0]["source"] == alone
+
+
+def test_format_cell_batch_falls_back(monkeypatch):
+    from clean_py import clean_py as clean_py_module
+
+    def fail(*args, **kwargs):
+        raise ValueError("cannot format")
+
+    monkeypatch.setattr(clean_py_module, "clean_python_code", fail)
+    assert format_cell_batch(["x=1", "y=2"]) == [None, None]
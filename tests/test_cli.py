@@ -1,9 +1,11 @@
+import json
 import subprocess
 from pathlib import Path
 
 import pytest
 from typer.testing import CliRunner
 
+from clean_py.backends import find_ruff
 from clean_py.cli import app
 
 # Get the test files directory
@@ -11,6 +13,7 @@ TEST_FILES_DIR = Path(__file__).parent / "test_files"
 TEST_PY_FILE = TEST_FILES_DIR / "test.py"
 TEST_IPYNB_FILE = TEST_FILES_DIR / "test.ipynb"
 
+
 def setup_test_files():
     """Create test files if they don't exist"""
     TEST_FILES_DIR.mkdir(exist_ok=True)
@@ -34,29 +37,34 @@ def setup_test_files():
  "nbformat_minor": 2
 }""")
 
+
 @pytest.fixture(autouse=True)
 def setup():
     """Automatically set up test files before each test"""
     setup_test_files()
 
+
 def test_cli_single_py_file():
     """Test CLI with a single Python file"""
     runner = CliRunner()
     result = runner.invoke(app, [str(TEST_PY_FILE)])
     assert result.exit_code == 0
 
+
 def test_cli_single_ipynb_file():
     """Test CLI with a single Jupyter notebook"""
     runner = CliRunner()
     result = runner.invoke(app, [str(TEST_IPYNB_FILE)])
     assert result.exit_code == 0
 
+
 def test_cli_directory():
     """Test CLI with a directory"""
     runner = CliRunner()
     result = runner.invoke(app, [str(TEST_FILES_DIR)])
     assert result.exit_code == 0
 
+
 def test_cli_invalid_path():
     """Test CLI with an invalid path"""
     runner = CliRunner()
@@ -64,55 +72,555 @@ def test_cli_invalid_path():
     assert result.exit_code == 1
     assert "Error: Path 'nonexistent_path' does not exist" in result.stdout
 
+
 def test_cli_help():
     """Test CLI help command"""
     runner = CliRunner()
     result = runner.invoke(app, ["--help"])
     assert result.exit_code == 0
-    # Check for presence of key help text elements
+    # the group's help lists the subcommands
+    assert "COMMAND [ARGS]" in result.stdout
+    for command in ("main", "watch", "serve", "merge-reports"):
+        assert command in result.stdout
+    # options of the default command come with its help
+    result = runner.invoke(app, ["main", "--help"])
+    assert result.exit_code == 0
     assert "main [OPTIONS] PATH" in result.stdout
     assert "File or directory to clean" in result.stdout
 
+
+def test_cli_path_named_like_command(tmp_path, monkeypatch):
+    """Test cleaning a path named like a subcommand through main"""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "watch").mkdir()
+    script = tmp_path / "watch" / "script.py"
+    script.write_text("x=1\n")
+    runner = CliRunner()
+    result = runner.invoke(app, ["main", "watch"])
+    assert result.exit_code == 0
+    assert script.read_text() == "x = 1\n"
+
+
 def test_cli_options_py_only():
     """Test CLI with Python-only option"""
     runner = CliRunner()
     result = runner.invoke(app, [str(TEST_FILES_DIR), "--py", "--no-ipynb"])
     assert result.exit_code == 0
 
+
 def test_cli_options_ipynb_only():
     """Test CLI with Jupyter-only option"""
     runner = CliRunner()
     result = runner.invoke(app, [str(TEST_FILES_DIR), "--no-py", "--ipynb"])
     assert result.exit_code == 0
 
+
 def test_cli_options_no_autoflake():
     """Test CLI with autoflake disabled"""
     runner = CliRunner()
     result = runner.invoke(app, [str(TEST_PY_FILE), "--no-autoflake"])
     assert result.exit_code == 0
 
+
 def test_cli_options_no_isort():
     """Test CLI with isort disabled"""
     runner = CliRunner()
     result = runner.invoke(app, [str(TEST_PY_FILE), "--no-isort"])
     assert result.exit_code == 0
 
+
 def test_cli_options_no_black():
     """Test CLI with black disabled"""
     runner = CliRunner()
     result = runner.invoke(app, [str(TEST_PY_FILE), "--no-black"])
     assert result.exit_code == 0
 
+
 def test_cli_verbose():
     """Test CLI with verbose output"""
     runner = CliRunner()
     result = runner.invoke(app, [str(TEST_PY_FILE), "--verbose"])
     assert result.exit_code == 0
 
+
 def test_cli_invalid_python_file():
     """Test CLI with invalid Python file"""
     invalid_py = TEST_FILES_DIR / "invalid.py"
     invalid_py.write_text("def invalid_syntax:")  # Invalid Python syntax
     runner = CliRunner()
     result = runner.invoke(app, [str(invalid_py)])
-    assert result.exit_code == 0  # Should not fail on invalid syntax
\ No newline at end of file
+    assert result.exit_code == 0  # Should not fail on invalid syntax
+
+
+def test_cli_jobs(tmp_path):
+    """Test CLI with a process pool matches the serial run"""
+    serial_dir = tmp_path / "serial"
+    pooled_dir = tmp_path / "pooled"
+    for target in (serial_dir, pooled_dir):
+        target.mkdir()
+        (target / "a.py").write_text("import os\nx = {  'a':37}\n")
+        (target / "b.py").write_text("def f  ( x ) :\n  return x\n")
+        (target / "invalid.ipynb").write_text("{not json")
+
+    runner = CliRunner()
+    serial = runner.invoke(app, [str(serial_dir)])
+    pooled = runner.invoke(app, [str(pooled_dir), "--jobs", "2"])
+    assert serial.exit_code == pooled.exit_code == 0
+    assert "completed with some warnings" in pooled.stdout
+    for name in ("a.py", "b.py"):
+        assert (pooled_dir / name).read_text() == (serial_dir / name).read_text()
+
+
+def test_cli_jobs_all_cores():
+    """Test CLI with --jobs 0 using every core"""
+    runner = CliRunner()
+    result = runner.invoke(app, [str(TEST_PY_FILE), "--jobs", "0"])
+    assert result.exit_code == 0
+
+
+@pytest.mark.parametrize("jobs", ["1", "2"])
+def test_cli_io_threads(tmp_path, jobs):
+    """Test reading and writing files on threads while others are formatted"""
+    for index in range(6):
+        (tmp_path / f"mod_{index}.py").write_text("import os\nx=1\n")
+    (tmp_path / "clean.py").write_text("x = 1\n")
+    runner = CliRunner()
+    result = runner.invoke(
+        app, [str(tmp_path), "--no-cache", "--io-threads", "2", "--jobs", jobs, "--check"]
+    )
+    assert result.exit_code == 1
+    assert "6 file(s) would be changed" in result.stdout
+    assert (tmp_path / "mod_0.py").read_text() == "import os\nx=1\n"
+
+    result = runner.invoke(app, [str(tmp_path), "--no-cache", "--io-threads", "2", "--jobs", jobs])
+    assert result.exit_code == 0
+    for index in range(6):
+        assert (tmp_path / f"mod_{index}.py").read_text() == "x = 1\n"
+
+
+def test_cli_cache_dir(tmp_path):
+    """Test CLI writes the result cache to --cache-dir"""
+    script = tmp_path / "script.py"
+    script.write_text("x=1\n")
+    cache_dir = tmp_path / "cache"
+    runner = CliRunner()
+    result = runner.invoke(app, [str(script), "--cache-dir", str(cache_dir)])
+    assert result.exit_code == 0
+    assert script.read_text() == "x = 1\n"
+    assert any(cache_dir.iterdir())
+
+
+def test_cli_schedule_cost(tmp_path):
+    """Test --schedule cost saves file timings for later runs"""
+    for name, lines in (("small.py", 1), ("large.py", 50)):
+        (tmp_path / name).write_text("x=1\n" * lines)
+    cache_dir = tmp_path / "cache"
+    runner = CliRunner()
+    result = runner.invoke(app, [str(tmp_path), "--schedule", "cost", "--cache-dir", str(cache_dir)])
+    assert result.exit_code == 0
+    assert (tmp_path / "small.py").read_text() == "x = 1\n"
+    timings = json.loads((cache_dir / "timings.json").read_text())
+    assert sorted(Path(key).name for key in timings) == ["large.py", "small.py"]
+
+
+def test_cli_unknown_backend(tmp_path):
+    """Test --backend rejects backends that don't exist"""
+    script = tmp_path / "script.py"
+    script.write_text("x=1\n")
+    runner = CliRunner()
+    result = runner.invoke(app, [str(script), "--backend", "nope"])
+    assert result.exit_code != 0
+    assert "Unknown backend 'nope'" in result.output
+    assert script.read_text() == "x=1\n"
+
+
+@pytest.mark.skipif(find_ruff() is None, reason="ruff is not installed")
+def test_cli_ruff_backend(tmp_path):
+    """Test cleaning with --backend ruff, cached apart from the default backend"""
+    script = tmp_path / "script.py"
+    script.write_text("import os\nimport sys\nx=sys.argv\n")
+    cache_dir = tmp_path / "cache"
+    runner = CliRunner()
+    result = runner.invoke(app, [str(script), "--backend", "ruff", "--cache-dir", str(cache_dir)])
+    assert result.exit_code == 0
+    assert script.read_text() == "import sys\n\nx = sys.argv\n"
+    result = runner.invoke(app, [str(script), "--check", "--cache-dir", str(cache_dir)])
+    assert result.exit_code == 0
+
+    # the files of a directory are cleaned in batches, a broken file failing alone
+    project = tmp_path / "project"
+    project.mkdir()
+    scripts = [project / f"script_{index}.py" for index in range(3)]
+    for index, script in enumerate(scripts):
+        script.write_text(f"import os\nx={index}\n")
+    (project / "broken.py").write_text("def f(:\n")
+    result = runner.invoke(app, [str(project), "--backend", "ruff", "--no-cache"])
+    assert result.exit_code == 0
+    assert [script.read_text() for script in scripts] == [f"x = {index}\n" for index in range(3)]
+    assert "Unable to clean file" in result.stdout and "broken.py" in result.stdout
+
+
+def test_cli_no_cache(tmp_path):
+    """Test CLI with the result cache disabled"""
+    script = tmp_path / "script.py"
+    script.write_text("x=1\n")
+    cache_dir = tmp_path / "cache"
+    runner = CliRunner()
+    result = runner.invoke(app, [str(script), "--no-cache", "--cache-dir", str(cache_dir)])
+    assert result.exit_code == 0
+    assert script.read_text() == "x = 1\n"
+    assert not cache_dir.exists()
+
+
+def test_cli_daemon_falls_back_in_process(tmp_path):
+    """Test cleaning with --daemon when no daemon is running"""
+    script = tmp_path / "script.py"
+    script.write_text("import os\nx=1\n")
+    runner = CliRunner()
+    result = runner.invoke(
+        app, [str(script), "--daemon", "--daemon-address", str(tmp_path / "missing.sock")]
+    )
+    assert result.exit_code == 0
+    assert script.read_text() == "x = 1\n"
+
+
+def test_cli_serve_help():
+    """Test the serve subcommand is reachable next to the default command"""
+    runner = CliRunner()
+    result = runner.invoke(app, ["serve", "--help"])
+    assert result.exit_code == 0
+    assert "serve [OPTIONS]" in result.stdout
+
+
+def test_cli_watch(tmp_path):
+    """Test the watch subcommand only watches directories"""
+    runner = CliRunner()
+    result = runner.invoke(app, ["watch", "--help"])
+    assert result.exit_code == 0
+    assert "watch [OPTIONS] PATH" in result.stdout
+
+    script = tmp_path / "script.py"
+    script.write_text("x=1\n")
+    result = runner.invoke(app, ["watch", str(script)])
+    assert result.exit_code == 1
+    assert "is not a" in result.stdout
+
+
+def test_cli_profile(tmp_path):
+    """Test the --profile report and its JSON output"""
+    script = tmp_path / "script.py"
+    script.write_text("import os\nx=1\n")
+    report_path = tmp_path / "profile.json"
+    runner = CliRunner()
+    result = runner.invoke(
+        app, [str(script), "--no-cache", "--profile", "--profile-json", str(report_path)]
+    )
+    assert result.exit_code == 0
+    assert "Time per stage" in result.stdout
+    report = json.loads(report_path.read_text())
+    assert report["files_cleaned"] == 1
+    assert {"read", "autoflake", "isort", "black", "write"} <= report["stages"].keys()
+    assert report["files"][0]["path"] == str(script)
+
+
+def test_cli_profile_cell_cache(tmp_path, isolated_cache_dir):
+    """Test the cell cache counters of copy-pasted notebook cells"""
+    cell = {"cell_type": "code", "execution_count": None, "metadata": {}, "outputs": []}
+    notebook = {
+        "cells": [dict(cell, source=["cached=1"]), dict(cell, source=["cached=1"])],
+        "metadata": {},
+        "nbformat": 4,
+        "nbformat_minor": 4,
+    }
+    for name in ("a.ipynb", "b.ipynb"):
+        (tmp_path / name).write_text(json.dumps(notebook))
+    report_path = tmp_path / "profile.json"
+    runner = CliRunner()
+    result = runner.invoke(
+        app,
+        [
+            str(tmp_path),
+            "--no-cache",
+            "--cell-cache-disk",
+            "--profile-json",
+            str(report_path),
+        ],
+    )
+    assert result.exit_code == 0
+    assert "Cell cache:" in result.stdout
+    counters = json.loads(report_path.read_text())["counters"]
+    # copy-pasted cells are looked up once per notebook
+    assert (counters["cell cache misses"], counters["cell cache hits"]) == (1, 1)
+    assert any((isolated_cache_dir / "cells").iterdir())
+
+    result = runner.invoke(app, [str(tmp_path), "--cell-cache-size", "0", "--profile"])
+    assert result.exit_code == 0
+    assert "Cell cache:" not in result.stdout
+
+
+def test_cli_cell_passes(tmp_path):
+    """Test the opt-in notebook cell passes"""
+    cell = {"cell_type": "code", "execution_count": None, "metadata": {}, "outputs": []}
+    notebook = {
+        "cells": [
+            dict(cell, source=["%matplotlib inline\n", "x=1"]),
+            dict(cell, source=["x=1"]),
+            dict(cell, source=[]),
+        ],
+        "metadata": {},
+        "nbformat": 4,
+        "nbformat_minor": 4,
+    }
+    path = tmp_path / "notebook.ipynb"
+    path.write_text(json.dumps(notebook))
+    runner = CliRunner()
+    result = runner.invoke(
+        app, [str(path), "--strip-magics", "--dedupe-cells", "--drop-empty-cells"]
+    )
+    assert result.exit_code == 0
+    assert [cell["source"] for cell in json.loads(path.read_text())["cells"]] == [["x = 1"]]
+
+
+def _nbconvert_baseline(contents):
+    """Notebook text as written by `jupyter nbconvert --ClearOutputPreprocessor.enabled=True
+    --inplace` followed by cleaning the code cells and `json.dump(..., indent=1)`"""
+    from clean_py.clean_py import clean_python_code
+
+    nbformat = pytest.importorskip("nbformat")
+    preprocessors = pytest.importorskip("nbconvert.preprocessors")
+    notebook = nbformat.reads(contents, as_version=nbformat.NO_CONVERT)
+    notebook, _ = preprocessors.ClearOutputPreprocessor().preprocess(notebook, {})
+    ipynb_dict = json.loads(nbformat.writes(notebook))
+    for cell in ipynb_dict["cells"]:
+        if cell["cell_type"] == "code":
+            lines = clean_python_code("".join(cell["source"]), is_notebook_cell=True)
+            lines = lines.rstrip("\n").splitlines(True)
+            cell["source"] = lines
+    return json.dumps(ipynb_dict, indent=1) + "\n"
+
+
+@pytest.mark.parametrize(
+    "notebook",
+    [
+        "outputs",
+        "example",
+        {
+            "nbformat_minor": 4,
+            "nbformat": 4,
+            "metadata": {"title": "caf\u00e9", "orig_nbformat": 3, "authors": []},
+            "cells": [
+                {"source": "# Title\n\nText", "metadata": {"trusted": True}, "cell_type": "markdown"},
+                {
+                    "source": "import os\nx=1\ny=2",
+                    "outputs": [
+                        {"text": "a\nb\n", "output_type": "stream", "name": "stdout"},
+                        {
+                            "output_type": "display_data",
+                            "metadata": {},
+                            "data": {"text/html": "<b>\n</b>", "image/png": "iVBORw0KGgo="},
+                        },
+                    ],
+                    "metadata": {},
+                    "execution_count": 1,
+                    "cell_type": "code",
+                },
+                {"source": "raw\nlines", "metadata": {}, "cell_type": "raw"},
+            ],
+        },
+    ],
+)
+def test_cli_ipynb_matches_nbconvert(tmp_path, notebook, notebook_with_outputs):
+    """Test notebooks are written byte for byte as nbconvert and json.dump wrote them"""
+    if notebook == "outputs":
+        contents = json.dumps(notebook_with_outputs)
+    elif notebook == "example":
+        contents = (TEST_FILES_DIR / "example_notebook.ipynb").read_text()
+    else:
+        contents = json.dumps(notebook)
+    path = tmp_path / "notebook.ipynb"
+    path.write_text(contents)
+    runner = CliRunner()
+    result = runner.invoke(app, [str(path), "--no-cache"])
+    assert result.exit_code == 0
+    assert path.read_text() == _nbconvert_baseline(contents)
+
+
+def test_cli_limits(tmp_path, monkeypatch):
+    """Test skipping files over the size and time limits"""
+    import time
+
+    from clean_py import clean_py as clean_py_module
+
+    (tmp_path / "small.py").write_text("x=1\n")
+    (tmp_path / "large.py").write_text("x=1\n" * 100)
+    runner = CliRunner()
+    result = runner.invoke(app, [str(tmp_path), "--no-cache", "--max-file-size", "100"])
+    assert result.exit_code == 0
+    assert "Skipping" in result.stdout and "large.py" in result.stdout
+    assert "Cleaning completed with some warnings" in result.stdout
+    assert (tmp_path / "small.py").read_text() == "x = 1\n"
+    assert (tmp_path / "large.py").read_text() == "x=1\n" * 100
+
+    def slow(source, **kwargs):
+        time.sleep(5)
+
+    monkeypatch.setattr(clean_py_module, "clean_python_code", slow)
+    (tmp_path / "small.py").write_text("x=1\n")
+    start = time.perf_counter()
+    result = runner.invoke(app, [str(tmp_path), "--no-cache", "--check", "--timeout", "0.2"])
+    assert time.perf_counter() - start < 2
+    assert result.exit_code == 1
+    assert "Cleaning took longer than 0.2s" in result.stdout
+    assert (tmp_path / "small.py").read_text() == "x=1\n"
+
+
+def test_cli_shard_and_merge_reports(tmp_path):
+    """Test cleaning shards of a tree and merging their reports"""
+    tree = tmp_path / "tree"
+    tree.mkdir()
+    for index in range(12):
+        (tree / f"mod_{index}.py").write_text("x=1\n" if index % 3 else "x = 1\n")
+    runner = CliRunner()
+    reports = []
+    for index in (1, 2, 3):
+        report = tmp_path / f"shard_{index}.json"
+        result = runner.invoke(
+            app, [str(tree), "--check", "--no-cache", "--shard", f"{index}/3", "--report", str(report)]
+        )
+        data = json.loads(report.read_text())
+        assert data["shard"] == f"{index}/3"
+        assert result.exit_code == data["exit_code"]
+        reports.append(report)
+    assert sum(json.loads(report.read_text())["files"] for report in reports) == 12
+
+    merged_json = tmp_path / "merged.json"
+    result = runner.invoke(
+        app, ["merge-reports", *map(str, reports), "--output", str(merged_json)]
+    )
+    assert result.exit_code == 1
+    assert "12 file(s) in 3 shard(s): 8 would be changed" in result.stdout
+    assert "Would reformat mod_1.py" in result.stdout
+    assert json.loads(merged_json.read_text())["changed"] == 8
+
+    result = runner.invoke(app, ["merge-reports", *map(str, reports[:2])])
+    assert result.exit_code == 1
+    assert "No report for shard 3/3" in result.stdout
+
+    result = runner.invoke(app, [str(tree), "--shard", "4/3"])
+    assert result.exit_code == 2
+
+
+def test_cli_cprofile(tmp_path):
+    """Test writing a cProfile dump for one file"""
+    import pstats
+
+    for name in ("a.py", "b.py"):
+        (tmp_path / name).write_text("x=1\n")
+    dump = tmp_path / "clean.prof"
+    runner = CliRunner()
+    result = runner.invoke(
+        app,
+        [str(tmp_path), "--cprofile", str(tmp_path / "b.py"), "--cprofile-output", str(dump)],
+    )
+    assert result.exit_code == 0
+    assert "Wrote cProfile dump" in result.stdout
+    assert pstats.Stats(str(dump)).total_calls > 0
+
+
+def test_cli_check(tmp_path):
+    """Test --check reports files that would change without writing them"""
+    script = tmp_path / "script.py"
+    script.write_text("import os\nx=1\n")
+    clean = tmp_path / "clean.py"
+    clean.write_text("x = 1\n")
+    runner = CliRunner()
+    result = runner.invoke(app, [str(tmp_path), "--check"])
+    assert result.exit_code == 1
+    assert f"Would reformat {script}" in result.stdout
+    assert str(clean) not in result.stdout
+    assert script.read_text() == "import os\nx=1\n"
+
+    result = runner.invoke(app, [str(clean), "--check"])
+    assert result.exit_code == 0
+    assert "No files would be changed" in result.stdout
+
+
+def test_cli_diff(tmp_path, notebook_with_outputs, monkeypatch):
+    """Test --diff prints changes without writing them, as a patch git applies"""
+    monkeypatch.chdir(tmp_path)
+    subprocess.run(["git", "init", "-q"], check=True)
+    (tmp_path / "src").mkdir()
+    notebook = Path("src") / "notebook.ipynb"
+    contents = json.dumps(notebook_with_outputs)
+    notebook.write_text(contents)
+    script = Path("src") / "script.py"
+    script.write_text("import os\nx=1\n")
+    runner = CliRunner(mix_stderr=False)
+    result = runner.invoke(app, ["src", "--diff"])
+    assert result.exit_code == 0
+    assert f"+++ b/{notebook.as_posix()}\t(cleaned)" in result.stdout
+    assert notebook.read_text() == contents
+    # nothing but the diff goes to stdout, so it can be piped to git apply
+    assert result.stdout.startswith("--- a/src/")
+    assert "2 file(s) would be changed." in result.stderr
+    assert "would be changed" not in result.stdout
+    subprocess.run(["git", "apply"], input=result.stdout, text=True, check=True)
+    assert script.read_text() == "x = 1\n"
+    assert runner.invoke(app, ["src", "--check"]).exit_code == 0
+
+
+def test_cli_stdin():
+    """Test cleaning source read from stdin"""
+    runner = CliRunner(mix_stderr=False)
+    result = runner.invoke(app, ["-"], input="import os\nx=1\n")
+    assert result.exit_code == 0
+    assert result.stdout == "x = 1\n"
+
+
+def test_cli_project_config(tmp_path):
+    """Test each file is cleaned with the settings of its pyproject.toml"""
+    (tmp_path / "pyproject.toml").write_text("[tool.black]\nskip-string-normalization = true\n")
+    scripts = [tmp_path / f"script_{index}.py" for index in range(3)]
+    for script in scripts:
+        script.write_text("x='a'\n")
+    cache_dir = tmp_path / "cache"
+    runner = CliRunner()
+    result = runner.invoke(app, [str(tmp_path), "--jobs", "2", "--cache-dir", str(cache_dir)])
+    assert result.exit_code == 0
+    assert all(script.read_text() == "x = 'a'\n" for script in scripts)
+    # results cleaned with the project's settings are cached apart from the defaults
+    result = runner.invoke(
+        app, [str(scripts[0]), "--check", "--no-project-config", "--cache-dir", str(cache_dir)]
+    )
+    assert result.exit_code == 1
+
+    runner = CliRunner(mix_stderr=False)
+    stdin_filename = str(tmp_path / "buffer.py")
+    result = runner.invoke(app, ["-", "--stdin-filename", stdin_filename], input="x='a'\n")
+    assert result.stdout == "x = 'a'\n"
+
+
+def test_cli_stdin_notebook(notebook_with_outputs):
+    """Test cleaning a notebook read from stdin"""
+    runner = CliRunner(mix_stderr=False)
+    result = runner.invoke(
+        app,
+        ["-", "--stdin-filename", "notebook.ipynb"],
+        input=json.dumps(notebook_with_outputs),
+    )
+    assert result.exit_code == 0
+    assert json.loads(result.stdout)["cells"][0]["outputs"] == []
+
+
+def test_cli_stdin_check_and_errors():
+    """Test --check and error reporting on stdin, with nothing but source on stdout"""
+    runner = CliRunner(mix_stderr=False)
+    result = runner.invoke(app, ["-", "--check"], input="x=1\n")
+    assert result.exit_code == 1
+    assert result.stdout == ""
+    assert "Would reformat stdin.py" in result.stderr
+
+    result = runner.invoke(app, ["-", "--stdin-filename", "notebook.ipynb"], input="{")
+    assert result.exit_code == 1
+    assert result.stdout == ""
+    assert "Invalid notebook format in notebook.ipynb" in result.stderr
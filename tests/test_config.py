@@ -0,0 +1,155 @@
+import pickle
+
+import pytest
+
+from clean_py.clean_py import clean_python_code, clean_source
+from clean_py.config import (
+    DEFAULT_AUTOFLAKE_OPTIONS,
+    DEFAULT_CONFIG,
+    black_mode,
+    clear_project_configs,
+    config_flags,
+    find_project_config,
+    isort_config,
+    read_project_config,
+)
+
+PYPROJECT = """
+[tool.black]
+line-length = 40
+skip-string-normalization = true
+target-version = ["py38"]
+
+[tool.isort]
+profile = "black"
+known_first_party = ["mypkg"]
+
+[tool.autoflake]
+remove-unused-variables = false
+imports = "requests, yaml"
+"""
+
+
+@pytest.fixture(autouse=True)
+def fresh_configs():
+    clear_project_configs()
+    yield
+    clear_project_configs()
+
+
+@pytest.fixture
+def project(tmp_path):
+    (tmp_path / "pyproject.toml").write_text(PYPROJECT)
+    (tmp_path / "src" / "mypkg").mkdir(parents=True)
+    return tmp_path
+
+
+def test_read_project_config(project):
+    config = read_project_config(project / "pyproject.toml")
+    assert config.path == project / "pyproject.toml"
+    assert config.black == {
+        "line_length": 40,
+        "skip_string_normalization": True,
+        "target_version": ["py38"],
+    }
+    assert config.isort
+    assert config.autoflake == dict(
+        DEFAULT_AUTOFLAKE_OPTIONS,
+        remove_unused_variables=False,
+        additional_imports=["requests", "yaml"],
+    )
+    assert config_flags(config) == {"config": config.key}
+    # settings are sent to workers with each file
+    assert pickle.loads(pickle.dumps(config)) == config
+
+
+def test_read_project_config_without_settings(tmp_path):
+    pyproject = tmp_path / "pyproject.toml"
+    pyproject.write_text('[project]\nname = "example"\n')
+    config = read_project_config(pyproject)
+    assert (config.path, config.key) == (pyproject, None)
+    assert config_flags(config) == config_flags(None) == {}
+
+    pyproject.write_text("[tool.black\n")
+    assert read_project_config(pyproject) == DEFAULT_CONFIG
+
+
+def test_config_key_tracks_settings(tmp_path):
+    pyproject = tmp_path / "pyproject.toml"
+    pyproject.write_text("[tool.black]\nline-length = 100\n")
+    key = read_project_config(pyproject).key
+    pyproject.write_text("[tool.black]\nline-length = 120\n")
+    assert read_project_config(pyproject).key != key
+
+
+def test_find_project_config(project):
+    config = find_project_config(project / "src" / "mypkg" / "module.py")
+    assert config.path == project / "pyproject.toml"
+    # each pyproject.toml is read once
+    assert find_project_config(project / "script.py") is config
+
+    # settings are not looked up past the root of a repository
+    (project / "vendored" / ".git").mkdir(parents=True)
+    assert find_project_config(project / "vendored" / "module.py") == DEFAULT_CONFIG
+
+    (project / "pyproject.toml").write_text("[tool.black]\nline-length = 100\n")
+    assert find_project_config(project / "script.py") is config
+    clear_project_configs()
+    assert find_project_config(project / "script.py").black == {"line_length": 100}
+
+
+def test_black_mode(project):
+    from black import Mode, TargetVersion
+
+    assert black_mode() == black_mode(DEFAULT_CONFIG) == Mode()
+    config = find_project_config(project / "module.py")
+    mode = black_mode(config)
+    assert (mode.line_length, mode.string_normalization) == (40, False)
+    assert mode.target_versions == {TargetVersion.PY38}
+    assert black_mode(config) is mode
+
+    (project / "pyproject.toml").write_text('[tool.black]\ntarget-version = ["py2"]\n')
+    clear_project_configs()
+    with pytest.raises(ValueError, match="Unknown black target version 'py2'"):
+        black_mode(find_project_config(project / "module.py"))
+
+
+def test_isort_config(project):
+    from isort.settings import DEFAULT_CONFIG as ISORT_DEFAULT_CONFIG
+
+    assert isort_config() is ISORT_DEFAULT_CONFIG
+    config = isort_config(find_project_config(project / "module.py"))
+    assert config.profile == "black" and "mypkg" in config.known_first_party
+
+
+def test_clean_with_project_config(project):
+    config = find_project_config(project / "module.py")
+    source = (
+        "import os\nimport mypkg\nimport black\n"
+        "def f():\n    unused = 1\n    return black, mypkg, 'a', 'b', 'c', 'd', 'e'\n"
+    )
+    assert clean_python_code(source, config=config) == (
+        "import black\n\nimport mypkg\n\n\n"
+        "def f():\n"
+        "    unused = 1\n"
+        "    return (\n"
+        "        black,\n"
+        "        mypkg,\n"
+        "        'a',\n"
+        "        'b',\n"
+        "        'c',\n"
+        "        'd',\n"
+        "        'e',\n"
+        "    )\n"
+    )
+    assert clean_python_code(source) == (
+        "import black\nimport mypkg\n\n\n"
+        "def f():\n"
+        '    return black, mypkg, "a", "b", "c", "d", "e"\n'
+    )
+    # notebook cells are formatted in the project's style too
+    cell = "x = {'alpha': 1, 'beta': 2, 'gamma': 3, 'delta': 4}"
+    assert clean_python_code(cell, is_notebook_cell=True, config=config).startswith("x = {\n")
+    assert clean_source(cell + "\n", "py", config=config) == clean_python_code(
+        cell, is_notebook_cell=True, config=config
+    )
@@ -0,0 +1,101 @@
+import json
+import threading
+
+import pytest
+
+from clean_py.daemon import (
+    DaemonError,
+    DaemonUnavailable,
+    clean_path_with_daemon,
+    clean_with_daemon,
+    handle_request,
+    is_running,
+    make_server,
+    parse_address,
+    request_clean,
+)
+from clean_py.notebook import InvalidNotebookError
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    address = str(tmp_path / "daemon.sock")
+    server = make_server(address)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield address
+    server.shutdown()
+    server.server_close()
+
+
+def test_request_clean_py(daemon):
+    assert request_clean("import os\nx=1\n", "py", daemon) == "x = 1\n"
+    assert request_clean("import os\nx=1\n", "py", daemon, autoflake=False) == "import os\n\nx = 1\n"
+
+
+def test_request_clean_ipynb(daemon, notebook_with_outputs):
+    cleaned = json.loads(request_clean(json.dumps(notebook_with_outputs), "ipynb", daemon))
+    assert all(cell.get("outputs", []) == [] for cell in cleaned["cells"])
+
+
+def test_request_clean_invalid_notebook(daemon):
+    with pytest.raises(InvalidNotebookError):
+        request_clean('{"cells": null}', "ipynb", daemon)
+    with pytest.raises(InvalidNotebookError):
+        request_clean("not json", "ipynb", daemon)
+
+
+def test_request_clean_unknown_option(daemon):
+    with pytest.raises(DaemonError, match="Unknown options: line_length"):
+        request_clean("x=1\n", "py", daemon, line_length=10)
+
+
+def test_handle_request_validates():
+    assert handle_request({"source": "x=1\n", "file_type": "txt"})["status"] == "error"
+    assert handle_request({"version": 2, "source": "", "file_type": "py"})["status"] == "error"
+    assert handle_request({"source": "x=1\n", "file_type": "py"}) == {
+        "status": "ok",
+        "source": "x = 1\n",
+    }
+
+
+def test_handle_request_with_project_config(tmp_path):
+    pyproject = tmp_path / "pyproject.toml"
+    pyproject.write_text("[tool.black]\nskip-string-normalization = true\n")
+    request = {"source": "x='a'\n", "file_type": "py", "options": {"config": str(pyproject)}}
+    assert handle_request(request) == {"status": "ok", "source": "x = 'a'\n"}
+    request["options"]["config"] = 1
+    assert handle_request(request)["status"] == "error"
+
+
+def test_request_clean_without_daemon(tmp_path):
+    with pytest.raises(DaemonUnavailable):
+        request_clean("x=1\n", "py", str(tmp_path / "missing.sock"))
+    assert clean_with_daemon("x=1\n", "py", str(tmp_path / "missing.sock")) == "x = 1\n"
+
+
+def test_clean_path_with_daemon(daemon, tmp_path):
+    script = tmp_path / "script.py"
+    script.write_text("import os\nx=1\n")
+    clean_path_with_daemon(script, daemon)
+    assert script.read_text() == "x = 1\n"
+
+
+def test_one_daemon_per_socket(daemon, tmp_path):
+    assert is_running(daemon)
+    with pytest.raises(DaemonError, match="already listening"):
+        make_server(daemon)
+
+
+def test_stale_socket_is_replaced(tmp_path):
+    address = str(tmp_path / "daemon.sock")
+    make_server(address).server_close()  # leaves the socket file behind
+    assert not is_running(address)
+    make_server(address).server_close()
+
+
+def test_parse_address():
+    assert parse_address("localhost:8765") == ("localhost", 8765)
+    assert parse_address(":8765") == ("127.0.0.1", 8765)
+    assert parse_address("/run/clean-py.sock") == "/run/clean-py.sock"
+    assert parse_address(None).endswith(".sock")
@@ -0,0 +1,98 @@
+import pytest
+from typer.testing import CliRunner
+
+from clean_py.cli import app
+from clean_py.discovery import iter_files
+
+
+@pytest.fixture
+def tree(tmp_path):
+    files = [
+        "a.py",
+        "b.ipynb",
+        "notes.txt",
+        "pkg/module.py",
+        "pkg/generated/schema.py",
+        "pkg/.ipynb_checkpoints/b-checkpoint.ipynb",
+        ".venv/lib/site.py",
+        ".git/hooks/hook.py",
+        "node_modules/dep/index.py",
+        "build/lib/module.py",
+        "pkg/__pycache__/module.py",
+        "scratch/tmp.py",
+        "docs/conf.py",
+        "docs/keep.py",
+    ]
+    for name in files:
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("x = 1\n")
+    (tmp_path / ".gitignore").write_text("scratch/\n")
+    (tmp_path / "docs" / ".gitignore").write_text("*.py\n!keep.py\n")
+    return tmp_path
+
+
+def relative(root, paths):
+    return [path.relative_to(root).as_posix() for path in paths]
+
+
+def test_iter_files_default_excludes_and_gitignore(tree):
+    assert relative(tree, iter_files(tree)) == [
+        "a.py",
+        "b.ipynb",
+        "docs/keep.py",
+        "pkg/module.py",
+        "pkg/generated/schema.py",
+    ]
+
+
+def test_iter_files_without_gitignore(tree):
+    found = relative(tree, iter_files(tree, use_gitignore=False))
+    assert "scratch/tmp.py" in found
+    assert "docs/conf.py" in found
+    assert ".venv/lib/site.py" not in found
+
+
+def test_iter_files_exclude(tree):
+    found = relative(tree, iter_files(tree, exclude=["generated", "*.ipynb"]))
+    assert found == ["a.py", "docs/keep.py", "pkg/module.py"]
+
+
+def test_iter_files_exclude_relative_path(tree):
+    found = relative(tree, iter_files(tree, exclude=["pkg/generated/*"]))
+    assert "pkg/generated/schema.py" not in found
+    assert "pkg/module.py" in found
+
+
+def test_iter_files_include(tree):
+    found = relative(tree, iter_files(tree, include=["pkg/*"]))
+    assert found == ["pkg/module.py", "pkg/generated/schema.py"]
+
+
+def test_iter_files_parent_gitignore(tree):
+    (tree / ".git").mkdir(exist_ok=True)
+    (tree / ".gitignore").write_text("generated/\n")
+    assert relative(tree / "pkg", iter_files(tree / "pkg")) == ["module.py"]
+
+
+def test_iter_files_is_lazy(tree):
+    files = iter_files(tree)
+    assert next(files) == tree / "a.py"
+
+
+def test_cli_exclude(tree):
+    (tree / "a.py").write_text("x=1\n")
+    (tree / "pkg" / "module.py").write_text("x=1\n")
+    runner = CliRunner()
+    result = runner.invoke(app, [str(tree), "--exclude", "pkg", "--no-cache"])
+    assert result.exit_code == 0
+    assert (tree / "a.py").read_text() == "x = 1\n"
+    assert (tree / "pkg" / "module.py").read_text() == "x=1\n"
+
+
+def test_cli_skips_gitignored(tree):
+    (tree / "scratch" / "tmp.py").write_text("x=1\n")
+    runner = CliRunner()
+    result = runner.invoke(app, [str(tree), "--no-cache"])
+    assert result.exit_code == 0
+    assert (tree / "scratch" / "tmp.py").read_text() == "x=1\n"
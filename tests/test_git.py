@@ -0,0 +1,97 @@
+import subprocess
+
+import pytest
+from typer.testing import CliRunner
+
+from clean_py.cli import app
+from clean_py.git import GitError, changed_files
+
+
+def git(repo, *args):
+    subprocess.run(
+        ("git", "-c", "user.name=test", "-c", "user.email=test@example.com", *args),
+        cwd=repo,
+        check=True,
+        capture_output=True,
+    )
+
+
+@pytest.fixture
+def repo(tmp_path):
+    git(tmp_path, "init", "-q")
+    (tmp_path / "committed.py").write_text("x = 1\n")
+    (tmp_path / "renamed.py").write_text("def f():\n    return 1\n" * 5)
+    (tmp_path / "deleted.py").write_text("y = 2\n")
+    (tmp_path / "notes.txt").write_text("notes\n")
+    git(tmp_path, "add", ".")
+    git(tmp_path, "commit", "-q", "-m", "initial")
+    return tmp_path
+
+
+def test_changed_files_since_ref(repo):
+    (repo / "committed.py").write_text("x=2\n")
+    (repo / "deleted.py").unlink()
+    (repo / "notes.txt").write_text("more notes\n")
+    assert changed_files(repo, ref="HEAD") == [repo / "committed.py", repo / "notes.txt"]
+
+
+def test_changed_files_staged(repo):
+    (repo / "committed.py").write_text("x=2\n")
+    (repo / "added.py").write_text("z=3\n")
+    git(repo, "add", "added.py")
+    assert changed_files(repo, staged=True) == [repo / "added.py"]
+
+
+def test_changed_files_rename(repo):
+    git(repo, "mv", "renamed.py", "moved.py")
+    assert changed_files(repo, staged=True) == [repo / "moved.py"]
+    assert changed_files(repo, ref="HEAD") == [repo / "moved.py"]
+
+
+def test_changed_files_restricted_to_path(repo):
+    (repo / "sub").mkdir()
+    (repo / "sub" / "inner.py").write_text("a=1\n")
+    (repo / "committed.py").write_text("x=2\n")
+    git(repo, "add", ".")
+    assert changed_files(repo / "sub", staged=True) == [repo / "sub" / "inner.py"]
+
+
+def test_changed_files_bad_ref(repo):
+    with pytest.raises(GitError):
+        changed_files(repo, ref="does-not-exist")
+
+
+def test_changed_files_outside_repository(tmp_path):
+    with pytest.raises(GitError):
+        changed_files(tmp_path)
+
+
+def test_cli_changed_since(repo):
+    (repo / "committed.py").write_text("x=2\n")
+    (repo / "untouched.py").write_text("y=2\n")
+    git(repo, "add", "untouched.py")
+    git(repo, "commit", "-q", "-m", "second")
+    (repo / "untouched.py").write_text("y=2\n")
+    runner = CliRunner()
+    result = runner.invoke(app, [str(repo), "--changed-since", "HEAD", "--no-cache"])
+    assert result.exit_code == 0
+    assert (repo / "committed.py").read_text() == "x = 2\n"
+    assert (repo / "untouched.py").read_text() == "y=2\n"
+
+
+def test_cli_staged(repo):
+    (repo / "committed.py").write_text("x=2\n")
+    (repo / "added.py").write_text("z=3\n")
+    git(repo, "add", "added.py")
+    runner = CliRunner()
+    result = runner.invoke(app, [str(repo), "--staged", "--no-cache"])
+    assert result.exit_code == 0
+    assert (repo / "added.py").read_text() == "z = 3\n"
+    assert (repo / "committed.py").read_text() == "x=2\n"
+
+
+def test_cli_changed_since_bad_ref(repo):
+    runner = CliRunner()
+    result = runner.invoke(app, [str(repo), "--changed-since", "does-not-exist"])
+    assert result.exit_code == 1
+    assert "Unable to list changed files" in result.stdout
@@ -0,0 +1,52 @@
+import subprocess
+import sys
+
+FORMATTERS = {"black", "isort", "autoflake"}
+# Budget for `import clean_py.cli`, about twice the 220ms it takes, typer and rich
+# making up most of it
+IMPORT_TIME_BUDGET_US = 450_000
+
+
+def import_times(*args, cwd=None):
+    """Run python with -X importtime and return cumulative import times by module"""
+    completed = subprocess.run(
+        (sys.executable, "-X", "importtime", *args), capture_output=True, text=True, cwd=cwd
+    )
+    times = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line.split("|")
+        times[module.strip()] = int(cumulative)
+    return times
+
+
+def test_import_time_budget():
+    times = import_times("-c", "import clean_py.cli")
+    assert times["clean_py.cli"] < IMPORT_TIME_BUDGET_US
+    assert not FORMATTERS & times.keys()
+
+
+def test_help_does_not_import_formatters():
+    times = import_times("-m", "clean_py.cli", "--help")
+    assert "clean_py.clean_py" in times
+    assert not FORMATTERS & times.keys()
+
+
+def test_unsupported_file_does_not_import_formatters(tmp_path):
+    notes = tmp_path / "notes.txt"
+    notes.write_text("notes\n")
+    times = import_times("-m", "clean_py.cli", str(notes))
+    assert "clean_py.clean_py" in times
+    assert not FORMATTERS & times.keys()
+
+
+def test_disabled_stage_is_not_imported(tmp_path):
+    script = tmp_path / "script.py"
+    script.write_text("import os\nx=1\n")
+    times = import_times(
+        "-m", "clean_py.cli", str(script), "--no-black", "--no-cache", cwd=tmp_path
+    )
+    assert {"isort", "autoflake"} <= times.keys()
+    assert "black" not in times
+    assert script.read_text() == "x=1\n"
@@ -0,0 +1,50 @@
+import subprocess
+import sys
+import time
+
+import pytest
+
+from clean_py.limits import CleanTimeout, LimitExceeded, check_file_size, time_limit
+
+
+def test_check_file_size(tmp_path):
+    path = tmp_path / "script.py"
+    path.write_text("x = 1\n")
+    check_file_size(path, None)
+    check_file_size(path, 6)
+    with pytest.raises(LimitExceeded, match="6 bytes"):
+        check_file_size(path, 5)
+
+
+def test_time_limit_interrupts():
+    start = time.perf_counter()
+    with pytest.raises(CleanTimeout):
+        with time_limit(0.1):
+            # broad handlers, like the ones around cells, don't swallow the timeout
+            try:
+                time.sleep(5)
+            except Exception:
+                pass
+    assert time.perf_counter() - start < 1
+
+
+def test_time_limit_disarms():
+    with time_limit(0.1):
+        pass
+    with time_limit(None):
+        time.sleep(0.2)
+
+
+def test_memory_limit():
+    code = (
+        "from clean_py.limits import memory_limit\n"
+        "with memory_limit(1024 ** 3):\n"
+        "    try:\n"
+        "        bytearray(2 * 1024 ** 3)\n"
+        "    except MemoryError:\n"
+        "        print('capped')\n"
+        "bytearray(1024 ** 3)\n"
+    )
+    completed = subprocess.run((sys.executable, "-c", code), capture_output=True, text=True)
+    assert completed.returncode == 0, completed.stderr
+    assert completed.stdout == "capped\n"
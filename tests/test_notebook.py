@@ -0,0 +1,179 @@
+import io
+import json
+
+import pytest
+
+from clean_py import notebook
+from clean_py.clean_py import clear_ipynb_output
+from clean_py.notebook import (
+    InvalidNotebookError,
+    dumps_notebook,
+    load_notebook_without_outputs,
+    loads_notebook,
+)
+
+UNICODE_NOTEBOOK = {
+    "cells": [
+        {
+            "cell_type": "markdown",
+            "metadata": {"tags": []},
+            "source": ["# Café ☕ \U0001f600\n", "tab\there \x00\x1f\x7f   \"quoted\" \\ /"],
+        },
+        {
+            "cell_type": "code",
+            "execution_count": 123456789012345678901234567890,
+            "metadata": {"nested": {"deeper": {"deepest": [[], {}, [1, [2, [3]]]]}}},
+            "outputs": [],
+            "source": "print('日本語')",
+        },
+    ],
+    "metadata": {"language_info": {"name": "python", "version": "3.11"}},
+    "nbformat": 4,
+    "nbformat_minor": 4,
+}
+
+# ASCII only, but json.dumps escapes DEL all the same
+DEL_NOTEBOOK = {
+    "cells": [{"cell_type": "markdown", "metadata": {}, "source": ["delete \x7f"]}],
+    "metadata": {},
+    "nbformat": 4,
+    "nbformat_minor": 4,
+}
+
+FLOAT_NOTEBOOK = {
+    "cells": [],
+    "metadata": {"widgets": {"value": 1e21, "ratio": 0.1, "tiny": 1e-07, "nan": float("nan")}},
+    "nbformat": 4,
+    "nbformat_minor": 4,
+}
+
+
+@pytest.fixture
+def notebooks(notebook_with_outputs):
+    return [
+        json.loads(pytest.example_notebook.read_text()),
+        notebook_with_outputs,
+        UNICODE_NOTEBOOK,
+        DEL_NOTEBOOK,
+        FLOAT_NOTEBOOK,
+    ]
+
+
+def test_dumps_notebook_matches_stdlib(notebooks):
+    pytest.importorskip("orjson")
+    for ipynb_dict in notebooks:
+        expected = json.dumps(ipynb_dict, indent=1, sort_keys=True) + "\n"
+        assert dumps_notebook(loads_notebook(json.dumps(ipynb_dict))) == expected
+
+
+def test_dumps_notebook_uses_orjson(monkeypatch):
+    pytest.importorskip("orjson")
+    ipynb_dict = loads_notebook(json.dumps(UNICODE_NOTEBOOK, ensure_ascii=False))
+    # beyond 64 bits orjson refuses to encode the notebook
+    ipynb_dict["cells"][1]["execution_count"] = 1
+    monkeypatch.setattr(notebook.json, "dumps", None)
+    assert "\\u2615" in dumps_notebook(ipynb_dict)
+
+
+def test_dumps_notebook_escapes_del(monkeypatch):
+    pytest.importorskip("orjson")
+    contents = json.dumps(DEL_NOTEBOOK, indent=1, sort_keys=True) + "\n"
+    assert "\\u007f" in contents
+    monkeypatch.setattr(notebook.json, "dumps", None)
+    assert dumps_notebook(loads_notebook(contents)) == contents
+
+
+def test_dumps_notebook_without_orjson(notebooks, monkeypatch):
+    monkeypatch.setattr(notebook, "orjson", None)
+    for ipynb_dict in notebooks:
+        expected = json.dumps(ipynb_dict, indent=1, sort_keys=True) + "\n"
+        assert dumps_notebook(loads_notebook(json.dumps(ipynb_dict))) == expected
+
+
+def test_dumps_notebook_example_file_roundtrip():
+    contents = pytest.example_notebook.read_text()
+    assert dumps_notebook(loads_notebook(contents)) == contents
+
+
+def test_loads_notebook_matches_stdlib():
+    contents = json.dumps(UNICODE_NOTEBOOK)
+    assert loads_notebook(contents) == json.loads(contents)
+
+
+def test_loads_notebook_constants():
+    contents = '{"cells": [], "metadata": {"value": NaN, "limit": -Infinity}}'
+    assert loads_notebook(contents)["metadata"]["limit"] == float("-inf")
+
+
+def test_loads_notebook_invalid_json():
+    with pytest.raises(json.JSONDecodeError):
+        loads_notebook("{invalid json}")
+
+
+@pytest.mark.parametrize("contents", ["[]", '{"metadata": {}}', '{"cells": {}}'])
+def test_loads_notebook_not_a_notebook(contents):
+    with pytest.raises(InvalidNotebookError):
+        loads_notebook(contents)
+
+
+OUTPUTS_NOTEBOOK = {
+    "cells": [
+        {
+            "cell_type": "code",
+            "execution_count": 3,
+            "metadata": {"scrolled": True},
+            "outputs": [
+                {
+                    "output_type": "stream",
+                    "text": [
+                        'escaped \\"]}{[ quote',
+                        "\\\\",
+                        '"',
+                        "\u2615 \\u00e9",
+                        "x" * 300 + '\\"' + "y" * 300,
+                    ],
+                    "data": {"values": [1.5, 1e10, [[], {}, [{}]]]},
+                }
+            ],
+            "source": ['print("\\\\")'],
+        },
+        {"cell_type": "markdown", "metadata": {}, "source": "text", "outputs": [1]},
+    ],
+    "metadata": {},
+    "nbformat": 4,
+    "nbformat_minor": 4,
+}
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64, 1 << 20])
+def test_load_notebook_without_outputs(notebooks, chunk_size):
+    for ipynb_dict in [*notebooks, OUTPUTS_NOTEBOOK]:
+        for contents in (json.dumps(ipynb_dict), json.dumps(ipynb_dict, indent=1, ensure_ascii=False)):
+            expected = loads_notebook(contents)
+            clear_ipynb_output(expected)
+            loaded = load_notebook_without_outputs(io.StringIO(contents), chunk_size)
+            clear_ipynb_output(loaded)
+            assert dumps_notebook(loaded) == dumps_notebook(expected)
+
+
+def test_load_notebook_without_outputs_float_free():
+    # floats only in skipped outputs don't stop orjson from writing the notebook
+    contents = json.dumps(OUTPUTS_NOTEBOOK)
+    assert type(load_notebook_without_outputs(io.StringIO(contents))) is type(
+        loads_notebook('{"cells": []}')
+    )
+
+
+@pytest.mark.parametrize(
+    "contents",
+    ["", "{", '{"cells": [', '{"cells": [{"outputs": ["abc', '{"cells": []} x', "{invalid json}"],
+)
+def test_load_notebook_without_outputs_invalid_json(contents):
+    with pytest.raises(json.JSONDecodeError):
+        load_notebook_without_outputs(io.StringIO(contents), chunk_size=2)
+
+
+@pytest.mark.parametrize("contents", ["[]", '{"metadata": {}}', '{"cells": {}}'])
+def test_load_notebook_without_outputs_not_a_notebook(contents):
+    with pytest.raises(InvalidNotebookError):
+        load_notebook_without_outputs(io.StringIO(contents))
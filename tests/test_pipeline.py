@@ -0,0 +1,44 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from clean_py import pipeline
+from clean_py.pipeline import Prefetched, bounded_map, prefetch, write_later
+
+
+def test_bounded_map_keeps_order_and_bounds_items_in_flight():
+    taken = []
+
+    def items():
+        for index in range(20):
+            taken.append(index)
+            yield index
+
+    with ThreadPoolExecutor(4) as executor:
+        futures = bounded_map(executor, lambda index: index * 2, items(), queue_size=3)
+        results = []
+        for future in futures:
+            # the next item is only taken once a pending call is handed out
+            assert len(taken) - len(results) <= 3
+            results.append(future.result())
+    assert results == [index * 2 for index in range(20)]
+
+
+def test_prefetch(tmp_path, monkeypatch):
+    script = tmp_path / "script.py"
+    script.write_text("x = 1\n")
+    prefetched = prefetch(script)
+    assert prefetched.path == script and prefetched.source == "x = 1\n"
+    assert prefetched.seconds >= 0
+
+    # files over the size limit, streamed or unreadable are left to the cleaner
+    assert prefetch(script, max_size=2) == Prefetched(script)
+    monkeypatch.setattr(pipeline, "STREAM_NOTEBOOK_SIZE", 4)
+    assert prefetch(script) == Prefetched(script)
+    assert prefetch(tmp_path / "missing.py") == Prefetched(tmp_path / "missing.py")
+
+
+def test_write_later(tmp_path):
+    script = tmp_path / "script.py"
+    assert write_later(script, None) is None
+    assert not script.exists()
+    assert write_later(script, "x = 1\n") >= 0
+    assert script.read_text() == "x = 1\n"
@@ -0,0 +1,45 @@
+import time
+
+from clean_py import profiling
+from clean_py.clean_py import clean_python_code
+from clean_py.profiling import count, counting, record, stage
+
+
+def test_stage_is_noop_when_disabled():
+    assert stage("black") is stage("isort")
+    with stage("black"):
+        pass
+    assert profiling._timings is None
+
+
+def test_record_collects_stages():
+    with record() as timings:
+        with stage("read"):
+            time.sleep(0.01)
+        with stage("read"):
+            pass
+        with stage("write"):
+            pass
+    assert timings.keys() == {"read", "write"}
+    assert timings["read"] >= 0.01
+    assert profiling._timings is None
+
+
+def test_record_formatter_stages():
+    with record() as timings:
+        clean_python_code("import os\nx=1\n")
+    assert timings.keys() == {"autoflake", "isort", "black"}
+
+    with record() as timings:
+        clean_python_code("x=1\n", autoflake=False, isort=False)
+    assert timings.keys() == {"black"}
+
+
+def test_counting():
+    count("cell cache hits")
+    assert profiling._counters is None
+    with counting() as counters:
+        count("cell cache hits")
+        count("cell cache hits", 2)
+    assert counters == {"cell cache hits": 3}
+    assert profiling._counters is None
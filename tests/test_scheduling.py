@@ -0,0 +1,66 @@
+import json
+
+from clean_py.scheduling import (
+    TimingHistory,
+    count_code_cells,
+    estimate_cost,
+    expected_cost,
+    schedule,
+)
+
+
+def _notebook(path, n_code_cells):
+    cells = [{"cell_type": "markdown", "metadata": {}, "source": ["# Title"]}]
+    cells += [
+        {"cell_type": "code", "execution_count": None, "metadata": {}, "outputs": [], "source": ["x = 1"]}
+        for _ in range(n_code_cells)
+    ]
+    path.write_text(json.dumps({"cells": cells, "metadata": {}, "nbformat": 4, "nbformat_minor": 5}, indent=1))
+    return path
+
+
+def test_count_code_cells(tmp_path):
+    assert count_code_cells(_notebook(tmp_path / "notebook.ipynb", 3)) == 3
+    assert count_code_cells(tmp_path / "missing.ipynb") is None
+
+
+def test_estimate_cost(tmp_path):
+    assert estimate_cost(tmp_path / "a.py", 10_000) > estimate_cost(tmp_path / "b.py", 100)
+    few = _notebook(tmp_path / "few.ipynb", 2)
+    many = _notebook(tmp_path / "many.ipynb", 50)
+    assert estimate_cost(many, many.stat().st_size) > estimate_cost(few, few.stat().st_size)
+
+
+def test_timing_history(tmp_path):
+    script = tmp_path / "script.py"
+    script.write_text("x = 1\n")
+    history_path = tmp_path / "cache" / "timings.json"
+    history = TimingHistory(history_path)
+    history.record(script, 2.5)
+    history.record(tmp_path / "missing.py", 1.0)
+    history.save()
+
+    history = TimingHistory(history_path)
+    assert expected_cost(script, history) == 2.5
+    assert len(history.timings) == 1
+    # timings no longer apply once the file changes
+    script.write_text("x = 10\n")
+    assert expected_cost(script, history) == estimate_cost(script, script.stat().st_size)
+
+    history_path.write_text("not json")
+    assert TimingHistory(history_path).timings == {}
+
+
+def test_schedule(tmp_path):
+    small, large, medium = (tmp_path / name for name in ("small.py", "large.py", "medium.py"))
+    small.write_text("x = 1\n")
+    large.write_text("x = 1\n" * 1000)
+    medium.write_text("x = 1\n" * 100)
+    tie = tmp_path / "tie.py"
+    tie.write_text("y = 1\n")
+    assert schedule([small, large, tie, medium]) == [large, medium, small, tie]
+
+    # saved timings override the estimates
+    history = TimingHistory(tmp_path / "timings.json")
+    history.record(small, 60.0)
+    assert schedule([small, large, medium], history) == [small, large, medium]
@@ -0,0 +1,90 @@
+from pathlib import Path
+
+import pytest
+
+from clean_py.sharding import (
+    Shard,
+    merge_reports,
+    parse_shard,
+    select_shard,
+    shard_key,
+    shard_of,
+    shard_report,
+)
+
+
+def test_parse_shard():
+    assert parse_shard("2/4") == Shard(2, 4)
+    assert str(parse_shard("1/1")) == "1/1"
+    for spec in ("0/4", "5/4", "1/0", "2", "a/b", "1/2/3"):
+        with pytest.raises(ValueError):
+            parse_shard(spec)
+
+
+def test_shard_key(tmp_path):
+    assert shard_key(tmp_path / "pkg" / "mod.py", tmp_path) == "pkg/mod.py"
+
+
+def test_shard_of_is_stable():
+    # the digest is fixed, so shards agree across processes and machines
+    assert shard_of("pkg/mod.py", 4) == shard_of("pkg/mod.py", 4)
+    assert {shard_of(f"mod_{index}.py", 4) for index in range(100)} == {1, 2, 3, 4}
+
+
+def test_select_shard_partitions_files(tmp_path):
+    files = [tmp_path / f"mod_{index}.py" for index in range(50)]
+    shards = [select_shard(files, Shard(index, 3), tmp_path) for index in (1, 2, 3)]
+    assert sorted(sum(shards, [])) == sorted(files)
+    # files keep their shard when other files are added or removed
+    assert select_shard(files[:25], Shard(1, 3), tmp_path) == [
+        file_path for file_path in shards[0] if file_path in files[:25]
+    ]
+    # and their relative path, not where the tree is checked out, decides it
+    moved = [Path("elsewhere") / file_path.name for file_path in files]
+    assert [file_path.name for file_path in select_shard(moved, Shard(1, 3), Path("elsewhere"))] == [
+        file_path.name for file_path in shards[0]
+    ]
+
+
+def test_select_shard_weight_by_size(tmp_path):
+    files = []
+    for index, size in enumerate([900, 500, 400, 300, 200, 100]):
+        file_path = tmp_path / f"mod_{index}.py"
+        file_path.write_text("x" * size)
+        files.append(file_path)
+    shards = [select_shard(files, Shard(index, 2), tmp_path, weight_by_size=True) for index in (1, 2)]
+    assert sorted(sum(shards, [])) == sorted(files)
+    loads = [sum(file_path.stat().st_size for file_path in shard) for shard in shards]
+    assert loads == [1200, 1200]
+
+
+def _report(shard, exit_code=0, results=()):
+    return shard_report(shard, "check", 10, list(results), exit_code)
+
+
+def test_merge_reports():
+    changed = {"path": "b.py", "status": "cleaned", "changed": True, "error": None}
+    failed = {"path": "a.py", "status": "failed", "changed": False, "error": "boom"}
+    merged = merge_reports([_report(Shard(2, 2), 1, [changed]), _report(Shard(1, 2), 1, [failed])])
+    assert merged["shards"] == ["1/2", "2/2"]
+    assert merged["missing"] == [] and merged["duplicate"] == []
+    assert (merged["files"], merged["changed"], merged["errors"]) == (20, 1, 1)
+    assert [entry["path"] for entry in merged["results"]] == ["a.py", "b.py"]
+    assert merged["exit_code"] == 1
+
+    assert merge_reports([_report(Shard(1, 2)), _report(Shard(2, 2))])["exit_code"] == 0
+    assert merge_reports([_report(None)])["shards"] == ["1/1"]
+
+    merged = merge_reports([_report(Shard(1, 3)), _report(Shard(1, 3))])
+    assert merged["missing"] == ["2/3", "3/3"]
+    assert merged["duplicate"] == ["1/3"]
+    assert merged["exit_code"] == 1
+
+
+def test_merge_reports_mismatched():
+    with pytest.raises(ValueError, match="numbers of shards"):
+        merge_reports([_report(Shard(1, 2)), _report(Shard(1, 3))])
+    with pytest.raises(ValueError, match="modes"):
+        merge_reports([_report(Shard(1, 2)), shard_report(Shard(2, 2), "write", 1, [], 0)])
+    with pytest.raises(ValueError):
+        merge_reports([])
@@ -0,0 +1,93 @@
+import threading
+import time
+
+import pytest
+
+from clean_py.clean_py import clean_py
+from clean_py.watch import InotifyWatcher, PollingWatcher, make_watcher, watch
+
+
+def _inotify_available(tmp_path):
+    try:
+        InotifyWatcher(tmp_path).close()
+    except OSError:
+        return False
+    return True
+
+
+@pytest.fixture(params=["inotify", "polling"])
+def polling(request, tmp_path):
+    if request.param == "inotify" and not _inotify_available(tmp_path):
+        pytest.skip("inotify is not available")
+    return request.param == "polling"
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+@pytest.fixture
+def watching(tmp_path, polling):
+    """Watch tmp_path in a thread, recording every batch of files cleaned."""
+    batches = []
+
+    def clean(paths):
+        batches.append(sorted(path.name for path in paths))
+        return [path for path in paths if clean_py(path).changed]
+
+    stop, ready = threading.Event(), threading.Event()
+    thread = threading.Thread(
+        target=watch,
+        args=(tmp_path, clean),
+        kwargs=dict(
+            debounce=0.05, polling=polling, poll_interval=0.05, stop=stop, ready=ready
+        ),
+    )
+    thread.start()
+    ready.wait()
+    yield batches
+    stop.set()
+    thread.join()
+
+
+def test_make_watcher_polling(tmp_path):
+    assert isinstance(make_watcher(tmp_path, polling=True), PollingWatcher)
+
+
+def test_watch_cleans_changed_files(tmp_path, watching):
+    (tmp_path / "untouched.py").write_text("y=2\n")
+    time.sleep(0.2)
+    watching.clear()
+    script = tmp_path / "script.py"
+    script.write_text("x=1\n")
+    assert _wait_for(lambda: script.read_text() == "x = 1\n")
+    # the write of the cleaned file is not cleaned again
+    time.sleep(0.3)
+    assert watching == [["script.py"]]
+
+    # an atomic save, as editors do
+    replacement = tmp_path / "replacement.tmp"
+    replacement.write_text("x=2\n")
+    replacement.replace(script)
+    assert _wait_for(lambda: script.read_text() == "x = 2\n")
+
+
+def test_watch_new_directories_and_excludes(tmp_path, watching):
+    package = tmp_path / "pkg"
+    package.mkdir()
+    time.sleep(0.2)
+    module = package / "module.py"
+    module.write_text("x=1\n")
+    assert _wait_for(lambda: module.read_text() == "x = 1\n")
+
+    ignored = tmp_path / ".venv" / "site.py"
+    ignored.parent.mkdir()
+    ignored.write_text("x=1\n")
+    time.sleep(0.3)
+    assert ignored.read_text() == "x=1\n"
+    assert all("site.py" not in batch for batch in watching)